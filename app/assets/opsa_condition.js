@@ -0,0 +1,16 @@
+// app/assets/opsa_condition.js  // estilo de la capa OPSA (dl.GeoJSON style): color por código de clase de la última ejecución
+window.opsa = Object.assign({}, window.opsa, {
+    condition: {
+        // hideout = {classes: "0123...", colors: [...]}: classes[i] es la clase (0..5) del feature con id i
+        style: function (feature, context) {
+            const hideout = (context && context.hideout) || {};
+            const classes = hideout.classes || "";
+            const colors = hideout.colors || [];
+            const cls = classes.charCodeAt(Number(feature.id)) - 48;  // "0".."5" -> 0..5 (NaN fuera de rango)
+            if (!(cls >= 1 && cls <= 5)) {  // NoData: borde negro discontinuo, sin relleno
+                return {color: "black", weight: 1, dashArray: "4", fillOpacity: 0.0};
+            }
+            return {fillColor: colors[cls - 1], color: "#ffffff", weight: 0.5, fillOpacity: 0.75};
+        }
+    }
+});
@@ -0,0 +1,24 @@
+// app/assets/saltmarsh_training_points.js  // estilo de los puntos de entrenamiento (dl.GeoJSON pointToLayer)
+window.saltmarsh = Object.assign({}, window.saltmarsh, {
+    trainingPoints: {
+        // hideout = {colors: [...], labels: [...]} indexados por el código de clase (0..3)
+        pointToLayer: function (feature, latlng, context) {
+            const hideout = (context && context.hideout) || {};
+            const colors = hideout.colors || [];
+            const labels = hideout.labels || [];
+            const p = feature.properties || {};
+            const color = colors[p.c] || "#000000";  // clase desconocida -> negro
+            if (p.cluster) {  // grupo calculado en el servidor
+                const radius = 8 + 3 * Math.log2(p.n);  // crece con el número de puntos
+                return L.circleMarker(latlng, {
+                    radius: radius, color: "#000000", weight: 2, fill: true,
+                    fillColor: color, fillOpacity: 0.6, opacity: 1
+                }).bindTooltip(p.n + " points (mostly " + (labels[p.c] || "unknown") + ")");
+            }
+            return L.circleMarker(latlng, {
+                radius: 5, color: "#000000", weight: 2, fill: true,
+                fillColor: color, fillOpacity: 0.9, opacity: 1
+            }).bindTooltip(p.l || labels[p.c] || "");
+        }
+    }
+});
@@ -1,19 +1,20 @@
-import os, glob  # manejar rutas y buscar archivos
-import io  # buffers en memoria
-from zipfile import ZipFile  # crear ZIPs
 import dash_leaflet as dl  # componentes Leaflet
-import rasterio  # lectura ráster
-from rasterio.vrt import WarpedVRT  # reproyección al vuelo
-from rasterio.enums import Resampling  # remuestreo
 from dash import Input, Output, State, html, dcc, callback_context  # Dash core
 import dash  # tipado de la app
 from dash.exceptions import PreventUpdate  # evitar actualizaciones
 import dash_bootstrap_components as dbc  # componentes Bootstrap
-import matplotlib.pyplot as plt  # dibujar PNGs
 import plotly.express as px  # gráficas interactivas
-import numpy as np  # numérico
-import time, json
-import geopandas as gpd
+import plotly.graph_objects as go  # gráficas de líneas
+import time, json, uuid
+from app.models.raster_manifest import bounds_4326  # metadatos de rásters en memoria
+from app.models.saltmarsh_catalog import CATALOG, class_tif, accretion_tif  # catálogo de escenarios
+from app.models.saltmarsh_stats import raster_stats  # estadísticas por clase precalculadas
+from app.models.saltmarsh_prewarm import PREWARM  # precalentado de escenarios en segundo plano
+from app.models.saltmarsh_trajectory import scenario_trajectory  # series multianuales
+from app.models.pixel_inspector import inspect_point  # consulta puntual multi-escenario
+from app.models.saltmarsh_model_layers import MODEL_LAYERS, model_layers  # salidas del modelo entrenado
+from app.models.training_points import training_points_geojson, cluster_level, CLASS_LABELS  # puntos de entrenamiento
+from dash_extensions.javascript import Namespace  # funciones JS de app/assets
 
 # =============================
 # Constantes y utilidades
@@ -25,6 +26,11 @@ CLASS_INFO = {  # mapa valor->(etiqueta,color)
     2: ("Upland Areas", "#636363"),
     3: ("Channel", "#31C2F3")
 }
+AREA_VIEWPORTS = {  # área -> (centro, zoom) inicial del mapa
+    "Urdaibai_Estuary": ([43.364580815052316, -2.67957208131426804], 14),
+    "Bay_of_Santander": ([43.43984351219931,  -3.7526739449807447], 15),
+    "Cadiz_Bay":        ([36.520874060327226, -6.203490800462997],  15)
+}
 LABEL_TO_COLOR = {name: color for _, (name, color) in CLASS_INFO.items()}  # etiqueta->color
 CATEGORY_ORDER = [CLASS_INFO[k][0] for k in sorted(CLASS_INFO.keys())]  # orden fijo de categorías
 row_style = {
@@ -43,86 +49,123 @@ fg_row_style = {
     'width': '100%',
 }
 
-def _acc_tif_from_class_tif(class_tif):  # localizar tif de acreción emparejado
-    base, ext = os.path.splitext(class_tif)  # separar base y extensión
-    acc_path = f"{base}_accretion{ext}"  # ruta esperada exacta
-    if os.path.exists(acc_path):  # si existe el esperado
-        return acc_path  # devolver ruta
-    folder = os.path.dirname(class_tif)  # carpeta del tif de clases
-    stem = os.path.basename(base)  # nombre base sin extensión
-    hits = glob.glob(os.path.join(folder, f"{stem}*_accretion{ext}"))  # buscar variantes
-    return hits[0] if hits else None  # devolver primera coincidencia o None
-
-def _areas_por_habitat(tif_path):  # sumar áreas (ha) por clase
-    with rasterio.open(tif_path) as src:  # abrir tif
-        arr = src.read(1)  # leer banda 1
-        resx, resy = src.res  # resolución de píxel
-    pixel_area_m2 = float(abs(resx * resy))  # área de píxel en m²
-    valores, cuentas = np.unique(arr, return_counts=True)  # contar por valor
-    areas_ha = [float(c * pixel_area_m2 / 10000.0) for v, c in zip(valores, cuentas) if v in CLASS_INFO]  # pasar a ha
-    etiquetas = [CLASS_INFO[v][0] for v in valores if v in CLASS_INFO]  # etiquetas legibles
-    colores = [CLASS_INFO[v][1] for v in valores if v in CLASS_INFO]  # colores por clase
+def _areas_por_habitat(tif_path, acc_tif=None):  # áreas (ha) por clase desde el almacén de estadísticas
+    st = raster_stats(tif_path, acc_tif)  # precalculadas por versión del ráster
+    present = [v for v in sorted(CLASS_INFO) if st["counts"][v] > 0]  # solo clases presentes
+    areas_ha = [st["hectares"][v] for v in present]  # hectáreas
+    etiquetas = [CLASS_INFO[v][0] for v in present]  # etiquetas legibles
+    colores = [CLASS_INFO[v][1] for v in present]  # colores por clase
     return etiquetas, areas_ha, colores  # devolver resultados
 
-def _png_grafico_areas(titulo, etiquetas, valores, colores):  # crear PNG de barras (áreas)
-    fig, ax = plt.subplots(figsize=(8, 4.5), dpi=150)  # figura
-    bars = ax.bar(etiquetas, valores, color=colores)  # barras
-    ax.set_title(titulo)  # título
-    ax.set_xlabel("Habitat")  # eje X
-    ax.set_ylabel("Area (ha)")  # eje Y
-    ax.grid(True, alpha=0.3)  # rejilla
-    ymax = max(valores) if valores else 0  # máximo
-    ax.set_ylim(0, ymax*1.15 if ymax else 1)  # margen superior
-    for b, v in zip(bars, valores):  # anotar valores
-        ax.text(b.get_x()+b.get_width()/2, b.get_height(), f"{v:.2f}",
-                ha="center", va="bottom", fontweight="bold", fontsize=12)
-    buf = io.BytesIO()  # buffer
-    fig.tight_layout()  # ajustar
-    fig.savefig(buf, format="png")  # guardar PNG
-    plt.close(fig)  # cerrar
-    buf.seek(0)  # rebobinar
-    return buf  # devolver buffer
-
-def _accretion_volume_by_class(class_tif, acc_tif):  # calcular volumen acumulado por clase
-    with rasterio.open(class_tif) as cls:  # abrir clases
-        class_arr = cls.read(1)  # leer banda
-    with rasterio.open(acc_tif) as acc:  # abrir acreción
-        acc_arr = acc.read(1, masked=True)  # leer con máscara de nodata
-        resx, resy = acc.res  # resolución
-        pixel_area_m2 = abs(resx * resy)  # área de píxel
-    if class_arr.shape != acc_arr.shape:  # validar alineación
-        raise ValueError("Class raster and accretion raster are not aligned.")  # error si no coinciden
-    acc_filled = np.ma.filled(acc_arr, 0.0)  # rellenar nodata con 0
-    sums = np.bincount(class_arr.ravel(), weights=acc_filled.ravel(), minlength=4)  # sumar por clase
+def _accretion_volume_by_class(class_tif, acc_tif):  # volumen acumulado por clase desde el almacén
+    st = raster_stats(class_tif, acc_tif)  # precalculadas por versión de ambos rásters
+    if st.get("accretion_error"):  # p. ej. rásters no alineados
+        raise ValueError(st["accretion_error"])
+    vols = st["accretion_m3"] or []  # m³ por clase (None sin acreción)
     etiquetas, valores = [], []  # listas de salida
     for v in sorted(CLASS_INFO.keys()):  # recorrer clases
-        vol_m3 = float(sums[v] * pixel_area_m2)  # convertir a volumen
+        vol_m3 = vols[v] if v < len(vols) else 0.0  # volumen de la clase
         if abs(vol_m3) > 1e-9:  # ignorar cero exacto
             etiquetas.append(CLASS_INFO[v][0])  # añadir etiqueta
             valores.append(vol_m3)  # añadir valor
     return etiquetas, valores  # devolver resultados
 
-def _png_grafico_accretion(titulo, etiquetas, valores):  # crear PNG de acreción
-    colores = [LABEL_TO_COLOR[e] for e in etiquetas]  # colores por etiqueta
-    fig, ax = plt.subplots(figsize=(8, 4.5), dpi=150)  # figura
-    bars = ax.bar(etiquetas, valores, color=colores)  # barras
-    ax.set_title(titulo)  # título
-    ax.set_xlabel("Habitat")  # eje X
-    ax.set_ylabel("Accretion volume (m³/year)")  # eje Y
-    ax.grid(True, alpha=0.3)  # rejilla
-    ymax = max(valores) if valores else 0  # máximo
-    ax.set_ylim(0, ymax*1.15 if ymax else 1)  # margen
-    for b, v in zip(bars, valores):  # anotar valores
-        ax.text(b.get_x()+b.get_width()/2, b.get_height(), f"{v:.2f}",
-                ha="center", va="bottom", fontweight="bold", fontsize=12)
-    buf = io.BytesIO()  # buffer
-    fig.tight_layout()  # ajustar
-    fig.savefig(buf, format="png")  # guardar
-    plt.close(fig)  # cerrar
-    buf.seek(0)  # rebobinar
-    return buf  # devolver
+def _trajectory_line(years, series, title, y_title, year):  # gráfica de líneas por clase a lo largo de los años
+    fig = go.Figure()
+    for v in sorted(CLASS_INFO):  # una línea por clase
+        name, color = CLASS_INFO[v]
+        fig.add_trace(go.Scatter(x=years, y=[row[v] for row in series], name=name, mode="lines+markers",
+                                 line=dict(color=color, width=4), marker=dict(size=12)))
+    fig.add_vline(x=year, line_dash="dash", line_color="#555")  # año seleccionado
+    fig.update_layout(
+        title=title,
+        xaxis_title="<b>Year</b>",
+        yaxis_title=y_title,
+        title_x=0.5,
+        title_font_family="Garamond",
+        title_font_size=36,
+        height=560,
+        legend=dict(orientation="h", y=-0.25, font=dict(size=18)),
+        margin=dict(t=80, r=40, b=140, l=110)
+    )
+    fig.update_xaxes(tickvals=years, tickfont=dict(size=22), title_font=dict(size=24), automargin=True)
+    fig.update_yaxes(tickfont=dict(size=22), title_font=dict(size=24), title_standoff=38, automargin=True)
+    return dcc.Graph(figure=fig, config={"modeBarButtonsToRemove": ["zoom2d","pan2d","zoomIn2d","zoomOut2d","lasso2d","resetScale2d"]})
+
+
+def _trajectory_content(area, scen, year):  # líneas de área y acreción de todos los años de un escenario
+    traj = scenario_trajectory(area, scen)  # una pasada por bloques sobre la pila de años (cacheada)
+    if not traj or len(traj["years"]) < 2:
+        return html.Div("Not enough years in this scenario to draw a trajectory.", style={"color":"#555","fontStyle":"italic"})
+    children = [_trajectory_line(traj["years"], traj["hectares"], "<b>Habitat Areas (ha) over time</b>", "<b>Area (ha)</b>", year)]
+    if traj["accretion_m3"]:
+        children.append(_trajectory_line(traj["years"], traj["accretion_m3"], "<b>Accumulated Accretion (m³) over time</b>", "<b>Accretion volume (m³/year)</b>", year))
+    return html.Div(children)
+
+def _saltmarsh_tile_layer(area, scen, year, b, **kwargs):  # capa XYZ del tif de clases
+    url = f"/tiles/saltmarsh/{area}/{scen}/{year}/{{z}}/{{x}}/{{y}}.png"  # plantilla XYZ del endpoint de teselas
+    return dl.TileLayer(
+        url=url,
+        bounds=[[b.bottom, b.left], [b.top, b.right]],  # no pedir teselas fuera del ráster
+        **kwargs
+    )
+
+def _model_tile_layer(area, layer, min_certainty=0):  # capa XYZ de probabilidad/certeza/clase predicha
+    url = f"/tiles/saltmarsh/model/{area}/{layer}/{{z}}/{{x}}/{{y}}.png"  # plantilla XYZ
+    if min_certainty:
+        url += f"?min_certainty={float(min_certainty):.2f}"  # umbral de certeza (cambia la URL -> Leaflet recarga)
+    return dl.TileLayer(url=url, opacity=0.9, id=f"model-{layer}")
+
+SCENARIO_LABELS = {'regional_rcp45': 'Regional RCP4.5', 'regional_rcp85': 'Regional RCP8.5', 'global_rcp45': 'Global RCP4.5'}
+
+def _inspector_popup(info):  # popup con clase por escenario/año y salidas del modelo
+    cell = {'padding': '2px 6px', 'borderBottom': '1px solid #eee', 'fontSize': '12px'}
+    years = sorted({y for by_year in info["scenarios"].values() for y in by_year})
+    rows = []
+    for scen, by_year in sorted(info["scenarios"].items()):
+        tds = [html.Td(html.B(SCENARIO_LABELS.get(scen, scen)), style=cell)]
+        for y in years:
+            v = by_year.get(y) or {}
+            name = v.get("class_name")
+            acc = v.get("accretion")
+            text = name or "–"
+            if acc is not None:
+                text += f" ({acc:.3g})"
+            tds.append(html.Td(text, style={**cell, 'color': LABEL_TO_COLOR.get(name, '#555')}))
+        rows.append(html.Tr(tds))
+    children = []
+    if rows:
+        header = html.Tr([html.Th("Scenario", style=cell)] + [html.Th(str(y), style=cell) for y in years])
+        children.append(html.Table([html.Thead(header), html.Tbody(rows)]))
+        children.append(html.Div("Class (accretion) per scenario and year", style={'fontSize': '11px', 'color': '#777'}))
+    m = info["model"]
+    if m["probabilities"] or m["certainty"] is not None:
+        probs = ", ".join(f"{k}: {v:.2f}" for k, v in m["probabilities"].items() if v is not None)
+        lines = [html.B("Model: "), m["predicted_class_name"] or "–"]
+        if m["certainty"] is not None:
+            lines.append(f" · certainty {m['certainty']:.2f}")
+        children.append(html.Div(lines, style={'marginTop': '6px', 'fontSize': '12px'}))
+        if probs:
+            children.append(html.Div(probs, style={'fontSize': '12px'}))
+    if not children:
+        children = [html.Div("No data at this location.", style={'fontStyle': 'italic'})]
+    return dl.Popup(position=[info["lat"], info["lng"]], children=children, maxWidth=600)
 
 # Functions to style the EVA Overscale Modal:
+_training_ns = Namespace("saltmarsh", "trainingPoints")  # app/assets/saltmarsh_training_points.js
+
+
+def _training_points_layer(area, zoom):  # una sola capa GeoJSON (clusters del servidor por zoom)
+    data = training_points_geojson(area, zoom)
+    if data is None:
+        return []
+    return [dl.GeoJSON(
+        id="training-points-geojson",
+        data=data,
+        pointToLayer=_training_ns("pointToLayer"),  # estilo en el cliente: color por código de clase
+        hideout={"colors": [CLASS_INFO[k][1] for k in sorted(CLASS_INFO)], "labels": CLASS_LABELS},
+    )]
+
 def row3(*cols):
     cols = list(cols)
     while len(cols) < 3:
@@ -884,6 +927,20 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
                                         labelClassName= 'form-check-label'
 
                                         
+                                    ),
+                                    html.Legend("Model outputs", className="mt-4"),
+                                    dcc.Dropdown(  # probabilidad por clase, certeza o clase predicha
+                                        id='model-layer-dropdown',
+                                        options=[],  # según el área
+                                        placeholder="No model layer",
+                                        className='dropdown-text',
+                                        searchable=False
+                                    ),
+                                    html.Div("Minimum model certainty", className="mt-2"),
+                                    dcc.Slider(  # ocultar píxeles con certeza por debajo del umbral (fracción del rango)
+                                        id='certainty-threshold',
+                                        min=0, max=1, step=0.05, value=0,
+                                        marks={0: '0', 0.5: '0.5', 1: '1'}
                                     )
                                 ]
                             )
@@ -907,7 +964,7 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
                                         hidden=True,  # oculto al inicio
                                         n_clicks=0  # contador
                                     ),
-                                    html.Div(  # contenedor de descarga
+                                    html.A(  # enlace al ZIP servido en streaming por Flask
                                         [
                                             html.Button(  # botón de descarga
                                                 [html.Img(src='assets/logos/download.png', style={'width':'20px','height':'20px'}), html.Span("Download results")],  # contenido
@@ -915,9 +972,10 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
                                                 hidden=True,  # oculto al inicio
                                                 n_clicks=0,  # contador
                                                 className='btn btn-outline-primary'
-                                            ),
-                                            dcc.Download(id='saltmarsh-download')  # componente de descarga
-                                        ]
+                                            )
+                                        ],
+                                        id='marsh-results-link',  # href según área/año
+                                        download=""
                                     )
                                 ]
                             )
@@ -943,14 +1001,17 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
 
     @app.callback(
         Output("reg-rcp45", "children", allow_duplicate=True),
+        Output("model-layer", "children", allow_duplicate=True),
+        Output("pixel-inspector", "children", allow_duplicate=True),
         Output("training-points","children", allow_duplicate= True),
         Output("training-points-legend-div", "children", allow_duplicate= True),
+        Output("training-points-store", "data", allow_duplicate=True),
         Input("tabs", "value"),
         prevent_initial_call=True
     )
     def clear_overlay_on_tab_change(tab_value):
         if tab_value != "tab-saltmarsh":
-            return [], [], []            # limpiar overlay al salir del tab
+            return [], [], [], [], [], None      # limpiar overlay al salir del tab
         raise PreventUpdate       # no toques nada cuando estás en Saltmarsh
 
 
@@ -960,10 +1021,9 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
         Input("study-area-dropdown","value")
     )
     def update_year_options(area):  # actualizar años
-        if area=="Urdaibai_Estuary": years=[2017,2067,2117]
-        elif area=="Bay_of_Santander": years=[2012,2062,2112]
-        elif area=="Cadiz_Bay": years=[2023,2073,2123]
-        else: return [], True
+        years = CATALOG.years(area) if area else []  # años disponibles en el catálogo
+        if not years:
+            return [], True
         return ([{"label":str(y),"value":y} for y in years], False)
 
     @app.callback(  # centrar/zoom por área
@@ -974,14 +1034,42 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
     def center_and_zoom(area):  # cambiar viewport
         if not area:
             raise PreventUpdate
-        mapping = {
-            "Urdaibai_Estuary": ([43.364580815052316, -2.67957208131426804], 14),
-            "Bay_of_Santander": ([43.43984351219931,  -3.7526739449807447], 15),
-            "Cadiz_Bay":        ([36.520874060327226, -6.203490800462997],  15)
-        }
-        center, zoom = mapping[area]
+        center, zoom = AREA_VIEWPORTS[area]
         return {"center": center, "zoom": zoom}
 
+    @app.callback(  # reagrupar los puntos de entrenamiento al cambiar de zoom
+        Output("training-points", "children", allow_duplicate=True),
+        Output("training-points-store", "data", allow_duplicate=True),
+        Input("map", "zoom"),
+        State("training-points-store", "data"),
+        prevent_initial_call=True
+    )
+    def recluster_training_points(zoom, tp):  # solo si cambia el nivel de agrupación
+        if not tp or not tp.get("area"):
+            raise PreventUpdate
+        level = cluster_level(zoom)
+        if level == tp.get("level"):
+            raise PreventUpdate
+        return _training_points_layer(tp["area"], zoom), {"area": tp["area"], "level": level}
+
+    @app.callback(  # precalentar teselas y estadísticas de todos los escenarios al elegir área/año
+        Output("saltmarsh-prewarm", "data"),
+        Input("study-area-dropdown", "value"),
+        Input("year-dropdown", "value"),
+        State("session-id", "data"),
+        State("saltmarsh-prewarm", "data"),
+        prevent_initial_call=True
+    )
+    def prewarm_scenarios(area, year, sid, prev):  # encolar precalentado (cancela el de la selección anterior)
+        # session-id solo existe tras abrir Management: sin él, token propio de esta pestaña (no compartido)
+        token = sid or (prev or {}).get("token") or uuid.uuid4().hex
+        if not (area and year and area in AREA_VIEWPORTS):
+            PREWARM.cancel(token)  # selección incompleta: no seguir trabajando para la anterior
+            return {"token": token}
+        zoom = AREA_VIEWPORTS[area][1]
+        PREWARM.schedule(token, area, year, zooms=(zoom, zoom + 1), first="regional_rcp45")  # zoom inicial y el siguiente
+        return {"area": area, "year": year, "token": token}
+
     @app.callback(  # habilitar Run cuando hay área y año
         Output("run-button","disabled", allow_duplicate=True),
         Input("study-area-dropdown","value"),
@@ -1000,6 +1088,7 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
         Output("run-button", "disabled"),
         Output('marsh-results', 'hidden'),
         Output("training-points-legend-div", "children", allow_duplicate=True),
+        Output("training-points-store", "data", allow_duplicate=True),
         Input("run-button","n_clicks"),
         State("study-area-dropdown","value"),
         State("year-dropdown","value"),
@@ -1007,99 +1096,25 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
     )
     def update_map(n, area, year):  # añadir overlays
         if not (n and area and year):
-            return [], [], True, False, False, True, True, []
+            return [], [], True, False, False, True, True, [], None
         
         scen = 'regional_rcp45'
-        tif_dir = os.path.join(os.getcwd(),"results","saltmarshes",area,scen)  # construir ruta al directorio de TIFs
-        matches = glob.glob(os.path.join(tif_dir,f"*{year}*.tif"))  # buscar el TIF del año
-        if not matches:  # comprobar que existe el TIF
+        tif_path = class_tif(area, scen, year)  # TIF de clases del año (catálogo)
+        if not tif_path:  # comprobar que existe el TIF
             raise PreventUpdate  # no actualizar si no hay datos
-        m = matches[0]  # tomar el primer TIF disponible
-        with rasterio.open(m) as src, WarpedVRT(src,crs="EPSG:4326",resampling=Resampling.nearest) as vrt:  # abrir y reproyectar a WGS84 para bounds
-            data = vrt.read(1,masked=True)  # leer banda como masked
-            import numpy as np  # importar numpy localmente para enmascarado
-            data = np.ma.masked_where(data.data==0,data)  # enmascarar clase 0 como nodata por coherencia visual
-            b = vrt.bounds  # extraer límites geográficos
-        url = f"/raster/{area}/{scen}/{year}.png"  # construir URL del PNG servido por Flask
-
-        overlay = dl.ImageOverlay(
-            url=url,
-            bounds=[[b.bottom, b.left], [b.top, b.right]],
-            opacity=0.95
-        )
-
-        # Get the training dataset of the study areas and add it to map:
-        if area == "Urdaibai_Estuary":
-            points_path = os.path.join(os.getcwd(), "data", "Urdaibai_Estuary", "urdaibai_estuary_training_dataset.parquet")
-        elif area == "Bay_of_Santander":
-            points_path = os.path.join(os.getcwd(), "data", "Bay_of_Santander", "bay_santander_training_dataset.parquet")
-        elif area == "Cadiz_Bay":
-            points_path = os.path.join(os.getcwd(), "data", "Cadiz_Bay", "cadiz_bay_training_dataset.parquet")
-        else:
-            points_path = None
+        b = bounds_4326(tif_path)  # límites WGS84 desde el manifiesto (sin leer píxeles)
+        if b is None:  # ráster ilegible
+            raise PreventUpdate
+        overlay = _saltmarsh_tile_layer(area, scen, year, b, opacity=0.95)  # teselas XYZ servidas por Flask
 
-        markers = []
+        # Get the training dataset of the study areas and add it to map (one GeoJSON layer, clustered by zoom on the server):
+        zoom = AREA_VIEWPORTS.get(area, (None, None))[1]  # zoom inicial del área
+        markers = _training_points_layer(area, zoom)
+        tp_store = {"area": area, "level": cluster_level(zoom)} if markers else None
 
         legend = _build_training_points_legend()
 
-        if points_path and os.path.exists(points_path):
-            gdf_points = gpd.read_parquet(points_path)
-
-            # reproyectar a EPSG:4326 (requerido)
-            gdf_wgs = gdf_points.to_crs(epsg=4326) if gdf_points.crs is not None else gdf_points.copy()
-
-            # crear marcadores (dl.CircleMarker) por cada punto y asignar color según la clase
-            for _, row in gdf_wgs.iterrows():
-                geom = row.geometry
-                if geom is None:
-                    continue
-                # obtener lat/lon (WGS84)
-                try:
-                    lat, lon = float(geom.y), float(geom.x)
-                except Exception:
-                    try:
-                        coords = list(geom.coords)[0]
-                        lon, lat = float(coords[0]), float(coords[1])
-                    except Exception:
-                        continue
-
-                # leer valor de clase (puede ser int o etiqueta str)
-                if area == "Urdaibai_Estuary":
-                    raw = row.get('Class') if 'Class' in row.index else row.get('class', None)
-                else:
-                    raw = row.get('class') if 'class' in row.index else row.get('Class', None)
-
-                # normalizar a etiqueta y obtener color
-                habitat_label = None
-                color = "#000000"
-                try:
-                    # si es entero -> mapear desde CLASS_INFO
-                    if isinstance(raw, (int, float, np.integer)) or (isinstance(raw, (str,)) and raw.isdigit()):
-                        idx = int(raw)
-                        if idx in CLASS_INFO:
-                            habitat_label, color = CLASS_INFO[idx]
-                    else:
-                        # tratar como texto (p. ej. "Mudflat", "Saltmarsh", ...)
-                        habitat_label = str(raw) if raw is not None else "unknown"
-                        color = LABEL_TO_COLOR.get(habitat_label, "#000000")
-                except Exception:
-                    habitat_label = str(raw)
-
-                # crear CircleMarker con fillColor para que se vea el color
-                m = dl.CircleMarker(
-                    center=[lat, lon],
-                    radius=5,
-                    color="#000000",        # borde (puede ser igual al relleno)
-                    weight=2,
-                    fill=True,
-                    fillColor= color,
-                    fillOpacity=0.9,
-                    opacity=1,
-                    children=[dl.Tooltip(habitat_label or "")]
-                )
-                markers.append(m)
-
-        return overlay, markers, False, True, True, True, False, legend  # estados de UI
+        return overlay, markers, False, True, True, True, False, legend, tp_store  # estados de UI
 
     @app.callback(  # reset total
         Output("study-area-dropdown", "value", allow_duplicate=True),
@@ -1117,12 +1132,17 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
         Output('map', 'viewport'),
         Output("training-points","children"),
         Output("training-points-legend-div", "children"),
+        Output("training-points-store", "data", allow_duplicate=True),
+        Output("model-layer", "children", allow_duplicate=True),
+        Output("model-layer-dropdown", "value", allow_duplicate=True),
+        Output("certainty-threshold", "value", allow_duplicate=True),
+        Output("pixel-inspector", "children", allow_duplicate=True),
         Input("reset-button", "n_clicks"),
         prevent_initial_call=True
     )
     def reset(n):  # limpiar todo
         if n:
-            return [None, False, None, True, [], [], True, True, True, True, True, 'reg45', {"center": [40, -3.5], "zoom": 7}, [], []]
+            return [None, False, None, True, [], [], True, True, True, True, True, 'reg45', {"center": [40, -3.5], "zoom": 7}, [], [], None, [], None, 0, []]
         raise PreventUpdate
 
     @app.callback(  # gráficas con sub-tabs por escenario
@@ -1141,14 +1161,8 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
         if not (n and area and year):
             raise PreventUpdate
 
-        def class_tif(area, scen, year):  # localizar tif de clases
-            base = os.path.join(os.getcwd(), "results", "saltmarshes", area, scen)  # carpeta base
-            hits = glob.glob(os.path.join(base, f"*{year}*.tif")) + glob.glob(os.path.join(base, f"*{year}*.tiff"))  # candidatos
-            hits = [p for p in hits if "accretion" not in os.path.basename(p).lower()]  # excluir acreción
-            return sorted(hits)[0] if hits else None  # devolver primero o None
-
-        def fig_areas_from_tif(tif_path, y_max_area):
-            etiquetas, areas_ha, _ = _areas_por_habitat(tif_path)
+        def fig_areas_from_tif(tif_path, acc_tif, y_max_area):
+            etiquetas, areas_ha, _ = _areas_por_habitat(tif_path, acc_tif)
             fig = px.bar(
                 x=etiquetas, y=areas_ha, title="<b>Habitat Areas (ha)</b>",
                 color=etiquetas, color_discrete_map=LABEL_TO_COLOR
@@ -1188,8 +1202,7 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
             return fig
 
 
-        def fig_acc_from_pair(class_tif_path, y_max_acc):
-            acc_tif = _acc_tif_from_class_tif(class_tif_path)
+        def fig_acc_from_pair(class_tif_path, acc_tif, y_max_acc):
             if not acc_tif:
                 return html.Div("No accretion raster found in this scenario folder.",
                                 style={"color":"#555","fontStyle":"italic"})
@@ -1242,7 +1255,7 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
 
 
 
-        # Scan all scenarios to find the maximum area and accretion to fix the y-axis of the graphs:
+        # Scan all scenarios to find the maximum area and accretion to fix the y-axis of the graphs (lookups in the stats store):
         global_area_max = 0.0
         global_acc_max  = 0.0
         for scen, _ in SCENARIOS:
@@ -1250,11 +1263,11 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
             if not t:
                 continue
             # áreas
-            _, areas_ha, _ = _areas_por_habitat(t)
+            _, areas_ha, _ = _areas_por_habitat(t, accretion_tif(area, scen, year))
             if areas_ha:
                 global_area_max = max(global_area_max, max(areas_ha))
             # acreción
-            acc_t = _acc_tif_from_class_tif(t)
+            acc_t = accretion_tif(area, scen, year)
             if acc_t:
                 try:
                     _, vals = _accretion_volume_by_class(t, acc_t)
@@ -1267,7 +1280,7 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
         global_area_max = global_area_max * 1.30 if global_area_max else 1.0
         global_acc_max  = global_acc_max  * 1.30 if global_acc_max  else 1.0
 
-        area_tabs_children, acc_tabs_children = [], []  # listas de tabs
+        area_tabs_children, acc_tabs_children, traj_tabs_children = [], [], []  # listas de tabs
         first_value = None  # valor inicial seleccionado
 
         for scen, scen_label in SCENARIOS:  # recorrer escenarios
@@ -1277,11 +1290,13 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
                 acc_tabs_children.append(dcc.Tab(label=scen_label, value=scen, children=[html.Div("No accretion raster found for this scenario/year.", style={"color":"#555","fontStyle":"italic"})]))  # tab vacío
                 continue  # siguiente escenario
 
-            fig_areas = fig_areas_from_tif(tif_path, global_area_max)  # construir figura
+            fig_areas = fig_areas_from_tif(tif_path, accretion_tif(area, scen, year), global_area_max)  # construir figura
             area_tabs_children.append(dcc.Tab(label=scen_label, value=scen, children=[dcc.Graph(figure=fig_areas, config={"modeBarButtonsToRemove": ["zoom2d","pan2d","zoomIn2d","zoomOut2d","lasso2d","resetScale2d"]})], style={"fontSize": "var(--font-md)", "padding": "0.55rem 1rem"}, selected_style={"fontSize": "var(--font-lg)", "padding": "0.55rem 1rem"}))  # tab con figura
-            acc_content = fig_acc_from_pair(tif_path, global_acc_max)  # contenido de acreción
+            acc_content = fig_acc_from_pair(tif_path, accretion_tif(area, scen, year), global_acc_max)  # contenido de acreción
             acc_tabs_children.append(dcc.Tab(label=scen_label, value=scen, children=[acc_content], style={"fontSize": "var(--font-lg)", "padding": "0.55rem 1rem"}, selected_style={"fontSize": "var(--font-md)", "padding": "0.55rem 1rem"}))  # tab de acreción
 
+            traj_tabs_children.append(dcc.Tab(label=scen_label, value=scen, children=[_trajectory_content(area, scen, year)], style={"fontSize": "var(--font-md)", "padding": "0.55rem 1rem"}, selected_style={"fontSize": "var(--font-lg)", "padding": "0.55rem 1rem"}))  # tab de trayectoria
+
             if first_value is None:  # fijar tab inicial
                 first_value = scen  # seleccionar este
 
@@ -1292,7 +1307,7 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
             id="saltmarsh-inner-tabs",  # id de tabs
             className='form-check',
             value="areas",  # seleccionar áreas
-            children=[  # dos pestañas principales
+            children=[  # pestañas principales
                 dcc.Tab(  # pestaña de áreas
                     label='Habitat Areas',  # etiqueta
                     value='areas',  # valor
@@ -1302,52 +1317,25 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
                     label='Accumulated Accretion',  # etiqueta
                     value='accretion',  # valor
                     children=[dcc.Tabs(id="accretion-by-scen", value=first_value, children=acc_tabs_children)]  # sub-tabs por escenario
+                ),
+                dcc.Tab(  # pestaña de trayectorias (todos los años)
+                    label='Trajectory',  # etiqueta
+                    value='trajectory',  # valor
+                    children=[dcc.Tabs(id="trajectory-by-scen", value=first_value, children=traj_tabs_children)]  # sub-tabs por escenario
                 )
             ]
         )
         return [charts, False, False, False, False, False]  # devolver UI y mostrar botón info
 
-    @app.callback(  # descarga ZIP por escenario
-        Output('saltmarsh-download', 'data'),
-        Input('marsh-results', 'n_clicks'),
-        State("study-area-dropdown", "value"),
-        State("year-dropdown", "value"),
-        prevent_initial_call=True
+    @app.callback(  # enlace de descarga según área y año
+        Output('marsh-results-link', 'href'),
+        Input("study-area-dropdown", "value"),
+        Input("year-dropdown", "value"),
     )
-    def download_results(n, area, year):  # construir zip
-        if not (n and area and year):
-            raise PreventUpdate
-
-        def class_tif(area, scen, year):  # helper localizar tif de clases
-            base = os.path.join(os.getcwd(), "results", "saltmarshes", area, scen)  # ruta base
-            hits = glob.glob(os.path.join(base, f"*{year}*.tif")) + glob.glob(os.path.join(base, f"*{year}*.tiff"))  # candidatos
-            hits = [p for p in hits if "accretion" not in os.path.basename(p).lower()]  # excluir acreción
-            return sorted(hits)[0] if hits else None  # primero o None
-
-        zip_buf = io.BytesIO()  # buffer del zip
-        with ZipFile(zip_buf, 'w') as zf:  # abrir zip
-            for scen, _ in SCENARIOS:  # recorrer escenarios
-                tif_path = class_tif(area, scen, year)  # localizar tif
-                if not tif_path:  # si no existe
-                    continue  # saltar
-                etiquetas, areas_ha, colores = _areas_por_habitat(tif_path)  # calcular áreas
-                titulo = f"Habitat Areas — {area} / {scen} / {year}"  # título
-                png_buf = _png_grafico_areas(titulo, etiquetas, areas_ha, colores)  # generar PNG
-                zf.writestr(f"{scen}/habitat_areas_{area}_{scen}_{year}.png", png_buf.getvalue())  # añadir PNG
-                zf.write(tif_path, arcname=f"{scen}/{os.path.basename(tif_path)}")  # añadir TIF de clases
-                acc_tif = _acc_tif_from_class_tif(tif_path)  # localizar accretion
-                if acc_tif and os.path.exists(acc_tif):  # si existe
-                    try:  # intentar PNG de acreción
-                        etiquetas_acc, valores_acc = _accretion_volume_by_class(tif_path, acc_tif)  # calcular volúmenes
-                        if valores_acc:  # si hay datos
-                            titulo_acc = f"Accumulated Accretion — {area} / {scen} / {year}"  # título
-                            acc_png_buf = _png_grafico_accretion(titulo_acc, etiquetas_acc, valores_acc)  # generar PNG
-                            zf.writestr(f"{scen}/accumulated_accretion_{area}_{scen}_{year}.png", acc_png_buf.getvalue())  # añadir PNG
-                    except Exception:  # silenciar errores de cálculo
-                        pass  # continuar
-                    zf.write(acc_tif, arcname=f"{scen}/{os.path.basename(acc_tif)}")  # añadir TIF de accretion
-        zip_buf.seek(0)  # rebobinar
-        return dcc.send_bytes(lambda f: f.write(zip_buf.getvalue()), filename=f"saltmarsh_results_{area}_{year}.zip")  # devolver zip
+    def update_download_link(area, year):  # /download/saltmarsh/<área>/<año>.zip
+        if not (area and year):
+            return None
+        return f"/download/saltmarsh/{area}/{year}.zip"
 
     @app.callback(  # toggle modal info
         Output("info-modal", "is_open"),
@@ -1379,16 +1367,51 @@ def register_tab_callbacks(app: dash.Dash):  # registrar callbacks
             raise PreventUpdate
         scen_map = {'reg45':'regional_rcp45','reg85':'regional_rcp85','glo45':'global_rcp45'}
         scen = scen_map[selected]
-        base = os.path.join(os.getcwd(), "results", "saltmarshes", area, scen)
-        matches = sorted(glob.glob(os.path.join(base, f"*{year}*.tif")))
-        if not matches:
+        tif_path = class_tif(area, scen, year)  # catálogo
+        if not tif_path:
             return []
-        with rasterio.open(matches[0]) as src, WarpedVRT(src, crs="EPSG:4326", resampling=Resampling.nearest) as vrt:
-            b = vrt.bounds
-        url = f"/raster/{area}/{scen}/{year}.png?ts={int(time.time())}"
-        return [dl.ImageOverlay(id=f"overlay-{scen}", url=url,
-                                bounds=[[b.bottom,b.left],[b.top,b.right]], opacity=1)]
+        b = bounds_4326(tif_path)  # límites WGS84 desde el manifiesto
+        if b is None:
+            return []
+        return [_saltmarsh_tile_layer(area, scen, year, b, opacity=1, id=f"overlay-{scen}")]
     
+    @app.callback(  # inspector de píxel: valores bajo el punto clicado
+        Output('pixel-inspector', 'children'),
+        Input('map', 'clickData'),
+        State('study-area-dropdown', 'value'),
+        State('tabs', 'value'),
+        prevent_initial_call=True
+    )
+    def inspect_clicked_pixel(click, area, tab):
+        if tab != 'tab-saltmarsh' or not (click and area):
+            raise PreventUpdate
+        latlng = click.get('latlng') or {}
+        if 'lat' not in latlng:
+            raise PreventUpdate
+        return [_inspector_popup(inspect_point(area, latlng['lat'], latlng['lng']))]
+
+    @app.callback(  # capas del modelo disponibles en el área
+        Output('model-layer-dropdown', 'options'),
+        Output('model-layer-dropdown', 'value', allow_duplicate=True),
+        Input('study-area-dropdown', 'value'),
+        prevent_initial_call=True
+    )
+    def update_model_layer_options(area):
+        layers = model_layers(area) if area else {}
+        return [{'label': MODEL_LAYERS[name][0], 'value': name} for name in layers], None
+
+    @app.callback(  # pintar la capa del modelo con el umbral de certeza
+        Output('model-layer', 'children', allow_duplicate=True),
+        Input('model-layer-dropdown', 'value'),
+        Input('certainty-threshold', 'value'),
+        State('study-area-dropdown', 'value'),
+        prevent_initial_call=True
+    )
+    def model_layer_overlay(layer, min_certainty, area):
+        if not (area and layer):
+            return []
+        return [_model_tile_layer(area, layer, min_certainty or 0)]
+
     # Callback para cambiar los link del footer y el texto si es el caso:
     @app.callback(
         Output("method-link", "children"),
@@ -1,4 +1,4 @@
-# app/callbacks/opsa_callbacks.py  # callbacks del tab Physical con 6 capas estáticas por clase
+# app/callbacks/opsa_callbacks.py  # callbacks del tab Physical: una capa OPSA coloreada en el cliente por código de clase
 import dash  # framework Dash
 from typing import List  # tipado de listas
 from dash import Input, Output, State, html, dash_table, dcc, callback_context  # componentes Dash
@@ -8,11 +8,15 @@ import pandas as pd
 import io, zipfile, json # buffers en memoria
 from zipfile import ZipFile  # crear ZIPs
 
-from app.models.opsa import compute_condition_mean, compute_summary_by_habitat_type  # función del modelo OPSA
+from dash_extensions.javascript import Namespace  # funciones JS de app/assets
+from app.models.opsa import area_bounds, compute_condition_mean, compute_summary_by_habitat_type, condition_codes  # función del modelo OPSA
+
+CLASS_COLORS = ['#edf8e9','#bae4b3','#74c476','#31a354','#006d2c']  # clases 1..5 (verde claro→oscuro)
+_opsa_ns = Namespace("opsa", "condition")  # app/assets/opsa_condition.js
 
 
 # ---------------------------
-# Utilidades (leyenda y split)
+# Utilidades (leyenda)
 # ---------------------------
 
 def _legend_item(color: str, label: str) -> html.Div:  # crear un ítem de leyenda con color sólido
@@ -41,7 +45,7 @@ def _legend_nodata() -> html.Div:  # crear ítem de leyenda para NoData
     )
 
 def _build_legend() -> html.Div:  # construir la leyenda completa
-    colors = ['#edf8e9','#bae4b3','#74c476','#31a354','#006d2c']  # paleta 5 clases (verde claro→oscuro)
+    colors = CLASS_COLORS  # paleta 5 clases (verde claro→oscuro)
     labels = ['Very low (0–1)','Low (1–2)','Medium (2–3)','High (3–4)','Very high (4–5)']  # etiquetas
     return html.Div(  # contenedor de leyenda
         className="legend",
@@ -52,20 +56,6 @@ def _build_legend() -> html.Div:  # construir la leyenda completa
         ]
     )
 
-def _split_geojson_by_class(geojson: dict, class_field: str = "condition_class") -> dict:  # dividir features por clase
-    buckets = {i: {'type': 'FeatureCollection', 'features': []} for i in range(6)}  # crear 6 buckets (0..5)
-    for f in geojson.get('features', []):  # recorrer features
-        props = f.get('properties', {}) or {}  # obtener propiedades
-        cls_raw = props.get(class_field, 0)  # leer clase
-        try:  # intentar convertir a entero
-            cls = int(cls_raw)  # a entero
-        except Exception:  # si falla conversión
-            cls = 0  # mandar a NoData
-        cls = 0 if cls < 0 or cls > 5 else cls  # acotar a 0..5
-        buckets[cls]['features'].append(f)  # añadir la feature al bucket
-    return buckets  # devolver diccionario clase->FeatureCollection
-
-
 # ---------------------------
 # Registro de callbacks OPSA
 # ---------------------------
@@ -111,7 +101,7 @@ def register_opsa_tab_callbacks(app: dash.Dash):  # registrar callbacks del tab
     def toggle_run_button(selected: List[str]):  # conmutar Run
         return not bool(selected)  # deshabilitar si no hay selección
 
-    @app.callback(  # ejecutar modelo y pintar 6 capas estáticas por clase (sin JS)
+    @app.callback(  # ejecutar modelo y pintar una capa coloreada en el cliente por código de clase
         Output("opsa-layer", "children", allow_duplicate=True),  # lista de capas a pintar
         Output("reset-eva-button", "disabled"),  # habilitar Reset
         Output("opsa-study-area", "disabled", allow_duplicate=True),  # bloquear área
@@ -131,66 +121,25 @@ def register_opsa_tab_callbacks(app: dash.Dash):  # registrar callbacks del tab
         if not (n and area and components):  # validar entradas
             raise PreventUpdate  # no actualizar
 
-        # 1) Ejecutar modelo -> GeoJSON con 'condition', 'confidence' y 'condition_class'
-        geojson, parquet_path = compute_condition_mean(  # llamar a la función del modelo
-            study_area=area,  # área
-            components=components,  # lista de EC
-            out_field_condition="condition",  # campo condición
-            out_field_confidence="confidence",  # campo confianza
-            out_field_class="condition_class",  # campo clase discreta 0..5
-            persist=True  # persistir en parquet
-        )
-
-        # 2) Dividir en 6 FeatureCollections por clase 0..5
-        buckets = _split_geojson_by_class(geojson, class_field="condition_class")  # dividir
-        # paleta por clase 1..5 (verde claro→oscuro)
-        class_colors = {1:'#edf8e9', 2:'#bae4b3', 3:'#74c476', 4:'#31a354', 5:'#006d2c'}  # colores
-        layers = []  # lista de capas a devolver
-
-        # 2.1) Capa NoData (clase 0) con borde negro y relleno transparente
-        if buckets[0]['features']:  # si hay features NoData
-            layers.append(  # añadir capa
-                dl.GeoJSON(  # capa GeoJSON
-                    id="opsa-class-0",  # id de capa
-                    data=buckets[0],  # solo features clase 0
-                    options={"style": {"color": "black", "weight": 1, "dashArray": "4", "fillOpacity": 0.0}},  # estilo estático
-                    zoomToBounds=False  # no forzar zoom con NoData
-                )
-            )
-
-        # 2.2) Capas 1..5 con color sólido por clase
-        for cls in (1, 2, 3, 4, 5):  # recorrer clases
-            feats = buckets[cls]['features']  # obtener features de la clase
-            if not feats:  # si no hay features
-                continue  # saltar clase
-            color = class_colors[cls]  # color para la clase
-            layers.append(  # añadir capa
-                dl.GeoJSON(  # capa GeoJSON
-                    id=f"opsa-class-{cls}",  # id único
-                    data=buckets[cls],  # features de la clase
-                    options={"style": {"fillColor": color, "color": "#ffffff", "weight": 0.5, "fillOpacity": 0.75}},  # estilo sólido
-                    zoomToBounds=True  # encuadrar al contenido
-                )
+        # 1) Ejecutar modelo -> clase 0..5 de cada polígono como cadena de dígitos (KB, no MB)
+        codes = condition_codes(area, components)  # celosía/caché en memoria
+
+        # 2) Una sola capa: la geometría llega por URL (cacheada por el navegador) y el color sale del hideout
+        layers = [
+            dl.GeoJSON(
+                id="opsa-geojson",  # id de capa
+                url=f"/geojson/opsa/{area}.json",  # geometría del área con id = fila (ETag + max-age)
+                style=_opsa_ns("style"),  # app/assets/opsa_condition.js
+                hideout={"classes": codes, "colors": CLASS_COLORS},  # lo único que cambia entre ejecuciones
+                zoomToBounds=True  # encuadrar al contenido
             )
+        ]
 
-        # 3) Calcular viewport de respaldo (por si no se ajusta con zoomToBounds)
-        try:  # intentar calcular bbox con todas las features
-            coords = []  # lista de coordenadas
-            for f in geojson.get("features", []):  # recorrer todas las features
-                g = f.get("geometry")  # obtener geometría
-                if not g:  # si no hay geometría
-                    continue  # saltar
-                def _walk(c):  # recorrido recursivo de coords
-                    if isinstance(c[0], (float, int)):  # si es par [lon,lat]
-                        coords.append(c)  # añadir coordenada
-                    else:  # si es lista de listas
-                        for cc in c:  # recorrer sublista
-                            _walk(cc)  # recursión
-                _walk(g.get("coordinates", []))  # iniciar recorrido
-            lats = [p[1] for p in coords]  # lista de latitudes
-            lons = [p[0] for p in coords]  # lista de longitudes
-            viewport = {"center": [(min(lats)+max(lats))/2.0, (min(lons)+max(lons))/2.0], "zoom": 9} if (lats and lons) else dash.no_update  # viewport
-        except Exception:  # ante cualquier error
+        # 3) Viewport de respaldo (por si no se ajusta con zoomToBounds) desde el bbox de los metadatos
+        try:
+            w, s_, e, n_ = area_bounds(area)
+            viewport = {"center": [(s_ + n_) / 2.0, (w + e) / 2.0], "zoom": 9}
+        except Exception:  # sin bbox
             viewport = dash.no_update  # no tocar viewport
 
         # 4) Construir leyenda
@@ -198,7 +147,7 @@ def register_opsa_tab_callbacks(app: dash.Dash):  # registrar callbacks del tab
 
         # 5) Resumen por 'x' en tabla (modelo devuelve km² y promedios ponderados)
         try:  # intentar construir tabla
-            df = compute_summary_by_habitat_type(parquet_path=parquet_path, study_area=area, group_field="AllcombD")  # obtener DF
+            df = compute_summary_by_habitat_type(study_area=area, components=components, group_field="AllcombD")  # desde la caché
             df_disp = df.copy()  # copiar para formateo
             df_disp["area_km"] = df_disp["area_km"].round(3)  # redondear área a 3 decimales
             df_disp["condition_wavg"] = df_disp["condition_wavg"].round(2)  # redondear condición a 2 decimales
@@ -293,10 +242,11 @@ def register_opsa_tab_callbacks(app: dash.Dash):  # registrar callbacks del tab
         Input("opsa-results", "n_clicks"),                           # ← clic en el botón
         State("opsa-summary-table", "derived_virtual_data"),         # ← filas visibles (filtro/orden)
         State("opsa-summary-table", "data"),                         # ← filas originales
-        State("opsa-layer", "children"),                             # ← capas pintadas
+        State("opsa-study-area", "value"),                           # ← área de la ejecución
+        State("ec-dropdown", "value"),                               # ← componentes de la ejecución
         prevent_initial_call=True
     )
-    def download_opsa_table(n, visible_rows, all_rows, opsa_layer):
+    def download_opsa_table(n, visible_rows, all_rows, area, components):
         if not n:
             raise PreventUpdate
 
@@ -308,15 +258,11 @@ def register_opsa_tab_callbacks(app: dash.Dash):  # registrar callbacks del tab
         df = pd.DataFrame(rows)
         csv_text = df.to_csv(index=False)  # ← string CSV
 
-        # 2) Extraer GeoJSON desde las capas del mapa y unir features
-        features = []
-        if isinstance(opsa_layer, list):
-            for child in opsa_layer:
-                # Cada child es un dict (layout serializado); sus datos están en child["props"]["data"]
-                data = (child.get("props", {}) or {}).get("data") if isinstance(child, dict) else None
-                if isinstance(data, dict) and data.get("type") == "FeatureCollection":
-                    features.extend(data.get("features", []))
-        geojson_dict = {"type": "FeatureCollection", "features": features}
+        # 2) GeoJSON completo (atributos + condition) generado en el servidor: el mapa ya no lo lleva
+        try:
+            geojson_dict, _ = compute_condition_mean(area, components)  # resultado cacheado
+        except Exception:
+            geojson_dict = {"type": "FeatureCollection", "features": []}
 
         # 3) Comprimir ambos en un ZIP en memoria
         def _writer(buf):
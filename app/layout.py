@@ -36,6 +36,10 @@ def create_layout():  # definir función que construye el layout
                                     ),
                                     # Layers where we store the raster tiles for the saltmarsh model
                                     dl.FeatureGroup(id='reg-rcp45', children=[]),
+                                    # Layer for the trained model outputs (class probabilities, certainty, predicted class)
+                                    dl.FeatureGroup(id='model-layer', children=[]),
+                                    # Popup of the pixel inspector (values under the clicked point)
+                                    dl.LayerGroup(id='pixel-inspector', children=[]),
                                     # Layers where we store the training points for the saltmarsh model
                                     dl.FeatureGroup(id='training-points', children=[]),
                                     html.Div(  # contenedor de la leyenda flotante
@@ -969,6 +973,10 @@ def create_layout():  # definir función que construye el layout
                     # almacén de sesión: recargar la pestaña no pierde la sesión, eliminarla y volver a abrir la app si. La sesion es un ID que se guarda en el navegador y se usa para recordad los uploads de cada sesion
                     dcc.Store(id="welcome-store", storage_type="session"),
                     dcc.Store(id="session-id", storage_type="session"),
+                    # almacen con la seleccion (area, año) de saltmarsh que se esta precalentando en segundo plano
+                    dcc.Store(id="saltmarsh-prewarm"),
+                    # almacen con el area y el nivel de agrupacion de los puntos de entrenamiento pintados
+                    dcc.Store(id="training-points-store"),
                     # almacen para guardar los poligonos dibujados por los susuarios sobre actividades economicas
                     dcc.Store(id="draw-meta", data={"layer": "wind", "color": "#f59e0b"}),
                     dcc.Store(id="draw-len", data=0),
@@ -0,0 +1,103 @@
+# app/models/block_stats.py  # histogramas por clase recorriendo el ráster por bloques (memoria acotada)
+
+import os  # entorno
+import threading  # un handle por hilo
+from concurrent.futures import ThreadPoolExecutor  # GDAL libera el GIL al leer/descomprimir
+from typing import List, Optional, Tuple  # tipado
+
+import numpy as np  # numérico
+import rasterio  # ráster
+from rasterio.windows import Window  # ventanas de lectura
+
+BLOCK_STATS_WORKERS = int(os.getenv("BLOCK_STATS_WORKERS", "1"))  # hilos por ráster (1 = secuencial)
+TARGET_BLOCK_PX = int(os.getenv("BLOCK_STATS_TARGET_PX", str(2**20)))  # píxeles por ventana como mucho (~1 Mpx)
+
+
+def block_windows(src, target_px: int = TARGET_BLOCK_PX) -> List[Window]:
+    """
+    Ventanas de lectura alineadas con los bloques internos del ráster.
+
+    En rásters teselados se usan los bloques tal cual; en rásters por tiras
+    (bloques de 1 fila o pocas) se agrupan tiras consecutivas hasta
+    `target_px` píxeles para no hacer miles de lecturas diminutas.
+    """
+    bh, bw = src.block_shapes[0]
+    if bw < src.width or bh * bw >= target_px:  # teselado (o tiras ya grandes)
+        return [w for _, w in src.block_windows(1)]
+    rows = max(bh, (target_px // max(src.width, 1)) // bh * bh)  # múltiplo de la altura de tira
+    return [Window(0, r, src.width, min(rows, src.height - r)) for r in range(0, src.height, rows)]
+
+
+def _accumulate(cls: np.ndarray, acc: Optional[np.ndarray], n_classes: int) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    valid = (cls >= 0) & (cls < n_classes)  # fuera de 0..n-1 (nodata incluido) no cuenta
+    codes = cls[valid].astype(np.intp)
+    counts = np.bincount(codes, minlength=n_classes)[:n_classes]
+    sums = None
+    if acc is not None:
+        weights = np.ma.filled(acc, 0.0)[valid].astype(np.float64)  # nodata de acreción -> 0
+        sums = np.bincount(codes, weights=weights, minlength=n_classes)[:n_classes]
+    return counts, sums
+
+
+def class_histogram(
+    class_tif: str,
+    acc_tif: Optional[str] = None,
+    n_classes: int = 4,
+    workers: int = BLOCK_STATS_WORKERS,
+    target_px: int = TARGET_BLOCK_PX,
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Recuento de píxeles por clase y, si hay `acc_tif`, suma de acreción por clase.
+
+    Se lee bloque a bloque (nunca la banda completa), así que la memoria pico
+    depende del tamaño de bloque y del número de hilos, no del ráster. Con
+    `workers > 1` las ventanas se reparten en un pool de hilos, cada uno con
+    sus propios handles de rasterio.
+    """
+    with rasterio.open(class_tif) as src:
+        windows = block_windows(src, target_px)
+        shape = (src.height, src.width)
+    if acc_tif:
+        with rasterio.open(acc_tif) as acc:
+            if (acc.height, acc.width) != shape:
+                raise ValueError("Class raster and accretion raster are not aligned.")
+
+    local = threading.local()
+    handles = []  # para cerrarlos al terminar
+    handles_lock = threading.Lock()
+
+    def _open():
+        if not hasattr(local, "cls"):
+            local.cls = rasterio.open(class_tif)
+            local.acc = rasterio.open(acc_tif) if acc_tif else None
+            with handles_lock:
+                handles.extend(h for h in (local.cls, local.acc) if h is not None)
+        return local.cls, local.acc
+
+    def _one(win):
+        cls_src, acc_src = _open()
+        cls = cls_src.read(1, window=win)
+        acc = acc_src.read(1, window=win, masked=True) if acc_src is not None else None
+        return _accumulate(cls, acc, n_classes)
+
+    counts = np.zeros(n_classes, dtype=np.int64)
+    sums = np.zeros(n_classes, dtype=np.float64) if acc_tif else None
+    try:
+        if workers > 1 and len(windows) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                parts = pool.map(_one, windows)
+                for c, s in parts:
+                    counts += c
+                    if sums is not None:
+                        sums += s
+        else:
+            for win in windows:
+                c, s = _one(win)
+                counts += c
+                if sums is not None:
+                    sums += s
+    finally:
+        for h in handles:
+            h.close()
+    return counts, sums
+
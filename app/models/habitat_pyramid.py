@@ -0,0 +1,323 @@
+# app/models/habitat_pyramid.py  # pirámide multirresolución de resúmenes por bloque (fracción de clase y acreción)
+#
+# Por cada (área, escenario, año) y factor f = PYRAMID_MIN_FACTOR, 2f, 4f... se guarda en
+# results/saltmarshes_pyramid/<área>/<escenario>/<tif>/:
+#   counts_<f>.npy  uint32 (4, alto/f, ancho/f)   píxeles de cada clase en el bloque f x f
+#   acc_<f>.npy     float32 (4, alto/f, ancho/f)  suma de acreción de cada clase en el bloque
+#   meta.json       malla nativa, factores y versión de las fuentes
+# La fracción de clase es counts / counts.sum(0) y la acreción media acc.sum(0) / counts.sum(0). Los
+# conteos y sumas son aditivos, así que cualquier rectángulo se resume sumando sus bloques.
+#
+# Uso:
+#   python -m app.models.habitat_pyramid     # construir las pirámides que falten o estén desfasadas
+
+import os  # rutas/entorno
+import json  # metadatos
+import argparse  # argumentos CLI
+import threading  # caché concurrente
+from collections import OrderedDict  # LRU de pirámides abiertas
+from contextlib import nullcontext  # acreción opcional
+from typing import Callable, Dict, List, Optional, Tuple  # tipado
+
+import numpy as np  # numérico
+import rasterio  # ráster
+from rasterio.crs import CRS  # sistema de referencia
+from rasterio.transform import Affine, from_bounds, rowcol  # mallas
+from rasterio.warp import reproject, transform_bounds  # teselas / rectángulos
+from rasterio.enums import Resampling  # remuestreo
+from rasterio.windows import Window  # franjas
+
+from app.models.block_stats import TARGET_BLOCK_PX  # tamaño de franja
+from app.models.raster_render import SALTMARSH_PALETTE, class_png, empty_png  # PNG indexados
+from app.models.render_cache import source_version  # versión de las fuentes
+from app.models.saltmarsh_catalog import CATALOG  # catálogo de escenarios
+from app.models.saltmarsh_cogs import serving_path  # COG 4326 para zoom cercano
+from app.models.saltmarsh_tiles import TILE_SIZE, render_class_tile, tile_bounds_3857, tile_style  # teselas XYZ
+from app.models.saltmarsh_transitions import CLASS_NAMES, N_CLASSES, align_to  # clases 0..3
+
+PYRAMID_ROOT = os.path.join("results", "saltmarshes_pyramid")  # artefactos derivados
+PYRAMID_MIN_FACTOR = int(os.getenv("PYRAMID_MIN_FACTOR", "4"))  # primer nivel: bloques de 4x4 píxeles
+PYRAMID_QUERY_BLOCKS = int(os.getenv("PYRAMID_QUERY_BLOCKS", "65536"))  # bloques como mucho por consulta
+
+_CACHE_SIZE = 64
+_lock = threading.Lock()
+_open: "OrderedDict[str, Tuple[str, Pyramid]]" = OrderedDict()  # dir -> (versiones, pirámide)
+
+
+def _block_sum(a: np.ndarray, f: int) -> np.ndarray:
+    """Suma por bloques f x f de las dos últimas dimensiones (múltiplos de f) con un reshape."""
+    *lead, h, w = a.shape
+    return a.reshape(*lead, h // f, f, w // f, f).sum(axis=(-3, -1))
+
+
+def _pad(a: np.ndarray, h: int, w: int, value) -> np.ndarray:
+    """Rellenar las dos últimas dimensiones hasta (h, w)."""
+    ph, pw = h - a.shape[-2], w - a.shape[-1]
+    if not (ph or pw):
+        return a
+    return np.pad(a, [(0, 0)] * (a.ndim - 2) + [(0, ph), (0, pw)], constant_values=value)
+
+
+def _save_atomic(path: str, a: np.ndarray):
+    """np.save a un temporal + os.replace: un lector con mmap del fichero anterior nunca lo ve a medias."""
+    tmp = f"{path[:-4]}.{os.getpid()}.tmp.npy"
+    np.save(tmp, a)
+    os.replace(tmp, path)
+
+
+def pyramid_dir(class_tif: str, root: str = PYRAMID_ROOT) -> str:
+    """Carpeta de la pirámide de `class_tif` (misma ruta relativa que en results/saltmarshes, sin extensión)."""
+    rel = os.path.relpath(os.path.abspath(class_tif), os.path.join(os.getcwd(), CATALOG.root))
+    return os.path.join(root, os.path.splitext(rel)[0])
+
+
+def _versions(class_tif: str, acc_tif: Optional[str]) -> Dict[str, Optional[str]]:
+    return {"class": source_version(class_tif), "accretion": source_version(acc_tif) if acc_tif else None}
+
+
+def _read_meta(out_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(out_dir, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(class_tif: str, acc_tif: Optional[str] = None) -> bool:
+    meta = _read_meta(pyramid_dir(class_tif))
+    return bool(meta) and meta["sources"] == _versions(class_tif, acc_tif)
+
+
+def build_pyramid(class_tif: str, acc_tif: Optional[str] = None, out_dir: Optional[str] = None,
+                  target_px: int = TARGET_BLOCK_PX) -> dict:
+    """
+    Construir la pirámide de `class_tif` (y `acc_tif`, alineado a su malla).
+
+    El primer nivel se calcula por franjas de filas (múltiplo del factor) con
+    un reshape-and-sum por clase; cada nivel siguiente es la suma 2x2 del
+    anterior. meta.json se escribe el último.
+    """
+    out_dir = out_dir or pyramid_dir(class_tif)
+    os.makedirs(out_dir, exist_ok=True)
+    f0 = PYRAMID_MIN_FACTOR
+    with rasterio.open(class_tif) as src, (rasterio.open(acc_tif) if acc_tif else nullcontext()) as raw_acc:
+        acc = align_to(raw_acc, src) if raw_acc is not None else None
+        try:
+            height, width = src.height, src.width
+            bh, bw = -(-height // f0), -(-width // f0)  # bloques del primer nivel (redondeo hacia arriba)
+            counts = np.zeros((N_CLASSES, bh, bw), dtype=np.uint32)
+            sums = np.zeros((N_CLASSES, bh, bw), dtype=np.float32) if acc is not None else None
+            rows = max(f0, (target_px // max(width, 1)) // f0 * f0)  # franja múltiplo del factor
+            for r0 in range(0, height, rows):
+                h = min(rows, height - r0)
+                win = Window(0, r0, width, h)
+                cls = _pad(src.read(1, window=win), -(-h // f0) * f0, bw * f0, -1)
+                b0 = r0 // f0
+                a = None
+                if acc is not None:
+                    a = np.ma.filled(acc.read(1, window=win, masked=True).astype(np.float32), 0.0)
+                    a = _pad(np.where(np.isfinite(a), a, 0.0), cls.shape[0], cls.shape[1], 0.0)
+                for c in range(N_CLASSES):
+                    hit = cls == c
+                    counts[c, b0:b0 + cls.shape[0] // f0] = _block_sum(hit, f0)
+                    if a is not None:
+                        sums[c, b0:b0 + cls.shape[0] // f0] = _block_sum(np.where(hit, a, 0.0), f0)
+            pixel_area_m2 = float(abs(src.res[0] * src.res[1]))
+            crs, transform = src.crs, src.transform
+        finally:
+            if acc is not None and acc is not raw_acc:
+                acc.close()
+
+    meta_path = os.path.join(out_dir, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)  # sin meta.json la pirámide no se usa mientras se reescribe
+    factors = []
+    f = f0
+    while True:
+        _save_atomic(os.path.join(out_dir, f"counts_{f}.npy"), counts)
+        if sums is not None:
+            _save_atomic(os.path.join(out_dir, f"acc_{f}.npy"), sums)
+        factors.append(f)
+        if counts.shape[1] <= 1 and counts.shape[2] <= 1:
+            break
+        h2, w2 = -(-counts.shape[1] // 2) * 2, -(-counts.shape[2] // 2) * 2  # par para el 2x2
+        counts = _block_sum(_pad(counts, h2, w2, 0), 2)
+        if sums is not None:
+            sums = _block_sum(_pad(sums, h2, w2, 0.0), 2)
+        f *= 2
+
+    meta = {
+        "sources": _versions(class_tif, acc_tif),
+        "crs": crs.to_wkt() if crs else None,
+        "transform": list(transform)[:6],
+        "width": width,
+        "height": height,
+        "pixel_area_m2": pixel_area_m2,
+        "factors": factors,
+        "accretion": sums is not None,
+    }
+    tmp = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(meta, fh, indent=2)
+    os.replace(tmp, meta_path)
+    return meta
+
+
+class Pyramid:
+    """Pirámide abierta (niveles mapeados con mmap): selección de nivel, teselas y consultas por rectángulo."""
+
+    def __init__(self, out_dir: str, meta: dict):
+        self.dir = out_dir
+        self.meta = meta
+        self.factors: List[int] = meta["factors"]
+        self.crs = CRS.from_wkt(meta["crs"]) if meta["crs"] else None
+        self.transform = Affine(*meta["transform"])
+        self.pixel_area_m2 = meta["pixel_area_m2"]
+        self._levels: Dict[int, Tuple[np.ndarray, Optional[np.ndarray]]] = {}
+
+    def level(self, f: int) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """(conteos, sumas de acreción) del factor `f`, mapeados sin cargarlos."""
+        if f not in self._levels:
+            counts = np.load(os.path.join(self.dir, f"counts_{f}.npy"), mmap_mode="r")
+            acc_path = os.path.join(self.dir, f"acc_{f}.npy")
+            sums = np.load(acc_path, mmap_mode="r") if self.meta["accretion"] else None
+            self._levels[f] = (counts, sums)
+        return self._levels[f]
+
+    def level_transform(self, f: int) -> Affine:
+        return self.transform * Affine.scale(f)
+
+    def factor_for_resolution(self, res: float) -> Optional[int]:
+        """Mayor factor cuyo bloque no supera `res` (unidades del CRS); None si hace falta la resolución nativa."""
+        native = abs(self.transform.a)
+        fits = [f for f in self.factors if native * f <= res]
+        return fits[-1] if fits else None
+
+    def factor_for_tile(self, z: int, x: int, y: int, tile_size: int = TILE_SIZE) -> Optional[int]:
+        left, bottom, right, top = transform_bounds("EPSG:3857", self.crs, *tile_bounds_3857(z, x, y), densify_pts=21)
+        return self.factor_for_resolution((right - left) / tile_size)
+
+    def _block_window(self, f: int, left: float, bottom: float, right: float, top: float, pad: int = 0):
+        counts, _ = self.level(f)
+        t = self.level_transform(f)
+        r0, c0 = rowcol(t, left, top)
+        r1, c1 = rowcol(t, right, bottom)
+        r0, c0 = max(int(r0) - pad, 0), max(int(c0) - pad, 0)
+        r1, c1 = min(int(r1) + 1 + pad, counts.shape[1]), min(int(c1) + 1 + pad, counts.shape[2])
+        return r0, r1, c0, c1
+
+    def render_tile(self, f: int, z: int, x: int, y: int, tile_size: int = TILE_SIZE) -> bytes:
+        """Tesela z/x/y con la clase dominante de cada bloque del nivel `f`."""
+        t_bounds = tile_bounds_3857(z, x, y)
+        bounds = transform_bounds("EPSG:3857", self.crs, *t_bounds, densify_pts=21)
+        r0, r1, c0, c1 = self._block_window(f, *bounds, pad=1)
+        if r0 >= r1 or c0 >= c1:  # tesela fuera de la extensión
+            return empty_png(tile_size, tile_size)
+        counts = np.asarray(self.level(f)[0][:, r0:r1, c0:c1])
+        dominant = np.where(counts.sum(axis=0) > 0, counts.argmax(axis=0), -1).astype(np.int16)
+        dst = np.full((tile_size, tile_size), -1, dtype=np.int16)
+        reproject(
+            dominant, dst,
+            src_transform=self.level_transform(f) * Affine.translation(c0, r0), src_crs=self.crs, src_nodata=-1,
+            dst_transform=from_bounds(*t_bounds, tile_size, tile_size), dst_crs="EPSG:3857", dst_nodata=-1,
+            resampling=Resampling.nearest,
+        )
+        return class_png(np.ma.masked_less(dst, 0))
+
+    def query(self, bounds: Tuple[float, float, float, float], crs="EPSG:4326",
+              max_blocks: int = PYRAMID_QUERY_BLOCKS) -> dict:
+        """
+        Hectáreas y acreción (m³) por clase dentro de `bounds` (en `crs`).
+
+        Se usa el nivel más fino cuyo número de bloques en el rectángulo no
+        supera `max_blocks`, así que el coste es O(bloques) y no depende del
+        tamaño del rectángulo; los bloques del borde cuentan enteros.
+        """
+        left, bottom, right, top = transform_bounds(crs, self.crs, *bounds, densify_pts=21)
+        for f in self.factors:
+            r0, r1, c0, c1 = self._block_window(f, left, bottom, right, top)
+            if max(r1 - r0, 0) * max(c1 - c0, 0) <= max_blocks:
+                break
+        counts, sums = self.level(f)
+        n = np.asarray(counts[:, r0:r1, c0:c1], dtype=np.int64).sum(axis=(1, 2)) if r1 > r0 and c1 > c0 \
+            else np.zeros(N_CLASSES, dtype=np.int64)
+        acc = None
+        if sums is not None:
+            acc = np.asarray(sums[:, r0:r1, c0:c1], dtype=np.float64).sum(axis=(1, 2)) if r1 > r0 and c1 > c0 \
+                else np.zeros(N_CLASSES)
+        return {
+            "classes": CLASS_NAMES,
+            "factor": f,
+            "blocks": int(max(r1 - r0, 0) * max(c1 - c0, 0)),
+            "counts": n.tolist(),
+            "hectares": (n * self.pixel_area_m2 / 10000.0).tolist(),
+            "accretion_m3": (acc * self.pixel_area_m2).tolist() if acc is not None else None,
+        }
+
+
+def load_pyramid(class_tif: str, acc_tif: Optional[str] = None) -> Optional[Pyramid]:
+    """Pirámide al día de `class_tif` o None si falta o está desfasada (no se construye aquí)."""
+    out_dir = pyramid_dir(class_tif)
+    versions = json.dumps(_versions(class_tif, acc_tif), sort_keys=True)
+    with _lock:
+        hit = _open.get(out_dir)
+        if hit and hit[0] == versions:
+            _open.move_to_end(out_dir)
+            return hit[1]
+    meta = _read_meta(out_dir)
+    if not meta or json.dumps(meta["sources"], sort_keys=True) != versions:
+        return None
+    pyr = Pyramid(out_dir, meta)
+    with _lock:
+        _open[out_dir] = (versions, pyr)
+        while len(_open) > _CACHE_SIZE:
+            _open.popitem(last=False)
+    return pyr
+
+
+def scenario_pyramid(area: str, scenario: str, year) -> Optional[Pyramid]:
+    entry = CATALOG.get(area, scenario, year)
+    return load_pyramid(entry.class_tif, entry.accretion_tif) if entry else None
+
+
+def class_tile_job(area: str, scenario: str, year, z: int, x: int, y: int) -> Optional[Tuple[str, str, Callable[[], bytes]]]:
+    """
+    (fuente, estilo, render) de la tesela de clases z/x/y.
+
+    Si la tesela es más gruesa que el primer nivel de la pirámide se pinta la
+    clase dominante del nivel adecuado; si no, o si la pirámide no está al
+    día, el COG/tif nativo. La misma elección sirve al endpoint y al precalentado.
+    """
+    entry = CATALOG.get(area, scenario, year)
+    if not entry:
+        return None
+    pyr = load_pyramid(entry.class_tif, entry.accretion_tif)
+    f = pyr.factor_for_tile(z, x, y) if pyr else None
+    if f:
+        style = f"class-pyramid-tile:{SALTMARSH_PALETTE.signature}:{f}:{z}/{x}/{y}"
+        return entry.class_tif, style, lambda: pyr.render_tile(f, z, x, y)
+    src = serving_path(entry.class_tif)
+    return src, tile_style(z, x, y), lambda: render_class_tile(src, z, x, y)
+
+
+def refresh() -> int:
+    """Construir las pirámides que falten o estén desfasadas para todo el catálogo."""
+    built = 0
+    for _, _, _, entry in CATALOG.rasters():
+        try:
+            if not is_fresh(entry.class_tif, entry.accretion_tif):
+                build_pyramid(entry.class_tif, entry.accretion_tif)
+                built += 1
+        except Exception:
+            continue  # ráster ilegible (p. ej. puntero LFS sin descargar)
+    return built
+
+
+def main():
+    argparse.ArgumentParser(description="Construir las pirámides de resúmenes por bloque de results/saltmarshes.").parse_args()
+    built = refresh()
+    print(f"[pyramid] {built} pyramids built in {PYRAMID_ROOT}")
+
+
+if __name__ == "__main__":
+    main()
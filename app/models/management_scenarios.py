@@ -1,5 +1,4 @@
 from typing import Any, List, Optional, Dict
-import os
 import pandas as pd                                                
 import geopandas as gpd                                          
 from shapely.geometry import Polygon, shape                      
@@ -9,6 +8,8 @@ from pyproj import Transformer
 import rasterio
 from rasterio.mask import mask as rio_mask
 from rasterio.warp import reproject, Resampling
+from app.models.raster_handles import POOL  # datasets ya abiertos
+from app.models.saltmarsh_catalog import CATALOG
 
 EUNIS_PATHS = {
     "Santander":  "results/opsa/Santander/eunis_santander.parquet",     
@@ -22,153 +23,32 @@ def eunis_available(area: str) -> bool:
 def eunis_path(area: str):                                 
     return EUNIS_PATHS.get(area) 
 
-SALTMARSH_PATHS = {
-    "Santander": ["results/saltmarshes/Bay_of_Santander/regional_rcp45/santander_reg_rcp45_2012_7g.tif", "results/saltmarshes/Bay_of_Santander/regional_rcp45/santander_reg_rcp45_2012_7g_accretion.tif"],
-    "Cadiz_Bay": ["results/saltmarshes/Cadiz_Bay/regional_rcp45/cadiz_reg_rcp45_2023_25g.tif", "results/saltmarshes/Cadiz_Bay/regional_rcp45/cadiz_reg_rcp45_2023_25g_accretion.tif"],
-    "Urdaibai_Estuary": ["results/saltmarshes/Urdaibai_Estuary/regional_rcp45/oka_reg_rcp45_2017_17g.tif", "results/saltmarshes/Urdaibai_Estuary/regional_rcp45/oka_reg_rcp45_2017_17g_accretion.tif"]
+# Áreas del tab de gestión -> carpeta de results/saltmarshes (las rutas salen del catálogo):
+SALTMARSH_AREAS = {
+    "Santander": "Bay_of_Santander",
+    "Cadiz_Bay": "Cadiz_Bay",
+    "Urdaibai_Estuary": "Urdaibai_Estuary",
 }
 
-SALTMARSH_SCENARIOS_PATHS = {
-    "Santander": {
-        "regional_rcp45": {
-            "habitats": {
-                "2012": r"results\saltmarshes\Bay_of_Santander\regional_rcp45\santander_reg_rcp45_2012_7g.tif",
-                "2062": r"results\saltmarshes\Bay_of_Santander\regional_rcp45\santander_reg_rcp45_2062_7g.tif",
-                "2112": r"results\saltmarshes\Bay_of_Santander\regional_rcp45\santander_reg_rcp45_2112_7g.tif"
-            },
-            "accretion": {
-                "2012": r"results\saltmarshes\Bay_of_Santander\regional_rcp45\santander_reg_rcp45_2012_7g_accretion.tif",
-                "2062": r"results\saltmarshes\Bay_of_Santander\regional_rcp45\santander_reg_rcp45_2062_7g_accretion.tif",
-                "2112": r"results\saltmarshes\Bay_of_Santander\regional_rcp45\santander_reg_rcp45_2112_7g_accretion.tif"
-            }
-        },
-        "regional_rcp85": {
-            "habitats": {
-                "2012": r"results\saltmarshes\Bay_of_Santander\regional_rcp85\santander_reg_rcp45_2012_7g.tif",
-                "2062": r"results\saltmarshes\Bay_of_Santander\regional_rcp85\santander_reg_rcp85_2062_7g.tif",
-                "2112": r"results\saltmarshes\Bay_of_Santander\regional_rcp85\santander_reg_rcp85_2112_7g.tif"
-            },
-            "accretion": {
-                "2012": r"results\saltmarshes\Bay_of_Santander\regional_rcp85\santander_reg_rcp45_2012_7g_accretion.tif",
-                "2062": r"results\saltmarshes\Bay_of_Santander\regional_rcp85\santander_reg_rcp85_2062_7g_accretion.tif",
-                "2112": r"results\saltmarshes\Bay_of_Santander\regional_rcp85\santander_reg_rcp85_2112_7g_accretion.tif"
-            }
-        },
-        "global_rcp45":  {
-            "habitats": {
-                "2012": r"results\saltmarshes\Bay_of_Santander\global_rcp45\santander_reg_rcp45_2012_7g.tif",
-                "2062": r"results\saltmarshes\Bay_of_Santander\global_rcp45\santander_glo_rcp45_2062_7g.tif",
-                "2112": r"results\saltmarshes\Bay_of_Santander\global_rcp45\santander_glo_rcp45_2112_7g.tif"
-            },
-            "accretion": {
-                "2012": r"results\saltmarshes\Bay_of_Santander\global_rcp45\santander_reg_rcp45_2012_7g_accretion.tif",
-                "2062": r"results\saltmarshes\Bay_of_Santander\global_rcp45\santander_glo_rcp45_2062_7g_accretion.tif",
-                "2112": r"results\saltmarshes\Bay_of_Santander\global_rcp45\santander_glo_rcp45_2112_7g_accretion.tif"
-            }
-        }
-    },
-
-    "Cadiz_Bay": {
-        "regional_rcp45": {
-            "habitats": {
-                "2023": r"results\saltmarshes\Cadiz_Bay\regional_rcp45\cadiz_reg_rcp45_2023_25g.tif",
-                "2073": r"results\saltmarshes\Cadiz_Bay\regional_rcp45\cadiz_reg_rcp45_2073_25g.tif",
-                "2123": r"results\saltmarshes\Cadiz_Bay\regional_rcp45\cadiz_reg_rcp45_2123_25g.tif"
-            },
-            "accretion": {
-                "2023": r"results\saltmarshes\Cadiz_Bay\regional_rcp45\cadiz_reg_rcp45_2023_25g_accretion.tif",
-                "2073": r"results\saltmarshes\Cadiz_Bay\regional_rcp45\cadiz_reg_rcp45_2073_25g_accretion.tif",
-                "2123": r"results\saltmarshes\Cadiz_Bay\regional_rcp45\cadiz_reg_rcp45_2123_25g_accretion.tif"
-            }
-        },
-        "regional_rcp85": {
-            "habitats": {
-                "2023": r"results\saltmarshes\Cadiz_Bay\regional_rcp85\cadiz_reg_rcp45_2023_25g.tif",
-                "2073": r"results\saltmarshes\Cadiz_Bay\regional_rcp85\cadiz_reg_rcp85_2073_25g.tif",
-                "2123": r"results\saltmarshes\Cadiz_Bay\regional_rcp85\cadiz_reg_rcp85_2123_25g.tif"
-            },
-            "accretion": {
-                "2023": r"results\saltmarshes\Cadiz_Bay\regional_rcp85\cadiz_reg_rcp45_2023_25g_accretion.tif",
-                "2073": r"results\saltmarshes\Cadiz_Bay\regional_rcp85\cadiz_reg_rcp85_2073_25g_accretion.tif",
-                "2123": r"results\saltmarshes\Cadiz_Bay\regional_rcp85\cadiz_reg_rcp85_2123_25g_accretion.tif"
-            }
-        },
-        "global_rcp45":  {
-            "habitats": {
-                "2023": r"results\saltmarshes\Cadiz_Bay\global_rcp45\cadiz_reg_rcp45_2023_25g.tif",
-                "2073": r"results\saltmarshes\Cadiz_Bay\global_rcp45\cadiz_glo_rcp45_2073_25g.tif",
-                "2123": r"results\saltmarshes\Cadiz_Bay\global_rcp45\cadiz_glo_rcp45_2123_25g.tif"
-            },
-            "accretion": {
-                "2023": r"results\saltmarshes\Cadiz_Bay\global_rcp45\cadiz_reg_rcp45_2023_25g_accretion.tif",
-                "2073": r"results\saltmarshes\Cadiz_Bay\global_rcp45\cadiz_glo_rcp45_2073_25g_accretion.tif",
-                "2123": r"results\saltmarshes\Cadiz_Bay\global_rcp45\cadiz_glo_rcp45_2123_25g_accretion.tif"
-            }
-        }
-    },
-
-    "Urdaibai_Estuary": {
-        "regional_rcp45": {
-            "habitats": {
-                "2017": r"results\saltmarshes\Urdaibai_Estuary\regional_rcp45\oka_reg_rcp45_2017_17g.tif",
-                "2067": r"results\saltmarshes\Urdaibai_Estuary\regional_rcp45\oka_reg_rcp45_2067_17g.tif",
-                "2117": r"results\saltmarshes\Urdaibai_Estuary\regional_rcp45\oka_reg_rcp45_2117_17g.tif"
-            },
-            "accretion": {
-                "2017": r"results\saltmarshes\Urdaibai_Estuary\regional_rcp45\oka_reg_rcp45_2017_17g_accretion.tif",
-                "2067": r"results\saltmarshes\Urdaibai_Estuary\regional_rcp45\oka_reg_rcp45_2067_17g_accretion.tif",
-                "2117": r"results\saltmarshes\Urdaibai_Estuary\regional_rcp45\oka_reg_rcp45_2117_17g_accretion.tif"
-            }
-        },
-        "regional_rcp85": {
-            "habitats": {
-                "2017": r"results\saltmarshes\Urdaibai_Estuary\regional_rcp85\oka_reg_rcp45_2017_17g.tif",
-                "2067": r"results\saltmarshes\Urdaibai_Estuary\regional_rcp85\oka_reg_rcp85_2067_17g.tif",
-                "2117": r"results\saltmarshes\Urdaibai_Estuary\regional_rcp85\oka_reg_rcp85_2117_17g.tif"
-            },
-            "accretion": {
-                "2017": r"results\saltmarshes\Urdaibai_Estuary\regional_rcp85\oka_reg_rcp45_2017_17g_accretion.tif",
-                "2067": r"results\saltmarshes\Urdaibai_Estuary\regional_rcp85\oka_reg_rcp85_2067_17g_accretion.tif",
-                "2117": r"results\saltmarshes\Urdaibai_Estuary\regional_rcp85\oka_reg_rcp85_2117_17g_accretion.tif"
-            }
-        },
-        "global_rcp45":  {
-            "habitats": {
-                "2017": r"results\saltmarshes\Urdaibai_Estuary\global_rcp45\oka_reg_rcp45_2017_17g.tif",
-                "2067": r"results\saltmarshes\Urdaibai_Estuary\global_rcp45\oka_glo_rcp45_2067_17g.tif",
-                "2117": r"results\saltmarshes\Urdaibai_Estuary\global_rcp45\oka_glo_rcp45_2117_17g.tif"
-            },
-            "accretion": {
-                "2017": r"results\saltmarshes\Urdaibai_Estuary\global_rcp45\oka_reg_rcp45_2017_17g_accretion.tif",
-                "2067": r"results\saltmarshes\Urdaibai_Estuary\global_rcp45\oka_glo_rcp45_2067_17g_accretion.tif",
-                "2117": r"results\saltmarshes\Urdaibai_Estuary\global_rcp45\oka_glo_rcp45_2117_17g_accretion.tif"
-            }
-        }
-    },
-}
+SALTMARSH_BASELINE_SCENARIO = "regional_rcp45"  # escenario cuyo primer año es la situación actual
 
-# Helpers for the paths:
-def _norm(p): 
-    return os.path.normpath(p) if p else None
+def _saltmarsh_area(area: str):
+    return SALTMARSH_AREAS.get(area)
 
 def saltmarsh_scenario_available(area: str, scenario_key: str) -> bool:
-    return bool(SALTMARSH_SCENARIOS_PATHS.get(area, {}).get(scenario_key))
+    folder = _saltmarsh_area(area)
+    return bool(folder and CATALOG.years(folder, scenario_key))
 
 def saltmarsh_scenario_years(area: str, scenario_key: str):
-    node = SALTMARSH_SCENARIOS_PATHS.get(area, {}).get(scenario_key, {})
-    years = list((node.get("habitats") or {}).keys())
-    # orden numérico por si vienen como str
-    try:
-        years = sorted(years, key=lambda y: int(y))
-    except Exception:
-        years = sorted(years)
-    return years
+    folder = _saltmarsh_area(area)
+    return [str(y) for y in CATALOG.years(folder, scenario_key)] if folder else []
 
 def saltmarsh_scenario_paths(area: str, scenario_key: str, year: str):
-    node = SALTMARSH_SCENARIOS_PATHS.get(area, {}).get(scenario_key, {})
-    h = _norm((node.get("habitats") or {}).get(year))
-    a = _norm((node.get("accretion") or {}).get(year))
-    return h, a
+    folder = _saltmarsh_area(area)
+    entry = CATALOG.get(folder, scenario_key, year) if folder else None
+    if not entry:
+        return None, None
+    return entry.class_tif, entry.accretion_tif
 
 SALTMARSH_MAP: Dict[int, str] = {
     0: "Mudflat",
@@ -177,16 +57,18 @@ SALTMARSH_MAP: Dict[int, str] = {
     3: "Channel",
 }
 
+def _saltmarsh_baseline(area: str):
+    years = saltmarsh_scenario_years(area, SALTMARSH_BASELINE_SCENARIO)
+    return saltmarsh_scenario_paths(area, SALTMARSH_BASELINE_SCENARIO, years[0]) if years else (None, None)
+
 def saltmarsh_available(area: str) -> bool:
-    return area in SALTMARSH_PATHS
+    return saltmarsh_scenario_available(area, SALTMARSH_BASELINE_SCENARIO)
 
 def saltmarsh_habitat_path(area: str):
-    paths = SALTMARSH_PATHS.get(area)
-    return paths[0] if paths else None
+    return _saltmarsh_baseline(area)[0]
 
 def saltmarsh_accretion_path(area: str):
-    paths = SALTMARSH_PATHS.get(area)
-    return paths[1] if paths else None
+    return _saltmarsh_baseline(area)[1]
 
 # Function to merge both drawn and uploaded activities:
 def _collect_activity_union(activity_children, activity_upload_children) -> gpd.GeoDataFrame:
@@ -320,7 +202,7 @@ def activity_saltmarsh_table(area: str,
     Tabla por ecosistema (Mudflat, Saltmarsh, Upland Areas, Channel) con:
       - Extent (ha): área afectada dentro de los polígonos
       - Accretion (m³/yr): suma de acreción dentro de los políx. (solo Mudflat y Saltmarsh)
-    Usa SALTMARSH_PATHS[area][0] (hábitat) y SALTMARSH_PATHS[area][1] (acreción).
+    Usa el primer año de regional_rcp45 del catálogo (hábitat y acreción).
     """
     ORDER = [0, 1, 2, 3]  # Mudflat, Saltmarsh, Upland Areas, Channel
 
@@ -337,7 +219,7 @@ def activity_saltmarsh_table(area: str,
     if not hab_path or not acc_path:
         raise ValueError(f"No hay TIFFs de saltmarsh para el área '{area}'.")
 
-    with rasterio.open(hab_path) as hab_ds:
+    with POOL.dataset(hab_path) as hab_ds:
         if hab_ds.crs is None or hab_ds.crs.is_geographic:
             raise ValueError("El TIFF de hábitat debe tener un CRS proyectado (en metros).")
 
@@ -350,7 +232,7 @@ def activity_saltmarsh_table(area: str,
         cls_ma = np.ma.masked_array(cls_arr[0], mask=np.ma.getmaskarray(cls_arr[0]))
 
         # Acreción en la malla del hábitat
-        with rasterio.open(acc_path) as acc_ds:
+        with POOL.dataset(acc_path) as acc_ds:
             same_grid = (acc_ds.crs == hab_ds.crs and
                          acc_ds.transform == hab_ds.transform and
                          acc_ds.width == hab_ds.width and
@@ -430,7 +312,7 @@ def activity_saltmarsh_scenario_table(area: str,
             "Accretion (m³/yr)": ["-", "-", "-", "-"],
         })
 
-    with rasterio.open(hab_path) as hab_ds:
+    with POOL.dataset(hab_path) as hab_ds:
         if hab_ds.crs is None or hab_ds.crs.is_geographic:
             raise ValueError("Habitat TIFF must be in a projected CRS (meters).")
 
@@ -440,7 +322,7 @@ def activity_saltmarsh_scenario_table(area: str,
         cls_arr, _ = rio_mask(hab_ds, [geom_in_raster], crop=False, filled=False)
         cls_ma = np.ma.masked_array(cls_arr[0], mask=np.ma.getmaskarray(cls_arr[0]))
 
-        with rasterio.open(acc_path) as acc_ds:
+        with POOL.dataset(acc_path) as acc_ds:
             same_grid = (acc_ds.crs == hab_ds.crs and
                          acc_ds.transform == hab_ds.transform and
                          acc_ds.width == hab_ds.width and
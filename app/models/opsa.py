@@ -2,11 +2,17 @@
 
 import os  # rutas de archivos
 import json  # conversión a GeoJSON (dict)
-from typing import List, Tuple, Dict  # tipado
+import threading  # caché compartida entre sesiones
+from collections import OrderedDict  # LRU de resultados
+from typing import List, Tuple, Dict, FrozenSet, Optional  # tipado
 import numpy as np  # cálculo numérico
 import pandas as pd  # manejo tabular
 import geopandas as gpd  # geodatos
 
+from app.models.opsa_store import AreaTable, open_area  # tablas Arrow mapeadas en memoria
+
+OPSA_CACHE_SIZE = int(os.getenv("OPSA_CACHE_SIZE", "32"))  # combinaciones (área, componentes) en memoria
+
 # Mapeo maestro: área -> { etiqueta_UI -> (col_EV, [col_CO]) }
 FIELD_MAP: Dict[str, Dict[str, Tuple[str, List[str]]]] = {
     "Irish_Sea": {
@@ -56,22 +62,48 @@ def _find_existing_column(candidates: List[str], columns: List[str]) -> str:
             return real  # devolver nombre real
     return ""  # devolver vacío si no hay coincidencia
 
-# API 1: calcular la condition media segun las componentes que pasa el usuario:
-def compute_condition_mean(
-    study_area: str,  # área elegida en el UI
-    components: List[str],  # EC seleccionados
-    out_field_condition: str = "condition",  # nombre campo condición
-    out_field_confidence: str = "confidence",  # nombre campo confianza
-    out_field_class: str = "condition_class",  # nombre campo clase discreta
-    persist: bool = True  # si True, guardar cambios en el mismo parquet
-) -> Tuple[Dict, str]:
-    if not components:  # validar selección
-        raise ValueError("Debes seleccionar al menos un Ecosystem Component.")  # error claro
-
-    parquet_path = _area_to_parquet_path(study_area)  # localizar parquet del área
-    gdf = gpd.read_parquet(parquet_path)  # leer geo-parquet
-    gdf = _ensure_wgs84(gdf)  # asegurar WGS84
-
+# Caché en memoria: el GeoParquet de cada área se abre como tabla Arrow mapeada (opsa_store) y nunca se
+# reescribe; los resultados (condition, confidence, clase) se guardan por (área, componentes, versión).
+_lock = threading.Lock()
+_results: "OrderedDict[Tuple[str, FrozenSet[str], str], pd.DataFrame]" = OrderedDict()  # LRU de resultados
+
+def load_area(study_area: str) -> Tuple[AreaTable, str]:
+    """Tabla Arrow mapeada (solo lectura) del área y su versión; se reabre solo si el parquet cambió."""
+    table = open_area(_area_to_parquet_path(study_area))  # GeoParquet -> Arrow IPC (una vez por versión)
+    return table, table.version
+
+def component_frame(table: AreaTable, study_area: str, labels: List[str]) -> pd.DataFrame:
+    """Solo las columnas EV/CO de `labels` (resueltas sin distinguir mayúsculas): no se leen las demás."""
+    names: List[str] = []
+    for label in labels:
+        if label not in FIELD_MAP.get(study_area, {}):
+            continue
+        ev_name, co_candidates = FIELD_MAP[study_area][label]
+        for col in (_find_existing_column([ev_name], table.columns), _find_existing_column(co_candidates, table.columns)):
+            if col and col not in names:
+                names.append(col)
+    return table.frame(names)
+
+def component_series(gdf: pd.DataFrame, ev_name: str, co_candidates: List[str]) -> Optional[Tuple[pd.Series, pd.Series]]:
+    """(EV, CO) de un componente con NoData como NaN, o None si el parquet no tiene su columna EV."""
+    ev_col = _find_existing_column([ev_name], list(gdf.columns))  # resolver EV real
+    co_col = _find_existing_column(co_candidates, list(gdf.columns))  # resolver CO real (puede no existir)
+    if not ev_col:
+        return None
+
+    s_ev = pd.to_numeric(gdf[ev_col], errors="coerce").astype(float)  # convertir EV a float
+    s_ev = s_ev.mask(s_ev == 0)  # EV==0 se considera NoData → NaN
+
+    if co_col:  # si existe CO
+        s_co = pd.to_numeric(gdf[co_col], errors="coerce").astype(float)  # convertir CO a float
+        s_co = s_co.mask((s_co == 0) | s_co.isna())  # CO==0/NaN → NoData
+    else:
+        s_co = pd.Series(np.nan, index=gdf.index)  # si no hay CO, todo NaN
+
+    s_co = s_co.mask(s_ev.isna())  # si EV es NaN, también ignorar CO
+    return s_ev, s_co
+
+def _condition_columns(gdf: pd.DataFrame, study_area: str, components: List[str]) -> pd.DataFrame:
     if study_area not in FIELD_MAP:  # validar mapeo disponible
         raise KeyError(f"No hay mapeo de columnas para el área: {study_area}")  # error
 
@@ -87,23 +119,11 @@ def compute_condition_mean(
             continue  # siguiente componente
 
         ev_name, co_candidates = area_map[label]  # columnas esperadas
-        ev_col = _find_existing_column([ev_name], list(gdf.columns))  # resolver EV real
-        co_col = _find_existing_column(co_candidates, list(gdf.columns))  # resolver CO real (puede no existir)
-
-        if not ev_col:  # si no hay EV en el parquet
+        series = component_series(gdf, ev_name, co_candidates)  # EV/CO limpios
+        if series is None:  # si no hay EV en el parquet
             missing.append(f"{label} -> {ev_name}")  # anotar columna ausente
             continue  # siguiente
-
-        s_ev = pd.to_numeric(gdf[ev_col], errors="coerce").astype(float)  # convertir EV a float
-        s_ev = s_ev.mask(s_ev == 0)  # EV==0 se considera NoData → NaN
-
-        if co_col:  # si existe CO
-            s_co = pd.to_numeric(gdf[co_col], errors="coerce").astype(float)  # convertir CO a float
-            s_co = s_co.mask((s_co == 0) | s_co.isna())  # CO==0/NaN → NoData
-        else:
-            s_co = pd.Series(np.nan, index=gdf.index)  # si no hay CO, todo NaN
-
-        s_co = s_co.mask(s_ev.isna())  # si EV es NaN, también ignorar CO
+        s_ev, s_co = series
 
         ev_list.append(s_ev)  # acumular EV limpio
         co_list.append(s_co)  # acumular CO limpio
@@ -125,8 +145,6 @@ def compute_condition_mean(
     conf = co_df.mean(axis=1, skipna=True)  # media CO por fila ignorando NaN
     cond = cond.clip(lower=0, upper=5)  # acotar a 0–5
     # conf puede estar en [0,1] o similar según tus datos; la dejamos tal cual tras NaN→promedio
-    gdf[out_field_condition] = cond.astype(float)  # escribir condición
-    gdf[out_field_confidence] = conf.astype(float)  # escribir confianza
 
     # Discretización estable en servidor:
     # 0 -> NoData ; 1:(0,1] ; 2:(1,2] ; 3:(2,3] ; 4:(3,4] ; 5:(4,5]
@@ -136,34 +154,97 @@ def compute_condition_mean(
     cls = pd.cut(cond_valid, bins=bins, labels=labels, right=True, include_lowest=False)  # clasificar
     cls = cls.astype("float")  # pasar a float (por NaN en cut)
     cls = cls.fillna(0).astype(int)  # NaN→0 (NoData), y entero
-    gdf[out_field_class] = cls  # escribir clase discreta
-
-    # Diagnóstico (opcional):
-    try:
-        counts = gdf[out_field_class].value_counts().sort_index()
-    except Exception:
-        pass
 
-    if persist:  # si hay que guardar de vuelta
-        gdf.to_parquet(parquet_path, compression="zstd")  # persistir cambios
+    return pd.DataFrame({
+        "condition": cond.astype(float),  # condición
+        "confidence": conf.astype(float),  # confianza
+        "condition_class": cls,  # clase discreta
+    }, index=gdf.index)
+
+def condition_columns(study_area: str, components: List[str]) -> pd.DataFrame:
+    """
+    Columnas 'condition', 'confidence' y 'condition_class' (alineadas con las
+    filas de `load_area`) para los componentes elegidos.
+
+    La media no depende del orden de los componentes, así que la clave es
+    (área, frozenset(componentes), versión del parquet). El DataFrame
+    devuelto es compartido entre sesiones: no modificarlo.
+    """
+    if not components:  # validar selección
+        raise ValueError("Debes seleccionar al menos un Ecosystem Component.")  # error claro
+    table, version = load_area(study_area)  # tabla mapeada (solo lectura)
+    key = (study_area, frozenset(components), version)
+    with _lock:
+        cols = _results.get(key)
+        if cols is not None:
+            _results.move_to_end(key)  # usado recientemente
+            return cols
+    from app.models.opsa_lattice import lattice_columns  # import diferido (opsa_lattice importa este módulo)
+    cols = lattice_columns(study_area, components, version, table.index)  # celosía precalculada: solo indexar
+    if cols is None:  # sin celosía al día -> cálculo directo con las columnas EV/CO justas
+        cols = _condition_columns(component_frame(table, study_area, components), study_area, list(components))
+    with _lock:
+        _results[key] = cols
+        while len(_results) > OPSA_CACHE_SIZE:  # LRU acotado
+            _results.popitem(last=False)
+    return cols
 
+# API 1: calcular la condition media segun las componentes que pasa el usuario:
+def compute_condition_mean(
+    study_area: str,  # área elegida en el UI
+    components: List[str],  # EC seleccionados
+    out_field_condition: str = "condition",  # nombre campo condición
+    out_field_confidence: str = "confidence",  # nombre campo confianza
+    out_field_class: str = "condition_class",  # nombre campo clase discreta
+) -> Tuple[Dict, str]:
+    cols = condition_columns(study_area, components)  # resultado cacheado (sin tocar el parquet)
+    table, _ = load_area(study_area)  # tabla mapeada
+    gdf = _ensure_wgs84(table.geodataframe())  # la geometría solo se decodifica para el GeoJSON del mapa
+    gdf = gdf.assign(**{  # columnas de resultado
+        out_field_condition: cols["condition"],
+        out_field_confidence: cols["confidence"],
+        out_field_class: cols["condition_class"],
+    })
     geojson_dict = json.loads(gdf.to_json())  # exportar GeoJSON como dict
-    return geojson_dict, parquet_path  # devolver datos y ruta
+    return geojson_dict, _area_to_parquet_path(study_area)  # devolver datos y ruta (solo lectura)
+
+# Geometría una sola vez + códigos de clase por ejecución (el color se decide en el cliente)
+def geometry_geojson(study_area: str) -> bytes:
+    """FeatureCollection solo con la geometría del área; `id` de cada feature = fila de la tabla (estable por versión)."""
+    table, _ = load_area(study_area)  # tabla mapeada
+    gdf = _ensure_wgs84(table.geodataframe([]))  # sin atributos: no cambian entre ejecuciones
+    return gdf.to_json(drop_id=False).encode("utf-8")  # id = RangeIndex
+
+def condition_codes(study_area: str, components: List[str]) -> str:
+    """Clase 0..5 de cada feature (en orden de `id`) como cadena de dígitos: un byte por polígono."""
+    cls = condition_columns(study_area, components)["condition_class"].to_numpy(dtype=np.uint8)
+    return (cls + ord("0")).tobytes().decode("ascii")
+
+def area_bounds(study_area: str) -> Optional[List[float]]:
+    """[oeste, sur, este, norte] del área según los metadatos del GeoParquet (sin decodificar geometría)."""
+    table, _ = load_area(study_area)
+    if table.crs is None or not table.crs.equals("EPSG:4326", ignore_axis_order=True):
+        return None  # bbox en otro CRS: el mapa se encuadra con zoomToBounds
+    return table.bbox
 
 # API 2: resumen ponderado por tipo de habitat
 
-def compute_summary_by_habitat_type(  # calcular resumen por 'habitat type' del parquet enriquecido
-    parquet_path: str,  # ruta al parquet (el mismo que actualiza compute_condition_mean)
+def compute_summary_by_habitat_type(  # calcular resumen por 'habitat type' desde la caché en memoria
     study_area: str,  # área (para convertir 'area' a hectáreas correctamente)
+    components: List[str],  # EC seleccionados (mismos que en compute_condition_mean)
     group_field: str = "AllcombD"  # nombre exacto del campo de agrupación (p.ej. 'x')
 ) -> pd.DataFrame:  # devuelve DataFrame con columnas: group, condition_wavg, confidence_wavg, area_ha
-    # Leer el parquet ya enriquecido con 'condition' y 'confidence'
-    gdf = gpd.read_parquet(parquet_path)  # leer GeoParquet
+    # Fuente en memoria + 'condition' y 'confidence' cacheadas (sin releer ni reescribir el parquet)
+    table, _ = load_area(study_area)  # tabla mapeada del área
     # Validar columnas mínimas
-    needed = {group_field, "area", "condition", "confidence"}  # conjunto de columnas imprescindibles
-    missing = [c for c in needed if c not in gdf.columns]  # detectar ausentes
+    needed = [group_field, "area"]  # columnas imprescindibles
+    missing = [c for c in needed if c not in table.columns]  # detectar ausentes
     if missing:  # si faltan columnas
         raise KeyError(f"Faltan columnas en el parquet para el resumen: {missing}")  # error claro
+    cols = condition_columns(study_area, components)  # mismo resultado que compute_condition_mean
+    src = table.frame(needed)  # solo agrupación y área (sin geometría)
+    gdf = {group_field: src[group_field], "area": src["area"],
+           "condition": cols["condition"], "confidence": cols["confidence"]}  # columnas necesarias
 
     # Convertir área a hectáreas según el área de estudio
     if study_area == "": 
@@ -0,0 +1,181 @@
+# app/models/opsa_lattice.py  # celosía OPSA: condition, confidence y clase precalculadas para cada combinación de componentes
+#
+# Con k componentes por área (k <= 5 en FIELD_MAP) hay 2^k - 1 combinaciones. La combinación se
+# identifica por su máscara de bits sobre el orden de `labels` en meta.json (bit i = labels[i]) y se
+# guarda en results/opsa_lattice/<área>/:
+#   condition.npy   float32 (2^k, n_polígonos)  media de EV (0..5), NaN si no hay datos
+#   confidence.npy  float32 (2^k, n_polígonos)  media de CO, NaN si no hay datos
+#   class.npy       uint8   (2^k, n_polígonos)  0 = NoData; 1..5 = (0,1] ... (4,5]
+#   meta.json       etiquetas, número de filas y versión del parquet
+# La fila 0 (máscara vacía) no se usa. Cada combinación es una fila contigua: consultarla es indexar.
+#
+# Uso:
+#   python -m app.models.opsa_lattice     # construir las celosías que falten o estén desfasadas
+
+import os  # rutas
+import json  # metadatos
+import argparse  # argumentos CLI
+import threading  # caché concurrente
+from typing import Dict, List, Optional, Tuple  # tipado
+
+import numpy as np  # numérico
+import pandas as pd  # columnas de salida
+
+from app.models.opsa import FIELD_MAP, component_frame, component_series, load_area  # mapeo y fuente del área
+
+LATTICE_ROOT = os.path.join("results", "opsa_lattice")  # artefactos derivados
+
+_lock = threading.Lock()
+_open: Dict[str, Tuple[str, dict, Dict[str, np.ndarray]]] = {}  # área -> (versión, meta, arrays mapeados)
+
+
+def lattice_dir(study_area: str, root: str = LATTICE_ROOT) -> str:
+    return os.path.join(root, study_area)
+
+
+def _read_meta(out_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(out_dir, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_atomic(path: str, a: np.ndarray):
+    """np.save a un temporal + os.replace: los procesos con el .npy anterior mapeado siguen leyendo ese inodo."""
+    tmp = f"{path[:-4]}.{os.getpid()}.tmp.npy"
+    np.save(tmp, a)
+    os.replace(tmp, path)
+
+
+def subset_matrix(k: int) -> np.ndarray:
+    """Matriz (k, 2^k) con 1 donde el componente i está en la combinación (máscara) j."""
+    masks = np.arange(2 ** k)
+    return ((masks[None, :] >> np.arange(k)[:, None]) & 1).astype(np.float64)
+
+
+def _masked_means(values: np.ndarray, subsets: np.ndarray) -> np.ndarray:
+    """Media ignorando NaN de `values` (n, k) para cada combinación: dos productos de matrices (suma y recuento)."""
+    valid = np.isfinite(values)
+    sums = np.where(valid, values, 0.0) @ subsets  # (n, 2^k)
+    counts = valid.astype(np.float64) @ subsets
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts  # 0/0 -> NaN (sin datos en la combinación)
+
+
+def condition_class(cond: np.ndarray) -> np.ndarray:
+    """Discretización estable: 0 -> NoData (NaN o <= 0); 1:(0,1] ... 5:(4,5]."""
+    with np.errstate(invalid="ignore"):
+        cls = np.where(cond > 0, np.ceil(cond), 0)
+    return cls.astype(np.uint8)
+
+
+def build_lattice(study_area: str, out_dir: Optional[str] = None) -> dict:
+    """
+    Calcular condition, confidence y clase para todas las combinaciones de
+    componentes del área sobre una matriz densa (polígonos x componentes) de
+    EV/CO. Solo entran los componentes con columna EV en el parquet.
+    """
+    out_dir = out_dir or lattice_dir(study_area)
+    table, version = load_area(study_area)  # tabla mapeada (solo lectura)
+    frame = component_frame(table, study_area, list(FIELD_MAP[study_area]))  # solo columnas EV/CO
+    labels, ev, co = [], [], []
+    for label, (ev_name, co_candidates) in FIELD_MAP[study_area].items():
+        series = component_series(frame, ev_name, co_candidates)
+        if series is None:
+            continue  # componente sin EV: las combinaciones que lo incluyan lo ignoran, como en el cálculo directo
+        labels.append(label)
+        ev.append(series[0].to_numpy(dtype=np.float64))
+        co.append(series[1].to_numpy(dtype=np.float64))
+    if not labels:
+        raise KeyError(f"No se encontraron columnas EV válidas para el área: {study_area}")
+
+    subsets = subset_matrix(len(labels))
+    cond = np.clip(_masked_means(np.column_stack(ev), subsets), 0, 5)  # acotar a 0–5 (NaN se mantiene)
+    conf = _masked_means(np.column_stack(co), subsets)
+
+    os.makedirs(out_dir, exist_ok=True)
+    meta_path = os.path.join(out_dir, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)  # sin meta.json la celosía no se usa mientras se reescribe
+    _save_atomic(os.path.join(out_dir, "condition.npy"), np.ascontiguousarray(cond.T, dtype=np.float32))
+    _save_atomic(os.path.join(out_dir, "confidence.npy"), np.ascontiguousarray(conf.T, dtype=np.float32))
+    _save_atomic(os.path.join(out_dir, "class.npy"), np.ascontiguousarray(condition_class(cond).T))
+    meta = {"labels": labels, "rows": int(len(table)), "source": version}
+    tmp = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, meta_path)  # meta.json el último y completo
+    return meta
+
+
+def is_fresh(study_area: str) -> bool:
+    meta = _read_meta(lattice_dir(study_area))
+    return bool(meta) and meta["source"] == load_area(study_area)[1]
+
+
+def _load(study_area: str, version: str) -> Optional[Tuple[dict, Dict[str, np.ndarray]]]:
+    with _lock:
+        hit = _open.get(study_area)
+    if hit and hit[0] == version:
+        return hit[1], hit[2]
+    out_dir = lattice_dir(study_area)
+    meta = _read_meta(out_dir)
+    if not meta or meta["source"] != version:
+        return None  # falta o está desfasada: no se construye aquí
+    arrays = {name: np.load(os.path.join(out_dir, f"{name}.npy"), mmap_mode="r")
+              for name in ("condition", "confidence", "class")}
+    with _lock:
+        _open[study_area] = (version, meta, arrays)
+    return meta, arrays
+
+
+def subset_index(labels: List[str], components) -> int:
+    """Máscara de bits de `components` sobre `labels` (los componentes sin columna EV no cuentan)."""
+    pos = {label: i for i, label in enumerate(labels)}
+    return sum(1 << pos[c] for c in set(components) if c in pos)
+
+
+def lattice_columns(study_area: str, components, version: str, index: pd.Index) -> Optional[pd.DataFrame]:
+    """
+    Columnas 'condition', 'confidence' y 'condition_class' de la combinación
+    `components` leídas de la celosía, o None si no hay celosía al día con
+    `version` o la combinación no es representable (se calcula en directo).
+    """
+    loaded = _load(study_area, version)
+    if loaded is None:
+        return None
+    meta, arrays = loaded
+    if any(c not in FIELD_MAP.get(study_area, {}) for c in components) or meta["rows"] != len(index):
+        return None  # etiqueta desconocida o filas distintas: que el cálculo directo dé su error/resultado
+    j = subset_index(meta["labels"], components)
+    if not j:
+        return None
+    return pd.DataFrame({
+        "condition": arrays["condition"][j].astype(float),  # condición
+        "confidence": arrays["confidence"][j].astype(float),  # confianza
+        "condition_class": arrays["class"][j].astype(int),  # clase discreta
+    }, index=index)
+
+
+def refresh() -> int:
+    """Construir las celosías que falten o estén desfasadas para todas las áreas de FIELD_MAP."""
+    built = 0
+    for area in FIELD_MAP:
+        try:
+            if not is_fresh(area):
+                build_lattice(area)
+                built += 1
+        except Exception:
+            continue  # parquet ausente o ilegible (p. ej. puntero LFS sin descargar)
+    return built
+
+
+def main():
+    argparse.ArgumentParser(description="Construir las celosías de condición OPSA de results/opsa.").parse_args()
+    built = refresh()
+    print(f"[opsa-lattice] {built} lattices built in {LATTICE_ROOT}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+# app/models/opsa_mvt.py  # teselas vectoriales (Mapbox Vector Tile 2.1) de las capas EUNIS/OPSA
+#
+# La geometría de cada tesela (recortada, simplificada y cuantizada a la rejilla MVT) se calcula una vez
+# con un STRtree del área en EPSG:3857 y se guarda en RENDER_CACHE ya codificada por feature. Los
+# atributos de condición dependen de los componentes elegidos, así que se añaden en cada petición desde
+# la caché de resultados de opsa (celosía / LRU) sin volver a tocar la geometría.
+#
+# El codificador protobuf es mínimo (solo lo que usa una capa de polígonos): no añade dependencias.
+
+import os  # entorno
+import threading  # caché concurrente
+from typing import Dict, List, Optional, Sequence, Tuple  # tipado
+
+import numpy as np  # numérico
+import shapely  # operaciones vectorizadas
+from shapely import STRtree  # índice espacial
+
+from app.models.opsa import condition_columns, load_area, _ensure_wgs84  # fuente y resultados OPSA
+from app.models.render_cache import RENDER_CACHE  # caché de teselas en disco
+from app.models.saltmarsh_tiles import tile_bounds_3857  # límites XYZ en 3857
+
+MVT_EXTENT = int(os.getenv("OPSA_MVT_EXTENT", "4096"))  # rejilla de coordenadas de la tesela
+MVT_BUFFER = int(os.getenv("OPSA_MVT_BUFFER", "64"))  # margen (unidades de la rejilla) para no cortar trazos
+MVT_SIMPLIFY = float(os.getenv("OPSA_MVT_SIMPLIFY", "8"))  # tolerancia (unidades de la rejilla; 8 = 0,5 px a 256)
+MVT_LAYER = "opsa"  # nombre de la capa dentro de la tesela
+
+_POLYGON = 3  # GeomType.POLYGON
+
+_lock = threading.Lock()
+_indexes: Dict[str, Tuple[str, STRtree, np.ndarray]] = {}  # área -> (versión, árbol, geometrías 3857)
+
+
+# ---------- protobuf mínimo ----------
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def _key(field: int, wire: int) -> bytes:
+    return _varint((field << 3) | wire)
+
+
+def _len_field(field: int, payload: bytes) -> bytes:
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+
+def _packed(field: int, values: Sequence[int]) -> bytes:
+    return _len_field(field, b"".join(_varint(v) for v in values))
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def _value(v) -> bytes:
+    """Value de MVT: enteros como sint64 (campo 6), reales como double (campo 3)."""
+    if isinstance(v, (int, np.integer)):
+        return _key(6, 0) + _varint(_zigzag(int(v)))
+    return _key(3, 1) + np.float64(v).tobytes()
+
+
+# ---------- geometría ----------
+def _ring_commands(coords: np.ndarray, cursor: List[int], exterior: bool) -> List[int]:
+    """
+    MoveTo + LineTo(n) + ClosePath de un anillo cerrado (sin repetir el último punto).
+
+    MVT exige área positiva (fórmula del agrimensor, en la rejilla con y hacia
+    abajo) en el exterior y negativa en los huecos: el anillo se invierte si
+    hace falta. Se calcula sobre las coordenadas enteras ya cuantizadas.
+    """
+    pts = np.rint(coords[:-1]).astype(np.int64)
+    if len(pts) < 3:
+        return []
+    nxt = np.roll(pts, -1, axis=0)
+    area2 = int((pts[:, 0] * nxt[:, 1] - nxt[:, 0] * pts[:, 1]).sum())  # doble del área con signo
+    if area2 == 0:
+        return []  # anillo degenerado
+    if (area2 > 0) != exterior:
+        pts = pts[::-1]
+    deltas = np.diff(np.vstack([cursor, pts]), axis=0)
+    cursor[:] = pts[-1].tolist()
+    zz = ((deltas << 1) ^ (deltas >> 63)).ravel().tolist()  # zigzag vectorizado
+    return [(1 | (1 << 3)), *zz[:2], (2 | ((len(pts) - 1) << 3)), *zz[2:], (7 | (1 << 3))]
+
+
+def _polygon_commands(geom) -> List[int]:
+    cmds: List[int] = []
+    cursor = [0, 0]
+    for poly in getattr(geom, "geoms", [geom]):
+        if poly.geom_type != "Polygon" or poly.is_empty:
+            continue
+        ext = _ring_commands(np.asarray(poly.exterior.coords), cursor, exterior=True)
+        if not ext:
+            continue  # anillo exterior degenerado: se descarta el polígono
+        cmds += ext
+        for ring in poly.interiors:
+            cmds += _ring_commands(np.asarray(ring.coords), cursor, exterior=False)
+    return cmds
+
+
+def _area_index(study_area: str) -> Tuple[STRtree, np.ndarray]:
+    """STRtree y geometrías del área en EPSG:3857 (una vez por versión del parquet)."""
+    table, version = load_area(study_area)
+    with _lock:
+        hit = _indexes.get(study_area)
+    if hit and hit[0] == version:
+        return hit[1], hit[2]
+    geoms = _ensure_wgs84(table.geodataframe([])).to_crs(3857).geometry.values.to_numpy()  # fila = id de feature
+    tree = STRtree(geoms)
+    with _lock:
+        _indexes[study_area] = (version, tree, geoms)
+    return tree, geoms
+
+
+def _tile_features(study_area: str, z: int, x: int, y: int) -> bytes:
+    """
+    Features de la tesela sin atributos: por cada una, varint(id) + varint(longitud)
+    + [id, type, geometry] ya codificados. Es lo que se guarda en disco.
+    """
+    tree, geoms = _area_index(study_area)
+    left, bottom, right, top = tile_bounds_3857(z, x, y)
+    scale = MVT_EXTENT / (right - left)
+    pad = MVT_BUFFER / scale
+    ids = np.sort(tree.query(shapely.box(left - pad, bottom - pad, right + pad, top + pad)))
+    if not len(ids):
+        return b""
+    clipped = shapely.clip_by_rect(geoms[ids], left - pad, bottom - pad, right + pad, top + pad)
+    local = shapely.transform(clipped, lambda c: np.column_stack([(c[:, 0] - left) * scale, (top - c[:, 1]) * scale]))
+    local = shapely.simplify(local, MVT_SIMPLIFY, preserve_topology=True)
+    local = shapely.set_precision(local, 1.0)  # rejilla entera de MVT (geometrías válidas); la orientación va en _ring_commands
+    return b"".join(encode_feature(fid, geom) for fid, geom in zip(ids.tolist(), local))
+
+
+def encode_feature(fid: int, geom) -> bytes:
+    """varint(id) + varint(longitud) + Feature sin tags (id, type, geometry) de un polígono en coordenadas de la rejilla."""
+    if geom is None or geom.is_empty:
+        return b""  # más pequeño que la rejilla
+    cmds = _polygon_commands(geom)
+    if not cmds:
+        return b""
+    body = _key(1, 0) + _varint(fid) + _key(3, 0) + _varint(_POLYGON) + _packed(4, cmds)
+    return _varint(fid) + _varint(len(body)) + body
+
+
+def _iter_features(data: bytes):
+    pos = 0
+    while pos < len(data):
+        fid, pos = _read_varint(data, pos)
+        size, pos = _read_varint(data, pos)
+        yield fid, data[pos:pos + size]
+        pos += size
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    n = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return n, pos
+        shift += 7
+
+
+def tile_style(z: int, x: int, y: int) -> str:
+    """Estilo de caché de la geometría de la tesela (parámetros de rejilla incluidos)."""
+    return f"opsa-mvt:{MVT_EXTENT}:{MVT_BUFFER}:{MVT_SIMPLIFY}:{z}/{x}/{y}"
+
+
+def render_tile(study_area: str, z: int, x: int, y: int, components: Optional[List[str]] = None) -> bytes:
+    """
+    Tesela MVT z/x/y del área: geometría desde RENDER_CACHE (o calculada y
+    guardada) y, si hay `components`, condition / confidence / condition_class
+    de la ejecución unidos por id de feature.
+    """
+    table, _ = load_area(study_area)
+    key = RENDER_CACHE.key(table.path, tile_style(z, x, y), "bin")  # features sin capa: no es un .pbf completo
+    features = RENDER_CACHE.get_or_render(key, lambda: _tile_features(study_area, z, x, y))
+    if not features:
+        return b""  # tesela vacía: cuerpo vacío es una tesela MVT válida
+
+    cols = condition_columns(study_area, components) if components else None
+    return encode_tile(features, cols)
+
+
+def encode_tile(features: bytes, cols=None) -> bytes:
+    """Tile con una capa MVT_LAYER: `features` de encode_feature y, si hay `cols`, sus atributos por id."""
+    keys = ["condition_class", "condition", "confidence"] if cols is not None else []
+    if cols is not None:
+        cls = cols["condition_class"].to_numpy()
+        cond = cols["condition"].to_numpy().round(2)
+        conf = cols["confidence"].to_numpy().round(2)
+    values: Dict[tuple, int] = {}  # (tipo, valor) -> índice en la tabla de valores
+
+    def _vidx(v) -> int:
+        k = (type(v).__name__, v)
+        if k not in values:
+            values[k] = len(values)
+        return values[k]
+
+    layer = [_len_field(1, MVT_LAYER.encode())]
+    for fid, body in _iter_features(features):
+        if cols is not None:
+            tags = [0, _vidx(int(cls[fid]))]
+            if np.isfinite(cond[fid]):
+                tags += [1, _vidx(float(cond[fid]))]
+            if np.isfinite(conf[fid]):
+                tags += [2, _vidx(float(conf[fid]))]
+            body = _packed(2, tags) + body
+        layer.append(_len_field(2, body))
+    layer += [_len_field(3, k.encode()) for k in keys]
+    layer += [_len_field(4, _value(v)) for (_, v) in values]
+    layer += [_key(5, 0) + _varint(MVT_EXTENT), _key(15, 0) + _varint(2)]
+    return _len_field(3, b"".join(layer))
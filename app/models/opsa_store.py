@@ -0,0 +1,132 @@
+# app/models/opsa_store.py  # capa de datos OPSA: GeoParquet -> tabla Arrow IPC mapeada en memoria, lectura por columnas
+#
+# Cada GeoParquet de results/opsa se convierte una vez (por versión) en results/opsa_arrow/<nombre>.arrow:
+# Arrow IPC sin compresión, así que el fichero se abre con mmap y las columnas se leen sin copiarlas ni
+# descomprimirlas. Las páginas viven en la caché del sistema y se comparten entre procesos (workers de
+# gunicorn): cada proceso solo paga las columnas que toca. La geometría se queda en WKB y solo se
+# decodifica cuando hace falta un GeoJSON para el mapa.
+
+import os  # rutas
+import json  # metadatos "geo"
+import threading  # caché concurrente
+from typing import Dict, List, Optional  # tipado
+
+import pandas as pd  # columnas proyectadas
+import geopandas as gpd  # geometría decodificada
+import pyarrow as pa  # tablas Arrow
+import pyarrow.parquet as pq  # lectura del GeoParquet por lotes
+from pyproj import CRS  # CRS de los metadatos "geo"
+
+from app.models.render_cache import source_version  # versión del parquet (ruta + mtime + tamaño)
+
+ARROW_ROOT = os.path.join("results", "opsa_arrow")  # artefactos derivados
+ARROW_BATCH_ROWS = int(os.getenv("OPSA_ARROW_BATCH_ROWS", "65536"))  # filas por lote al convertir
+
+_SOURCE_KEY = b"opsa_source"  # versión del parquet guardada en los metadatos del esquema
+_INDEX_COLUMNS = ("__index_level_0__",)  # índice serializado por pandas (no es un dato)
+
+_lock = threading.Lock()
+_open: Dict[str, "AreaTable"] = {}  # parquet -> tabla abierta
+
+
+def arrow_path(parquet_path: str, root: str = ARROW_ROOT) -> str:
+    return os.path.join(root, os.path.splitext(os.path.basename(parquet_path))[0] + ".arrow")
+
+
+def _read_table(path: str) -> pa.Table:
+    """Tabla Arrow sobre el fichero mapeado (los buffers apuntan al mmap, sin copias)."""
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def _stored_version(path: str) -> Optional[str]:
+    try:
+        meta = pa.ipc.open_file(pa.memory_map(path, "r")).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    value = meta.get(_SOURCE_KEY)
+    return value.decode() if value else None
+
+
+def convert(parquet_path: str, out_path: Optional[str] = None) -> str:
+    """Reescribir `parquet_path` como Arrow IPC sin compresión, lote a lote (memoria acotada); sustitución atómica."""
+    out_path = out_path or arrow_path(parquet_path)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    src = pq.ParquetFile(parquet_path)
+    schema = src.schema_arrow
+    schema = schema.with_metadata({**(schema.metadata or {}), _SOURCE_KEY: source_version(parquet_path).encode()})
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for batch in src.iter_batches(batch_size=ARROW_BATCH_ROWS):
+            writer.write_batch(pa.RecordBatch.from_arrays(batch.columns, schema=schema))
+    os.replace(tmp, out_path)
+    return out_path
+
+
+def ensure_arrow(parquet_path: str) -> str:
+    """Ruta del .arrow de `parquet_path`, convirtiéndolo solo si falta o el parquet cambió."""
+    path = arrow_path(parquet_path)
+    if _stored_version(path) != source_version(parquet_path):
+        convert(parquet_path, path)
+    return path
+
+
+class AreaTable:
+    """
+    Tabla de un área mapeada en memoria (solo lectura).
+
+    `frame(nombres)` proyecta columnas a pandas; `geodataframe()` añade la
+    geometría decodificada. Las filas van siempre en el orden del fichero
+    con un RangeIndex, así que los resultados por fila se alinean entre
+    llamadas.
+    """
+
+    def __init__(self, path: str, version: str):
+        self.path = path
+        self.version = version
+        self.table = _read_table(path)
+        geo = json.loads((self.table.schema.metadata or {}).get(b"geo", b"{}"))
+        self.geometry_column: Optional[str] = geo.get("primary_column")
+        self._geo_meta = (geo.get("columns") or {}).get(self.geometry_column, {})
+        self.columns: List[str] = [c for c in self.table.column_names
+                                   if c != self.geometry_column and c not in _INDEX_COLUMNS]
+        self.index = pd.RangeIndex(self.table.num_rows)
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def frame(self, names: List[str]) -> pd.DataFrame:
+        """Solo las columnas `names` como DataFrame (las numéricas sin nulos no se copian)."""
+        return self.table.select(list(names)).to_pandas(split_blocks=True, ignore_metadata=True)
+
+    @property
+    def crs(self) -> Optional[CRS]:
+        if "crs" not in self._geo_meta:
+            return CRS.from_user_input("OGC:CRS84")  # GeoParquet: sin clave "crs" -> lon/lat WGS84
+        crs = self._geo_meta["crs"]
+        return CRS.from_json_dict(crs) if isinstance(crs, dict) else (CRS.from_user_input(crs) if crs else None)
+
+    @property
+    def bbox(self) -> Optional[List[float]]:
+        """[oeste, sur, este, norte] de los metadatos "geo" (en el CRS de la geometría), si vienen."""
+        bbox = self._geo_meta.get("bbox")
+        return [float(v) for v in bbox] if bbox and len(bbox) == 4 else None
+
+    def geodataframe(self, names: Optional[List[str]] = None) -> gpd.GeoDataFrame:
+        """Columnas `names` (todas por defecto) más la geometría decodificada del WKB."""
+        df = self.frame(self.columns if names is None else names)
+        geom = gpd.GeoSeries.from_wkb(self.table.column(self.geometry_column).to_numpy(zero_copy_only=False),
+                                      index=self.index, crs=self.crs)
+        return gpd.GeoDataFrame(df, geometry=geom)
+
+
+def open_area(parquet_path: str) -> AreaTable:
+    """Tabla mapeada de `parquet_path` (convertida si hace falta); se reabre solo si el parquet cambió."""
+    version = source_version(parquet_path)
+    with _lock:
+        hit = _open.get(parquet_path)
+    if hit and hit.version == version:
+        return hit
+    tbl = AreaTable(ensure_arrow(parquet_path), version)
+    with _lock:
+        _open[parquet_path] = tbl
+    return tbl
@@ -0,0 +1,100 @@
+# app/models/pixel_inspector.py  # consulta puntual: clase, acreción, probabilidades y certeza en todos los escenarios y años
+
+import threading  # acceso concurrente
+from collections import OrderedDict  # orden LRU
+from functools import lru_cache  # transformadores por CRS
+from typing import Dict, Optional, Tuple  # tipado
+
+import numpy as np  # numérico
+from pyproj import Transformer  # lon/lat -> CRS del ráster
+from rasterio.windows import Window  # ventana de 1x1
+
+from app.models.raster_handles import POOL  # datasets ya abiertos
+from app.models.render_cache import source_version  # versión de las fuentes
+from app.models.saltmarsh_catalog import CATALOG  # catálogo de escenarios
+from app.models.saltmarsh_model_layers import model_layers  # salidas del modelo entrenado
+from app.models.saltmarsh_transitions import CLASS_NAMES, N_CLASSES  # nombres de clase
+
+
+@lru_cache(maxsize=32)
+def _transformer(crs_wkt: str) -> Transformer:
+    return Transformer.from_crs("EPSG:4326", crs_wkt, always_xy=True)
+
+
+_GEOMETRY_CACHE_SIZE = 256  # ficheros distintos recordados (catálogo + capas del modelo caben de sobra)
+_geometries: "OrderedDict[str, Tuple[str, tuple]]" = OrderedDict()  # ruta -> (versión, geometría)
+_geometries_lock = threading.Lock()
+
+
+def _geometry(path: str, src) -> tuple:
+    """
+    (transformer, transform inverso, alto, ancho, nodata) de un dataset.
+
+    Una entrada por ruta: si el fichero cambia (otra versión) se sustituye en
+    lugar de acumularse, y como mucho se guardan _GEOMETRY_CACHE_SIZE rutas (LRU).
+    """
+    version = source_version(path)
+    with _geometries_lock:
+        hit = _geometries.get(path)
+        if hit and hit[0] == version:
+            _geometries.move_to_end(path)
+            return hit[1]
+    geom = (_transformer(src.crs.to_wkt()), ~src.transform, src.height, src.width, src.nodata)
+    with _geometries_lock:
+        _geometries[path] = (version, geom)
+        _geometries.move_to_end(path)
+        while len(_geometries) > _GEOMETRY_CACHE_SIZE:
+            _geometries.popitem(last=False)
+    return geom
+
+
+def sample(path: str, lng: float, lat: float) -> Optional[float]:
+    """Valor del píxel de `path` en (lng, lat) o None si cae fuera o es nodata."""
+    with POOL.dataset(path) as src:
+        to_crs, inv, height, width, nodata = _geometry(path, src)
+        col, row = inv * to_crs.transform(lng, lat)  # lon/lat -> CRS -> píxel (sin pasar por sample_gen)
+        col, row = int(np.floor(col)), int(np.floor(row))
+        if not (0 <= row < height and 0 <= col < width):
+            return None
+        value = src.read(1, window=Window(col, row, 1, 1))[0, 0]  # solo el bloque del píxel
+    if (nodata is not None and value == nodata) or not np.isfinite(value):
+        return None
+    return value.item()
+
+
+def _class(value) -> Optional[int]:
+    return int(value) if value is not None and 0 <= value < N_CLASSES else None
+
+
+def inspect_point(area: str, lat: float, lng: float) -> Dict:
+    """
+    Todo lo que hay bajo (lat, lng) en `area`.
+
+    - scenarios: {escenario: {año: {"class", "class_name", "accretion"}}} de cada
+      entrada del catálogo (rásters originales, sin remuestrear)
+    - model: probabilidades por clase, certeza y clase predicha del modelo entrenado
+    """
+    scenarios: Dict[str, Dict] = {}
+    for a, scen, year, entry in CATALOG.rasters():
+        if a != area:
+            continue
+        cls = _class(sample(entry.class_tif, lng, lat))
+        acc = sample(entry.accretion_tif, lng, lat) if entry.accretion_tif else None
+        scenarios.setdefault(scen, {})[year] = {
+            "class": cls,
+            "class_name": CLASS_NAMES[cls] if cls is not None else None,
+            "accretion": acc,
+        }
+
+    layers = model_layers(area)
+    values = {name: sample(path, lng, lat) for name, path in layers.items()}
+    predicted = _class(values.get("responses"))
+    model = {
+        "probabilities": {
+            CLASS_NAMES[c]: values.get(f"probability_{c}") for c in range(N_CLASSES) if f"probability_{c}" in layers
+        },
+        "certainty": values.get("certainty"),
+        "predicted_class": predicted,
+        "predicted_class_name": CLASS_NAMES[predicted] if predicted is not None else None,
+    }
+    return {"area": area, "lat": lat, "lng": lng, "scenarios": scenarios, "model": model}
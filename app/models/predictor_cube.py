@@ -0,0 +1,130 @@
+# app/models/predictor_cube.py  # cubo de predictores alineado en un único np.memmap (píxeles con bandas intercaladas)
+#
+# Disposición en disco (<cube_dir>/):
+#   predictors.f32  float32 (alto, ancho, n_predictores), C-order: los predictores de un píxel van seguidos
+#                   y una franja de filas completas es un único tramo contiguo del fichero
+#   meta.json       nombres (orden de columnas), malla (CRS, transform, tamaño) y versión de cada fuente
+
+import os  # rutas
+import json  # metadatos
+from contextlib import ExitStack  # abrir todos los predictores a la vez
+from typing import Dict, List, Optional, Tuple  # tipado
+
+import numpy as np  # numérico / memmap
+import rasterio  # ráster
+from rasterio.crs import CRS  # sistema de referencia
+from rasterio.transform import Affine  # transform de la malla
+from rasterio.vrt import WarpedVRT  # remuestrear sobre la malla común
+from rasterio.enums import Resampling  # remuestreo
+
+from app.models.block_stats import TARGET_BLOCK_PX  # tamaño de franja
+from app.models.render_cache import source_version  # versión de las fuentes
+
+DATA_NAME = "predictors.f32"
+META_NAME = "meta.json"
+
+
+def _versions(paths: Dict[str, str]) -> Dict[str, str]:
+    return {name: source_version(p) for name, p in paths.items()}
+
+
+def row_strips(height: int, width: int, target_px: int = TARGET_BLOCK_PX) -> List[Tuple[int, int]]:
+    """Franjas (fila0, fila1) de filas completas de unos `target_px` píxeles."""
+    rows = max(1, target_px // max(width, 1))
+    return [(r, min(r + rows, height)) for r in range(0, height, rows)]
+
+
+def read_meta(cube_dir: str) -> Optional[dict]:
+    path = os.path.join(cube_dir, META_NAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None  # cubo a medio escribir o corrupto -> se reconstruye
+
+
+def is_fresh(cube_dir: str, paths: Dict[str, str]) -> bool:
+    """True si el cubo existe con los mismos predictores, en el mismo orden y sin cambios en las fuentes."""
+    meta = read_meta(cube_dir)
+    return bool(meta) and meta["names"] == list(paths) and meta["sources"] == _versions(paths) \
+        and os.path.exists(os.path.join(cube_dir, DATA_NAME))
+
+
+def build_cube(paths: Dict[str, str], cube_dir: str, target_px: int = TARGET_BLOCK_PX,
+               resampling: Resampling = Resampling.bilinear) -> dict:
+    """
+    Remuestrear los predictores `paths` (nombre -> tif, en orden de columnas)
+    sobre la malla del primero y escribirlos en un único memmap (alto, ancho, n).
+
+    Se escribe por franjas de filas (memoria acotada); nodata -> NaN. El
+    fichero de datos se sustituye de forma atómica y meta.json va el último,
+    así que un cubo a medio construir nunca se lee como válido.
+    """
+    names = list(paths)
+    os.makedirs(cube_dir, exist_ok=True)
+    meta_path = os.path.join(cube_dir, META_NAME)
+    tmp = os.path.join(cube_dir, f"{DATA_NAME}.{os.getpid()}.tmp")
+    with ExitStack() as stack:
+        ref = stack.enter_context(rasterio.open(paths[names[0]]))
+        height, width, crs, transform = ref.height, ref.width, ref.crs, ref.transform
+        srcs = []
+        for name in names:
+            src = stack.enter_context(rasterio.open(paths[name]))
+            if not (src.crs == crs and src.transform == transform and (src.width, src.height) == (width, height)):
+                src = stack.enter_context(WarpedVRT(src, crs=crs, transform=transform, width=width, height=height,
+                                                    resampling=resampling))  # misma malla que el primero
+            srcs.append(src)
+        cube = np.memmap(tmp, dtype=np.float32, mode="w+", shape=(height, width, len(names)))
+        for r0, r1 in row_strips(height, width, target_px):
+            strip = np.empty((r1 - r0, width, len(names)), dtype=np.float32)
+            for j, src in enumerate(srcs):
+                band = src.read(1, window=((r0, r1), (0, width)), masked=True)
+                strip[:, :, j] = np.ma.filled(band.astype(np.float32), np.nan)
+            cube[r0:r1] = strip  # una escritura contigua por franja
+        cube.flush()
+        del cube
+    if os.path.exists(meta_path):
+        os.remove(meta_path)  # sin meta.json el cubo no se abre mientras se sustituye el fichero de datos
+    os.replace(tmp, os.path.join(cube_dir, DATA_NAME))
+    meta = {
+        "names": names,
+        "dtype": "float32",
+        "height": height,
+        "width": width,
+        "crs": crs.to_wkt() if crs else None,
+        "transform": list(transform)[:6],
+        "sources": _versions(paths),
+    }
+    tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_meta, meta_path)
+    return meta
+
+
+def ensure_cube(paths: Dict[str, str], cube_dir: str, force: bool = False) -> dict:
+    """Construir el cubo solo si falta o alguna fuente cambió; devuelve sus metadatos."""
+    if not force and is_fresh(cube_dir, paths):
+        return read_meta(cube_dir)
+    return build_cube(paths, cube_dir)
+
+
+class PredictorCube:
+    """Cubo de solo lectura: `features(r0, r1)` devuelve la franja como matriz (píxeles, predictores) sin copiar."""
+
+    def __init__(self, cube_dir: str):
+        self.meta = read_meta(cube_dir)
+        if not self.meta:
+            raise FileNotFoundError(f"No predictor cube in {cube_dir}.")
+        self.names: List[str] = self.meta["names"]
+        self.height, self.width = self.meta["height"], self.meta["width"]
+        self.crs = CRS.from_wkt(self.meta["crs"]) if self.meta["crs"] else None
+        self.transform = Affine(*self.meta["transform"])
+        self.data = np.memmap(os.path.join(cube_dir, DATA_NAME), dtype=np.float32, mode="r",
+                              shape=(self.height, self.width, len(self.names)))
+
+    def features(self, r0: int, r1: int) -> np.ndarray:
+        """Filas r0..r1 (ancho completo) como (píxeles, predictores): un único tramo contiguo del fichero."""
+        return self.data[r0:r1].reshape(-1, len(self.names))
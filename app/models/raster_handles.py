@@ -0,0 +1,114 @@
+# app/models/raster_handles.py  # pool de datasets rasterio ya abiertos (reutilizados entre peticiones)
+
+import os  # rutas/entorno
+import threading  # acceso concurrente
+from collections import OrderedDict  # LRU de handles libres
+from contextlib import contextmanager  # préstamo de handles
+from typing import List, Optional, Tuple  # tipado
+
+import rasterio  # ráster
+from rasterio.crs import CRS  # comparar CRS
+from rasterio.enums import Resampling  # remuestreo de los VRT
+from rasterio.vrt import WarpedVRT  # vistas reproyectadas
+
+from app.models.render_cache import source_version  # versión de las fuentes
+
+RASTER_POOL_SIZE = int(os.getenv("RASTER_POOL_SIZE", "64"))  # handles libres como mucho (entre todas las rutas)
+
+_Key = Tuple[str, Optional[str], Optional[int]]  # (ruta, CRS del VRT, remuestreo)
+
+
+class HandlePool:
+    """
+    Datasets de rasterio abiertos y reutilizables.
+
+    Un dataset no admite lecturas concurrentes, así que cada handle se presta
+    a un solo hilo a la vez: `with POOL.dataset(path) as src` toma uno libre
+    (o abre otro si todos están prestados) y lo devuelve al salir. Con `crs`
+    se presta un WarpedVRT a ese CRS (montado sobre su propio dataset), de
+    modo que tampoco se repite la preparación de la reproyección.
+
+    Los handles libres forman un LRU acotado por RASTER_POOL_SIZE; cada uno
+    guarda la versión (mtime/tamaño) del fichero y se descarta al pedirlo si
+    el fichero cambió. `invalidate` cierra los de una ruta a demanda.
+    """
+
+    def __init__(self, max_idle: int = RASTER_POOL_SIZE):
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle: "OrderedDict[_Key, List[tuple]]" = OrderedDict()  # clave -> [(versión, handle, base)]
+        self._n_idle = 0
+
+    @staticmethod
+    def _close(handle, base):
+        handle.close()
+        if base is not None:
+            base.close()
+
+    @staticmethod
+    def _open(path: str, crs, resampling: Resampling):
+        src = rasterio.open(path)
+        if crs is None or src.crs == CRS.from_user_input(crs):
+            return src, None  # ya está en ese CRS: sin VRT
+        try:
+            return WarpedVRT(src, crs=crs, resampling=resampling), src
+        except Exception:
+            src.close()
+            raise
+
+    @contextmanager
+    def dataset(self, path: str, crs=None, resampling: Resampling = Resampling.nearest):
+        key = (os.path.abspath(path), str(crs) if crs else None, int(resampling) if crs else None)
+        version = source_version(path)
+        entry, stale = None, []
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                item = idle.pop()
+                self._n_idle -= 1
+                if item[0] == version:
+                    entry = item
+                    break
+                stale.append(item)  # fichero modificado
+            if not idle:
+                self._idle.pop(key, None)
+        for _, handle, base in stale:
+            self._close(handle, base)
+        if entry is None:
+            entry = (version, *self._open(path, crs, resampling))
+        try:
+            yield entry[1]
+        finally:
+            self._release(key, entry)
+
+    def _release(self, key: _Key, entry: tuple):
+        evicted = []
+        with self._lock:
+            self._idle.setdefault(key, []).append(entry)
+            self._idle.move_to_end(key)  # usado recientemente
+            self._n_idle += 1
+            while self._n_idle > self.max_idle:  # LRU: cerrar los de la ruta menos reciente
+                old_key, handles = next(iter(self._idle.items()))
+                evicted.append(handles.pop(0))
+                self._n_idle -= 1
+                if not handles:
+                    del self._idle[old_key]
+        for _, handle, base in evicted:
+            self._close(handle, base)
+
+    def invalidate(self, path: Optional[str] = None):
+        """Cerrar los handles libres de `path` (todas sus vistas) o, sin ruta, todos."""
+        target = os.path.abspath(path) if path else None
+        with self._lock:
+            keys = [k for k in self._idle if target is None or k[0] == target]
+            dropped = [item for k in keys for item in self._idle.pop(k)]
+            self._n_idle -= len(dropped)
+        for _, handle, base in dropped:
+            self._close(handle, base)
+
+    def close(self):
+        """Cerrar todos los handles libres."""
+        self.invalidate()
+
+
+POOL = HandlePool()  # instancia compartida
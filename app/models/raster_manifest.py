@@ -0,0 +1,160 @@
+# app/models/raster_manifest.py  # manifiesto de metadatos de los rásters de saltmarsh (sin leer píxeles)
+#
+# Uso:
+#   python -m app.models.raster_manifest     # reconstruir results/saltmarshes/raster_manifest.json
+
+import os  # rutas/entorno
+import json  # persistencia
+import glob  # búsqueda por patrón
+import argparse  # argumentos CLI
+import threading  # acceso concurrente
+from typing import Dict, Optional  # tipado
+
+import rasterio  # ráster (solo cabeceras)
+from rasterio.coords import BoundingBox  # bounds con .left/.bottom/.right/.top
+from rasterio.warp import transform_bounds  # bounds en EPSG:4326
+
+from app.models.saltmarsh_catalog import SALTMARSH_ROOT  # carpeta de salidas del modelo
+
+MANIFEST_PATH = os.path.join(SALTMARSH_ROOT, "raster_manifest.json")  # ubicación del manifiesto
+
+_lock = threading.Lock()
+_entries: Dict[str, dict] = {}  # ruta relativa -> metadatos
+_loaded = False
+
+
+def _rel(path: str) -> str:
+    return os.path.relpath(os.path.abspath(path), os.getcwd()).replace(os.sep, "/")  # clave portable
+
+
+def read_header(path: str) -> dict:
+    """Metadatos de un ráster leyendo solo la cabecera."""
+    st = os.stat(path)
+    with rasterio.open(path) as src:
+        t = src.transform
+        crs = src.crs
+        if crs is not None:
+            b = transform_bounds(crs, "EPSG:4326", *src.bounds, densify_pts=21)  # bounds 4326 (bordes densificados)
+        else:
+            b = tuple(src.bounds)
+        return {
+            "mtime_ns": st.st_mtime_ns,
+            "size": st.st_size,
+            "crs": crs.to_string() if crs else None,
+            "transform": [t.a, t.b, t.c, t.d, t.e, t.f],
+            "width": src.width,
+            "height": src.height,
+            "count": src.count,
+            "dtype": src.dtypes[0],
+            "nodata": src.nodata,
+            "pixel_area": abs(t.a * t.e - t.b * t.d),  # unidades del CRS al cuadrado (m² en CRS proyectado)
+            "bounds_4326": list(b),
+        }
+
+
+def all_rasters(root: str = SALTMARSH_ROOT):
+    """Todos los .tif/.tiff bajo results/saltmarshes (escenarios y modelo entrenado)."""
+    root = os.path.join(os.getcwd(), root)
+    hits = glob.glob(os.path.join(root, "**", "*.tif"), recursive=True) + glob.glob(os.path.join(root, "**", "*.tiff"), recursive=True)
+    return sorted(hits)
+
+
+def _is_fresh(entry: Optional[dict], path: str) -> bool:
+    if not entry:
+        return False
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return entry.get("mtime_ns") == st.st_mtime_ns and entry.get("size") == st.st_size
+
+
+def _load_file():
+    global _loaded
+    path = os.path.join(os.getcwd(), MANIFEST_PATH)
+    if os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                _entries.update(json.load(f))
+        except (OSError, ValueError):
+            pass  # manifiesto corrupto -> se reconstruye bajo demanda
+    _loaded = True
+
+
+def save():
+    path = os.path.join(os.getcwd(), MANIFEST_PATH)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _lock:
+        data = dict(_entries)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def refresh(root: str = SALTMARSH_ROOT, persist: bool = True) -> Dict[str, dict]:
+    """Cargar el manifiesto y releer solo las cabeceras nuevas o modificadas."""
+    with _lock:
+        if not _loaded:
+            _load_file()
+    changed = False
+    seen = set()
+    for p in all_rasters(root):
+        key = _rel(p)
+        seen.add(key)
+        if _is_fresh(_entries.get(key), p):
+            continue
+        try:
+            entry = read_header(p)
+        except Exception:
+            continue  # ráster ilegible (p. ej. puntero LFS sin descargar)
+        with _lock:
+            _entries[key] = entry
+        changed = True
+    with _lock:
+        for key in [k for k in _entries if k not in seen]:  # ficheros borrados
+            del _entries[key]
+            changed = True
+    if changed and persist:
+        save()
+    return _entries
+
+
+def raster_info(path: str) -> Optional[dict]:
+    """Metadatos de `path` desde memoria; si falta o está desfasado se relee su cabecera."""
+    with _lock:
+        if not _loaded:
+            _load_file()
+        entry = _entries.get(_rel(path))
+    if _is_fresh(entry, path):
+        return entry
+    try:
+        entry = read_header(path)
+    except Exception:
+        return None
+    with _lock:
+        _entries[_rel(path)] = entry
+    return entry
+
+
+def bounds_4326(path: str) -> Optional[BoundingBox]:
+    """Bounds EPSG:4326 de `path` (left, bottom, right, top) sin leer píxeles."""
+    info = raster_info(path)
+    return BoundingBox(*info["bounds_4326"]) if info else None
+
+
+def pixel_area(path: str) -> Optional[float]:
+    """Área de píxel de `path` en unidades del CRS al cuadrado."""
+    info = raster_info(path)
+    return info["pixel_area"] if info else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construir el manifiesto de metadatos de results/saltmarshes.")
+    parser.add_argument("--root", default=SALTMARSH_ROOT, help="carpeta de salidas del modelo")
+    args = parser.parse_args()
+    entries = refresh(args.root)
+    print(f"[manifest] {len(entries)} rasters in {MANIFEST_PATH}")
+
+
+if __name__ == "__main__":
+    main()
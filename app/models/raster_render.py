@@ -0,0 +1,113 @@
+# app/models/raster_render.py  # PNG indexados (modo "P") para rásters de clases sin matplotlib
+
+import hashlib  # firma de la paleta
+from io import BytesIO  # buffer de salida
+from typing import Dict, Sequence, Tuple  # tipado
+
+import numpy as np  # numérico
+from PIL import Image  # codificar PNG
+
+# Colores de las clases de saltmarsh (mismo orden que CLASS_INFO en marsh_callbacks)
+SALTMARSH_CLASS_COLORS: Dict[int, str] = {
+    0: "#8B4513",  # Mudflat
+    1: "#006400",  # Saltmarsh
+    2: "#636363",  # Upland Areas
+    3: "#31C2F3",  # Channel
+}
+
+
+def hex_to_rgb(color: str) -> Tuple[int, int, int]:
+    color = color.lstrip("#")  # quitar '#'
+    return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))  # (r, g, b)
+
+
+class ClassPalette:
+    """
+    Tabla de consulta (LUT) código de clase -> índice de paleta.
+
+    Los códigos 0..n-1 se pintan con su color; cualquier otro valor (nodata,
+    fuera de extensión, códigos desconocidos) va al índice transparente, que
+    es el último de la paleta.
+    """
+
+    def __init__(self, colors: Dict[int, str]):
+        self.codes = sorted(colors)  # códigos conocidos
+        size = max(self.codes) + 1  # tamaño de la LUT
+        self.transparent = len(self.codes)  # índice reservado para transparente
+        self.lut = np.full(size + 1, self.transparent, dtype=np.uint8)  # última celda: fuera de rango
+        for i, code in enumerate(self.codes):
+            self.lut[code] = i  # código -> índice de paleta
+        rgb = [c for code in self.codes for c in hex_to_rgb(colors[code])]  # paleta plana
+        self.palette = rgb + [0, 0, 0]  # entrada transparente
+        self.signature = hashlib.sha1(bytes(self.palette) + bytes(self.lut)).hexdigest()[:12]  # para claves de caché
+
+    def indices(self, data) -> np.ndarray:
+        """Mapear un array (opcionalmente enmascarado) de códigos a índices uint8."""
+        codes = np.asarray(np.ma.filled(data, -1))  # nodata -> -1
+        out_of_range = (codes < 0) | (codes >= len(self.lut) - 1)  # fuera de la LUT
+        if codes.dtype.kind == "f":  # rásters float: NaN también es nodata
+            out_of_range |= ~np.isfinite(codes)
+        safe = np.where(out_of_range, len(self.lut) - 1, codes).astype(np.intp, copy=False)  # indexar sin desbordar
+        return self.lut[safe]
+
+
+SALTMARSH_PALETTE = ClassPalette(SALTMARSH_CLASS_COLORS)  # paleta por defecto
+
+
+class ContinuousPalette:
+    """
+    LUT de 255 colores para rásters continuos (probabilidades, certeza...).
+
+    Los valores se escalan linealmente de [vmin, vmax] a los índices 0..254 y
+    el índice 255 queda reservado para transparente (nodata, NaN, máscara).
+    """
+
+    size = 255
+
+    def __init__(self, stops: Sequence[str]):
+        rgb = np.array([hex_to_rgb(c) for c in stops], dtype=np.float64)  # colores de control
+        pos = np.linspace(0.0, 1.0, len(stops))
+        t = np.linspace(0.0, 1.0, self.size)
+        ramp = np.stack([np.interp(t, pos, rgb[:, k]) for k in range(3)], axis=1).round().astype(np.uint8)  # interpolar
+        self.transparent = self.size
+        self.palette = ramp.ravel().tolist() + [0, 0, 0]  # entrada transparente
+        self.signature = hashlib.sha1(bytes(self.palette)).hexdigest()[:12]  # para claves de caché
+
+    def indices(self, data, vmin: float, vmax: float) -> np.ndarray:
+        """Mapear un array (opcionalmente enmascarado) de valores a índices uint8."""
+        values = np.ma.filled(np.ma.asarray(data, dtype=np.float64), np.nan)
+        span = (vmax - vmin) or 1.0
+        scaled = np.clip((values - vmin) / span, 0.0, 1.0) * (self.size - 1)  # 0..254
+        out = np.full(values.shape, self.transparent, dtype=np.uint8)
+        ok = np.isfinite(values)
+        out[ok] = np.rint(scaled[ok]).astype(np.uint8)
+        return out
+
+
+PROBABILITY_CMAP = ContinuousPalette(["#440154", "#3B528B", "#21918C", "#5EC962", "#FDE725"])  # tipo viridis
+CERTAINTY_CMAP = ContinuousPalette(["#D7191C", "#FDAE61", "#FFFFBF", "#A6D96A", "#1A9641"])  # rojo (baja) -> verde (alta)
+
+
+def encode_indexed_png(indices: np.ndarray, palette: Sequence[int], transparent: int) -> bytes:
+    """Codificar un array uint8 de índices como PNG modo "P" con un índice transparente."""
+    im = Image.fromarray(np.ascontiguousarray(indices, dtype=np.uint8), mode="P")  # imagen indexada
+    im.putpalette(list(palette))  # paleta RGB
+    buf = BytesIO()  # buffer
+    im.save(buf, format="PNG", transparency=transparent, compress_level=1)  # tRNS para el índice transparente; zlib rápido
+    return buf.getvalue()
+
+
+def class_png(data, palette: ClassPalette = SALTMARSH_PALETTE) -> bytes:
+    """PNG indexado de un ráster de clases; nodata/máscara -> transparente."""
+    return encode_indexed_png(palette.indices(data), palette.palette, palette.transparent)
+
+
+def continuous_png(data, cmap: ContinuousPalette, vmin: float, vmax: float) -> bytes:
+    """PNG indexado de un ráster continuo escalado a [vmin, vmax]; nodata/máscara -> transparente."""
+    return encode_indexed_png(cmap.indices(data, vmin, vmax), cmap.palette, cmap.transparent)
+
+
+def empty_png(width: int, height: int, palette: ClassPalette = SALTMARSH_PALETTE) -> bytes:
+    """PNG indexado totalmente transparente."""
+    indices = np.full((height, width), palette.transparent, dtype=np.uint8)
+    return encode_indexed_png(indices, palette.palette, palette.transparent)
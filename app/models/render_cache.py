@@ -0,0 +1,128 @@
+# app/models/render_cache.py  # caché en disco de renders (PNG, GeoJSON, MVT...) con presupuesto de bytes y expulsión LRU
+
+import os  # rutas/entorno
+import hashlib  # claves estables
+import threading  # acceso concurrente
+from collections import OrderedDict  # orden LRU
+from typing import Callable, Optional  # tipado
+
+# Carpeta y presupuesto de la caché (configurables por entorno, como UPLOADS_TTL_HOURS en run.py)
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", os.path.join(".cache", "renders"))
+RENDER_CACHE_MAX_MB = int(os.getenv("RENDER_CACHE_MAX_MB", "512"))
+
+
+def source_version(path: str) -> str:
+    """Versión de un fichero fuente: ruta absoluta + mtime (ns) + tamaño."""
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}"
+
+
+class RenderCache:
+    """
+    Caché de renders en disco.
+
+    La clave combina la versión del fichero fuente (ruta, mtime, tamaño) con un
+    estilo arbitrario (producto, paleta, tesela...), así que una fuente
+    modificada invalida sus renders sin borrar nada a mano. Cuando el total
+    supera `max_bytes` se expulsan las entradas usadas hace más tiempo.
+    """
+
+    def __init__(self, root: str = RENDER_CACHE_DIR, max_bytes: int = RENDER_CACHE_MAX_MB * 2**20):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # clave -> bytes (más antigua primero)
+        self._total = 0
+        self._load_index()
+
+    # ---------- claves ----------
+    @staticmethod
+    def key(src_path: str, style: str, suffix: str = "png") -> str:
+        """Clave (y ETag) de un render de `src_path` con el estilo `style`; `suffix` es la extensión en disco."""
+        raw = f"{source_version(src_path)}|{style}".encode("utf-8")
+        return f"{hashlib.sha1(raw).hexdigest()}.{suffix}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)  # 256 subcarpetas para no saturar un directorio
+
+    # ---------- índice ----------
+    def _load_index(self):
+        if not os.path.isdir(self.root):
+            return
+        found = []
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".tmp") or "." not in name:
+                    continue  # escritura a medias / fichero ajeno
+                p = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                found.append((st.st_mtime, name, st.st_size))
+        for _, key, size in sorted(found):  # menos reciente primero
+            self._entries[key] = size
+            self._total += size
+
+    def _evict(self):
+        while self._total > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)  # LRU
+            self._total -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    # ---------- API ----------
+    def has(self, key: str) -> bool:
+        """True si `key` está en el índice (sin leer el fichero)."""
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key: str) -> Optional[bytes]:
+        p = self._path(key)
+        try:
+            with open(p, "rb") as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                size = self._entries.pop(key, None)  # otro proceso pudo expulsarla
+                if size is not None:
+                    self._total -= size
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)  # marcar como usada
+            else:
+                self._entries[key] = len(data)  # escrita por otro proceso
+                self._total += len(data)
+        try:
+            os.utime(p)  # mtime = último uso (orden LRU al reiniciar)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, data: bytes):
+        p = self._path(key)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        tmp = f"{p}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, p)  # escritura atómica
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total -= old
+            self._entries[key] = len(data)
+            self._total += len(data)
+            self._evict()
+
+    def get_or_render(self, key: str, render: Callable[[], bytes]) -> bytes:
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+
+RENDER_CACHE = RenderCache()  # instancia compartida por las rutas de run.py
@@ -0,0 +1,191 @@
+# app/models/saltmarsh_catalog.py  # catálogo único de salidas de saltmarsh: área -> escenario -> año -> ficheros
+
+import os  # rutas/entorno
+import re  # parsear nombres de fichero
+import time  # limitar la frecuencia de comprobación
+import threading  # acceso concurrente
+from dataclasses import dataclass  # registros inmutables
+from typing import Dict, List, Optional, Tuple  # tipado
+
+SALTMARSH_ROOT = os.path.join("results", "saltmarshes")  # salidas del modelo
+SKIP_DIRS = {"netcdf", "trained_model"}  # carpetas de un área que no son escenarios
+CHECK_INTERVAL_S = float(os.getenv("SALTMARSH_CATALOG_CHECK_S", "2"))  # cada cuánto mirar los mtimes
+
+# <site>_<reg|glo>_<rcpXX>_<year>_<N>g[_accretion].tif  (p. ej. cadiz_reg_rcp85_2073_25g_accretion.tif)
+_TIF_RE = re.compile(
+    r"^(?P<site>.+?)_(?P<model>reg|glo)_(?P<rcp>rcp\d+)_(?P<year>\d{4})_(?P<gen>\d+g)(?P<acc>_accretion)?\.tiff?$",
+    re.IGNORECASE,
+)
+_YEAR_RE = re.compile(r"(?<!\d)(\d{4})(?!\d)")  # año suelto para nombres fuera de convención
+_SCEN_RE = re.compile(r"^(?P<model>regional|global)_(?P<rcp>rcp\d+)$", re.IGNORECASE)  # carpeta de escenario
+
+
+@dataclass(frozen=True)
+class ScenarioRasters:
+    """Ficheros de un (área, escenario, año)."""
+    class_tif: str  # ráster de clases (0..3)
+    accretion_tif: Optional[str]  # ráster de acreción emparejado
+    habitats_nc: Optional[str]  # NetCDF de origen (hábitats)
+    accretion_nc: Optional[str]  # NetCDF de origen (acreción)
+    generation: Optional[str]  # p. ej. "25g"
+
+
+def _netcdf_sources(area_dir: str, scenario: str, generation: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """NetCDF de origen de un escenario: netcdf/<regional|global>_<site>_<rcp>_<gen>_<habitats|accretion>.nc."""
+    m = _SCEN_RE.match(scenario)
+    nc_dir = os.path.join(area_dir, "netcdf")
+    if not (m and generation and os.path.isdir(nc_dir)):
+        return None, None
+    model, rcp = m.group("model").lower(), m.group("rcp").lower()
+    hab = acc = None
+    for name in sorted(os.listdir(nc_dir)):
+        low = name.lower()
+        if not (low.startswith(f"{model}_") and f"_{rcp}_{generation.lower()}_" in low):
+            continue
+        if low.endswith("_habitats.nc"):
+            hab = os.path.join(nc_dir, name)
+        elif low.endswith("_accretion.nc"):
+            acc = os.path.join(nc_dir, name)
+    return hab, acc
+
+
+def _scan_scenario(area_dir: str, scenario: str) -> Dict[int, ScenarioRasters]:
+    scen_dir = os.path.join(area_dir, scenario)
+    classes: Dict[int, Tuple[str, Optional[str]]] = {}  # año -> (tif, generación)
+    accretion: Dict[str, str] = {}  # stem del tif de clases -> tif de acreción
+    for name in sorted(os.listdir(scen_dir)):
+        if not name.lower().endswith((".tif", ".tiff")):
+            continue
+        path = os.path.join(scen_dir, name)
+        stem, ext = os.path.splitext(name)
+        if "accretion" in name.lower():
+            accretion[stem.lower().split("_accretion")[0]] = path
+            continue
+        m = _TIF_RE.match(name)
+        if m:
+            year, gen = int(m.group("year")), m.group("gen").lower()
+        else:
+            y = _YEAR_RE.search(stem)
+            if not y:
+                continue
+            year, gen = int(y.group(1)), None
+        classes.setdefault(year, (path, gen))  # orden alfabético: el primero gana
+
+    out = {}
+    for year, (path, gen) in sorted(classes.items()):
+        stem = os.path.splitext(os.path.basename(path))[0].lower()
+        acc = accretion.get(stem) or next((p for s, p in sorted(accretion.items()) if s.startswith(stem)), None)
+        hab_nc, acc_nc = _netcdf_sources(area_dir, scenario, gen)
+        out[year] = ScenarioRasters(path, acc, hab_nc, acc_nc, gen)
+    return out
+
+
+class SaltmarshCatalog:
+    """
+    Índice en memoria de results/saltmarshes.
+
+    Se construye una vez y se vuelve a escanear solo cuando aparece, desaparece
+    o cambia el mtime de alguna carpeta de área, escenario o netcdf, comprobado
+    como mucho cada CHECK_INTERVAL_S segundos. El mtime de la raíz no cuenta:
+    lo mueven los JSON derivados (estadísticas, manifiesto) que se guardan ahí. Añadir un escenario o un año no requiere tocar
+    código.
+    """
+
+    def __init__(self, root: str = SALTMARSH_ROOT):
+        self.root = root
+        self._lock = threading.Lock()
+        self._index: Dict[str, Dict[str, Dict[int, ScenarioRasters]]] = {}
+        self._signature = None
+        self._checked_at = 0.0
+
+    def _abs_root(self) -> str:
+        return os.path.join(os.getcwd(), self.root)
+
+    def _dir_signature(self):
+        root = self._abs_root()
+        sig = []
+        try:
+            for area in os.scandir(root):
+                if not area.is_dir():
+                    continue
+                sig.append((area.path, area.stat().st_mtime_ns))
+                for sub in os.scandir(area.path):
+                    if sub.is_dir() and (sub.name not in SKIP_DIRS or sub.name == "netcdf"):
+                        sig.append((sub.path, sub.stat().st_mtime_ns))
+        except OSError:
+            return None
+        return tuple(sorted(sig))
+
+    def _scan(self):
+        root = self._abs_root()
+        index: Dict[str, Dict[str, Dict[int, ScenarioRasters]]] = {}
+        if not os.path.isdir(root):
+            return index
+        for area in sorted(os.listdir(root)):
+            area_dir = os.path.join(root, area)
+            if not os.path.isdir(area_dir):
+                continue
+            scenarios = {}
+            for scenario in sorted(os.listdir(area_dir)):
+                if scenario in SKIP_DIRS or not os.path.isdir(os.path.join(area_dir, scenario)):
+                    continue
+                years = _scan_scenario(area_dir, scenario)
+                if years:
+                    scenarios[scenario] = years
+            if scenarios:
+                index[area] = scenarios
+        return index
+
+    def index(self) -> Dict[str, Dict[str, Dict[int, ScenarioRasters]]]:
+        now = time.monotonic()
+        with self._lock:
+            if self._signature is not None and now - self._checked_at < CHECK_INTERVAL_S:
+                return self._index
+            self._checked_at = now
+            sig = self._dir_signature()
+            if sig != self._signature:
+                self._index = self._scan()
+                self._signature = sig
+            return self._index
+
+    # ---------- consultas ----------
+    def areas(self) -> List[str]:
+        return list(self.index())
+
+    def scenarios(self, area: str) -> List[str]:
+        return list(self.index().get(area, {}))
+
+    def years(self, area: str, scenario: Optional[str] = None) -> List[int]:
+        node = self.index().get(area, {})
+        if scenario is not None:
+            return sorted(node.get(scenario, {}))
+        return sorted({y for years in node.values() for y in years})
+
+    def get(self, area: str, scenario: str, year) -> Optional[ScenarioRasters]:
+        try:
+            year = int(year)
+        except (TypeError, ValueError):
+            return None
+        return self.index().get(area, {}).get(scenario, {}).get(year)
+
+    def rasters(self):
+        """(area, scenario, year, ScenarioRasters) para todo el catálogo."""
+        for area, scenarios in self.index().items():
+            for scenario, years in scenarios.items():
+                for year, entry in years.items():
+                    yield area, scenario, year, entry
+
+
+CATALOG = SaltmarshCatalog()  # instancia compartida
+
+
+def class_tif(area: str, scenario: str, year) -> Optional[str]:
+    """Ráster de clases de (área, escenario, año) o None."""
+    entry = CATALOG.get(area, scenario, year)
+    return entry.class_tif if entry else None
+
+
+def accretion_tif(area: str, scenario: str, year) -> Optional[str]:
+    """Ráster de acreción de (área, escenario, año) o None."""
+    entry = CATALOG.get(area, scenario, year)
+    return entry.accretion_tif if entry else None
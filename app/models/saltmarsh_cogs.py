@@ -0,0 +1,162 @@
+# app/models/saltmarsh_cogs.py  # build offline: COGs en EPSG:4326 con overviews para las salidas de saltmarsh
+#
+# Uso:
+#   python -m app.models.saltmarsh_cogs            # construir solo lo que falte o haya cambiado
+#   python -m app.models.saltmarsh_cogs --force    # reconstruir todo
+
+import os  # rutas/entorno
+import json  # manifiesto
+import argparse  # argumentos CLI
+import threading  # recarga segura del manifiesto
+from typing import Dict, Optional  # tipado
+
+import rasterio  # ráster
+from rasterio.vrt import WarpedVRT  # reproyección
+from rasterio.enums import Resampling  # remuestreo
+from rasterio.shutil import copy as rio_copy  # escribir COG desde el VRT
+
+from app.models.saltmarsh_catalog import CATALOG, SALTMARSH_ROOT, SaltmarshCatalog  # catálogo de escenarios
+from app.models.saltmarsh_model_layers import model_layers  # salidas del modelo entrenado
+
+COG_ROOT = os.path.join("results", "saltmarshes_cog")  # artefactos derivados
+MANIFEST_NAME = "manifest.json"  # origen -> COG
+
+COG_CRS = "EPSG:4326"
+
+
+def _rel(path: str) -> str:
+    return os.path.relpath(path, os.getcwd()).replace(os.sep, "/")  # clave portable (sin backslashes)
+
+
+def _version(path: str) -> Dict[str, int]:
+    st = os.stat(path)
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+def raster_kind(path: str) -> str:
+    """'accretion' para *_accretion.tif, 'continuous' para probabilidades/certeza del modelo, 'class' para el resto."""
+    name = os.path.basename(path).lower()
+    if "accretion" in name:
+        return "accretion"
+    if name.startswith(("probability_", "certainty")):
+        return "continuous"
+    return "class"
+
+
+def scenario_rasters(root: str = SALTMARSH_ROOT):
+    """Todos los TIFF de clases y acreción del catálogo de escenarios y las salidas del modelo entrenado."""
+    catalog = CATALOG if os.path.normpath(root) == os.path.normpath(CATALOG.root) else SaltmarshCatalog(root)
+    paths = set()
+    for _, _, _, entry in catalog.rasters():
+        paths.add(entry.class_tif)
+        if entry.accretion_tif:
+            paths.add(entry.accretion_tif)
+    for area in catalog.areas():
+        paths.update(model_layers(area, root).values())  # probabilidades, certeza y respuestas
+    return sorted(paths)
+
+
+def build_cog(src_path: str, dst_path: str, kind: str):
+    """Reproyectar `src_path` a EPSG:4326 y escribirlo como COG teselado, comprimido y con overviews."""
+    if kind == "class":
+        warp_resampling, ov_resampling, predictor = Resampling.nearest, "MODE", "NO"  # clases: sin mezclar valores
+    else:
+        warp_resampling, ov_resampling, predictor = Resampling.bilinear, "AVERAGE", "YES"  # continuo
+
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    tmp = dst_path + ".tmp"
+    with rasterio.open(src_path) as src, WarpedVRT(
+        src, crs=COG_CRS, resampling=warp_resampling,
+        add_alpha=src.nodata is None,  # sin nodata -> banda alfa para no rellenar el borde con clase 0
+    ) as vrt:
+        rio_copy(
+            vrt, tmp, driver="COG",
+            BLOCKSIZE=512,
+            COMPRESS="DEFLATE",
+            PREDICTOR=predictor,
+            OVERVIEWS="AUTO",
+            OVERVIEW_RESAMPLING=ov_resampling,
+            BIGTIFF="IF_SAFER",
+        )
+    os.replace(tmp, dst_path)  # no dejar COGs a medias
+
+
+def build_all(root: str = SALTMARSH_ROOT, out_root: str = COG_ROOT, force: bool = False) -> Dict[str, dict]:
+    """Construir los COGs que falten o estén desfasados y reescribir el manifiesto."""
+    manifest = load_manifest(out_root)
+    entries = {}
+    for src_path in scenario_rasters(root):
+        key = _rel(src_path)
+        rel_to_root = os.path.relpath(src_path, os.path.join(os.getcwd(), root))  # <area>/<scenario>/<file>
+        dst_path = os.path.join(os.getcwd(), out_root, os.path.splitext(rel_to_root)[0] + ".tif")
+        kind = raster_kind(src_path)
+        version = _version(src_path)
+        prev = manifest.get(key)
+        up_to_date = (prev and prev.get("source") == version and os.path.exists(os.path.join(os.getcwd(), prev["cog"])))
+        if force or not up_to_date:
+            print(f"[cog] {key} -> {_rel(dst_path)}")
+            build_cog(src_path, dst_path, kind)
+        entries[key] = {"cog": _rel(dst_path), "kind": kind, "crs": COG_CRS, "source": version}
+
+    manifest_path = os.path.join(os.getcwd(), out_root, MANIFEST_NAME)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(entries, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return entries
+
+
+# ---------------------------------------------------------------------------
+# Lado servidor: preferir el COG cuando existe y está al día
+# ---------------------------------------------------------------------------
+
+_manifest_lock = threading.Lock()
+_manifest_cache = {"mtime_ns": None, "entries": {}}
+
+
+def load_manifest(out_root: str = COG_ROOT) -> Dict[str, dict]:
+    """Manifiesto en memoria; se relee solo si el fichero cambió."""
+    path = os.path.join(os.getcwd(), out_root, MANIFEST_NAME)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    with _manifest_lock:
+        if _manifest_cache["mtime_ns"] != mtime_ns:
+            with open(path, encoding="utf-8") as f:
+                _manifest_cache["entries"] = json.load(f)
+            _manifest_cache["mtime_ns"] = mtime_ns
+        return _manifest_cache["entries"]
+
+
+def cog_for(src_path: str) -> Optional[str]:
+    """Ruta del COG 4326 de `src_path` si existe y se construyó desde la versión actual."""
+    entry = load_manifest().get(_rel(src_path))
+    if not entry:
+        return None
+    try:
+        if entry.get("source") != _version(src_path):  # fuente modificada tras el build
+            return None
+    except OSError:
+        return None
+    cog = os.path.join(os.getcwd(), entry["cog"])
+    return cog if os.path.exists(cog) else None
+
+
+def serving_path(src_path: str) -> str:
+    """Ráster a usar para pintar: el COG 4326 si está disponible, si no el original."""
+    return cog_for(src_path) or src_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construir COGs EPSG:4326 de las salidas de saltmarsh.")
+    parser.add_argument("--root", default=SALTMARSH_ROOT, help="carpeta de salidas del modelo")
+    parser.add_argument("--out", default=COG_ROOT, help="carpeta de COGs y manifiesto")
+    parser.add_argument("--force", action="store_true", help="reconstruir aunque estén al día")
+    args = parser.parse_args()
+    entries = build_all(args.root, args.out, force=args.force)
+    print(f"[cog] {len(entries)} rasters in {os.path.join(args.out, MANIFEST_NAME)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# app/models/saltmarsh_export.py  # ZIP de resultados de saltmarsh generado en streaming (TIFF + gráficas PNG)
+
+import io  # sumidero del ZIP
+import os  # rutas/entorno
+import threading  # pool perezoso
+import time  # fechas de las entradas
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor  # gráficas en paralelo
+from typing import Iterator, List, Optional, Sequence, Tuple  # tipado
+from zipfile import ZIP_STORED, ZipFile, ZipInfo  # ZIP
+
+from app.models.raster_render import SALTMARSH_CLASS_COLORS  # colores por clase
+from app.models.saltmarsh_catalog import CATALOG  # catálogo de escenarios
+from app.models.saltmarsh_stats import raster_stats  # estadísticas por clase precalculadas
+from app.models.saltmarsh_transitions import CLASS_NAMES  # nombres de clase
+
+EXPORT_WORKERS = int(os.getenv("SALTMARSH_EXPORT_WORKERS", "2"))  # procesos para las gráficas (1 = un hilo)
+EXPORT_CHUNK_BYTES = int(os.getenv("SALTMARSH_EXPORT_CHUNK_BYTES", str(1 << 20)))  # trozo de TIFF por escritura
+
+_pool_lock = threading.Lock()
+_pool = None
+_stats_pool = None
+
+
+def _chart_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=EXPORT_WORKERS) if EXPORT_WORKERS > 1 \
+                else ThreadPoolExecutor(max_workers=1, thread_name_prefix="saltmarsh-export")
+        return _pool
+
+
+def _scenario_pool() -> ThreadPoolExecutor:
+    """Hilos que calculan estadísticas (en este proceso, para que queden en el almacén) y encargan las gráficas."""
+    global _stats_pool
+    with _pool_lock:
+        if _stats_pool is None:
+            _stats_pool = ThreadPoolExecutor(max_workers=max(EXPORT_WORKERS, 1), thread_name_prefix="saltmarsh-export-stats")
+        return _stats_pool
+
+
+def bar_chart_png(title: str, labels: Sequence[str], values: Sequence[float], colors: Sequence[str], y_label: str) -> bytes:
+    """PNG de barras por clase con el valor anotado (Figure sin pyplot: sin estado global, vale en hilos y procesos)."""
+    from matplotlib.figure import Figure  # dependencia pesada: solo al exportar
+
+    fig = Figure(figsize=(8, 4.5), dpi=150)
+    ax = fig.subplots()
+    bars = ax.bar(labels, values, color=colors)
+    ax.set_title(title)
+    ax.set_xlabel("Habitat")
+    ax.set_ylabel(y_label)
+    ax.grid(True, alpha=0.3)
+    ymax = max(values) if values else 0
+    ax.set_ylim(0, ymax * 1.15 if ymax else 1)  # margen superior
+    for b, v in zip(bars, values):  # anotar valores
+        ax.text(b.get_x() + b.get_width() / 2, b.get_height(), f"{v:.2f}",
+                ha="center", va="bottom", fontweight="bold", fontsize=12)
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def _scenario_charts(area: str, scenario: str, year, cancelled: threading.Event) -> List[Tuple[str, bytes]]:
+    """
+    Estadísticas (lentas en frío) y PNG de un escenario; se ejecuta fuera del
+    generador para no retrasar el primer byte. Si la descarga se abandona
+    (`cancelled`) no se encargan las gráficas.
+    """
+    jobs = _chart_jobs(area, scenario, year)
+    if cancelled.is_set():
+        return []
+    pool = _chart_pool()
+    futures = [(arcname, pool.submit(bar_chart_png, *args)) for arcname, args in jobs]
+    out = []
+    for arcname, fut in futures:
+        try:
+            out.append((arcname, fut.result()))
+        except Exception:
+            continue  # gráfica fallida: el resto del ZIP sigue siendo válido
+    return out
+
+
+def _chart_jobs(area: str, scenario: str, year) -> List[Tuple[str, tuple]]:
+    """(nombre en el ZIP, argumentos de bar_chart_png) de las gráficas de un escenario, desde el almacén de estadísticas."""
+    entry = CATALOG.get(area, scenario, year)
+    if not entry:
+        return []
+    st = raster_stats(entry.class_tif, entry.accretion_tif)
+    present = [c for c in range(len(CLASS_NAMES)) if st["counts"][c] > 0]  # solo clases presentes
+    jobs = [(
+        f"{scenario}/habitat_areas_{area}_{scenario}_{year}.png",
+        (f"Habitat Areas — {area} / {scenario} / {year}", [CLASS_NAMES[c] for c in present],
+         [st["hectares"][c] for c in present], [SALTMARSH_CLASS_COLORS[c] for c in present], "Area (ha)"),
+    )]
+    vols = st["accretion_m3"] or []
+    with_acc = [c for c in range(len(vols)) if abs(vols[c]) > 1e-9]  # ignorar cero exacto
+    if with_acc and not st.get("accretion_error"):
+        jobs.append((
+            f"{scenario}/accumulated_accretion_{area}_{scenario}_{year}.png",
+            (f"Accumulated Accretion — {area} / {scenario} / {year}", [CLASS_NAMES[c] for c in with_acc],
+             [vols[c] for c in with_acc], [SALTMARSH_CLASS_COLORS[c] for c in with_acc], "Accretion volume (m³/year)"),
+        ))
+    return jobs
+
+
+class _Sink(io.RawIOBase):
+    """Destino no posicionable del ZIP: acumula lo escrito hasta que el generador lo entrega."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _entry(arcname: str, path: Optional[str] = None) -> ZipInfo:
+    mtime = os.path.getmtime(path) if path else time.time()
+    info = ZipInfo(arcname, date_time=time.localtime(mtime)[:6])
+    info.compress_type = ZIP_STORED  # TIFF comprimidos y PNG: deflate no gana nada
+    return info
+
+
+def stream_results_zip(area: str, year, scenarios: Sequence[str]) -> Iterator[bytes]:
+    """
+    ZIP de los resultados de (área, año) en trozos, para una respuesta en streaming.
+
+    Las estadísticas y gráficas de cada escenario se encargan a hilos (que a
+    su vez usan el pool de procesos de gráficas) antes de empezar; mientras
+    se calculan se envían los TIFF de clases y acreción (ZIP_STORED, en
+    trozos de EXPORT_CHUNK_BYTES) y después los PNG. Cada trozo sale nada
+    más escribirse, así que la memoria no depende del tamaño del ZIP y el
+    primer byte no espera a las estadísticas aunque la caché esté fría.
+    """
+    cancelled = threading.Event()
+    charts: List[Future] = []
+    files: List[Tuple[str, str]] = []
+    for scen in scenarios:
+        entry = CATALOG.get(area, scen, year)
+        if not entry:
+            continue
+        charts.append(_scenario_pool().submit(_scenario_charts, area, scen, year, cancelled))
+        files.append((f"{scen}/{os.path.basename(entry.class_tif)}", entry.class_tif))
+        if entry.accretion_tif and os.path.exists(entry.accretion_tif):
+            files.append((f"{scen}/{os.path.basename(entry.accretion_tif)}", entry.accretion_tif))
+
+    try:
+        sink = _Sink()
+        with ZipFile(sink, "w") as zf:
+            for arcname, path in files:
+                with open(path, "rb") as src, zf.open(_entry(arcname, path), "w", force_zip64=True) as dst:
+                    while True:
+                        chunk = src.read(EXPORT_CHUNK_BYTES)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                        yield sink.drain()
+                yield sink.drain()  # cabecera de la entrada / descriptor de datos
+            for fut in charts:
+                try:
+                    pngs = fut.result()
+                except Exception:
+                    continue  # estadísticas fallidas: el resto del ZIP sigue siendo válido
+                for arcname, png in pngs:
+                    zf.writestr(_entry(arcname), png)
+                    yield sink.drain()
+        yield sink.drain()  # directorio central
+    finally:  # cliente desconectado (GeneratorExit) o error: no seguir calculando para nadie
+        cancelled.set()
+        for fut in charts:
+            fut.cancel()
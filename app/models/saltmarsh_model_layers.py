@@ -0,0 +1,119 @@
+# app/models/saltmarsh_model_layers.py  # salidas del XGBoost entrenado (probabilidades, certeza, respuestas) como capas
+
+import os  # rutas/entorno
+import threading  # caché concurrente
+from typing import Dict, Optional, Tuple  # tipado
+
+import numpy as np  # numérico
+from rasterio.enums import Resampling  # remuestreo
+
+from app.models.raster_render import (  # PNG indexados
+    PROBABILITY_CMAP, CERTAINTY_CMAP, SALTMARSH_PALETTE, class_png, continuous_png, empty_png,
+)
+from app.models.raster_handles import POOL  # datasets ya abiertos
+from app.models.render_cache import source_version  # versión de las fuentes
+from app.models.saltmarsh_catalog import SALTMARSH_ROOT  # carpeta de salidas del modelo
+from app.models.saltmarsh_tiles import TILE_SIZE, read_tile, tile_intersects  # teselas XYZ
+
+# capa -> (etiqueta, tipo); los ficheros se llaman <capa>.tif
+MODEL_LAYERS: Dict[str, Tuple[str, str]] = {
+    "probability_0": ("Probability: Mudflat", "probability"),
+    "probability_1": ("Probability: Saltmarsh", "probability"),
+    "probability_2": ("Probability: Upland Areas", "probability"),
+    "probability_3": ("Probability: Channel", "probability"),
+    "certainty": ("Model certainty", "certainty"),
+    "responses": ("Predicted class", "class"),
+}
+
+_lock = threading.Lock()
+_ranges: Dict[str, Tuple[str, Tuple[float, float]]] = {}  # ruta -> (versión, (vmin, vmax))
+
+
+def model_dir(area: str, root: str = SALTMARSH_ROOT) -> Optional[str]:
+    """Carpeta con las imágenes del modelo: trained_model/**/xgbc_images o, si no hay, trained_model."""
+    base = os.path.join(os.getcwd(), root, area, "trained_model")
+    if not os.path.isdir(base):
+        return None
+    for dirpath, dirnames, _ in sorted(os.walk(base)):
+        if os.path.basename(dirpath) == "xgbc_images":
+            return dirpath
+    return base  # Urdaibai: layout plano
+
+
+def model_layers(area: str, root: str = SALTMARSH_ROOT) -> Dict[str, str]:
+    """Capas del modelo disponibles en `area`: nombre -> ruta del .tif."""
+    d = model_dir(area, root)
+    if not d:
+        return {}
+    out = {}
+    for name in MODEL_LAYERS:
+        path = os.path.join(d, f"{name}.tif")
+        if os.path.exists(path):
+            out[name] = path
+    return out
+
+
+def value_range(path: str) -> Tuple[float, float]:
+    """
+    Rango de color de un ráster continuo: [0, 1] si los valores son fracciones,
+    [0, 100] si son porcentajes y el mínimo/máximo en otro caso. Se estima con
+    estadísticas aproximadas (overviews) y se cachea por versión del fichero.
+    """
+    version = source_version(path)
+    with _lock:
+        hit = _ranges.get(path)
+        if hit and hit[0] == version:
+            return hit[1]
+    with POOL.dataset(path) as src:
+        st = src.stats(indexes=[1], approx=True)[0]
+    lo, hi = float(st.min), float(st.max)
+    if lo >= 0 and hi <= 1:
+        rng = (0.0, 1.0)
+    elif lo >= 0 and hi <= 100:
+        rng = (0.0, 100.0)
+    else:
+        rng = (lo, hi)
+    with _lock:
+        _ranges[path] = (version, rng)
+    return rng
+
+
+def certainty_cutoff(cert_path: str, fraction: float) -> float:
+    """Umbral absoluto de certeza para una fracción 0..1 de su rango."""
+    lo, hi = value_range(cert_path)
+    return lo + float(fraction) * (hi - lo)
+
+
+def tile_style(layer: str, z: int, x: int, y: int, min_certainty: float = 0.0, cert_path: Optional[str] = None) -> str:
+    """Estilo de caché de una tesela de capa del modelo (paleta + umbral + versión de la certeza)."""
+    kind = MODEL_LAYERS[layer][1]
+    sig = {"probability": PROBABILITY_CMAP, "certainty": CERTAINTY_CMAP}.get(kind, SALTMARSH_PALETTE).signature
+    mask = f"{min_certainty:.2f}:{source_version(cert_path)}" if (min_certainty > 0 and cert_path) else "0"
+    return f"model-tile:{layer}:{sig}:{mask}:{z}/{x}/{y}"
+
+
+def render_model_tile(path: str, layer: str, z: int, x: int, y: int, cert_path: Optional[str] = None,
+                      min_certainty: float = 0.0, tile_size: int = TILE_SIZE) -> bytes:
+    """
+    Tesela z/x/y de una capa del modelo.
+
+    Las probabilidades y la certeza se remuestrean en bilineal y se pintan con
+    una LUT continua; las respuestas, como clases. Con `min_certainty` > 0 se
+    lee también la ventana de la certeza sobre la misma malla y se vuelven
+    transparentes los píxeles por debajo del umbral (fracción 0..1 del rango).
+    """
+    kind = MODEL_LAYERS[layer][1]
+    resampling = Resampling.nearest if kind == "class" else Resampling.bilinear
+    with POOL.dataset(path) as src:
+        if not tile_intersects(src, z, x, y):  # tesela fuera de la extensión
+            return empty_png(tile_size, tile_size)
+        data = read_tile(src, z, x, y, tile_size, resampling)  # lectura por ventana (usa overviews si es COG)
+    if min_certainty > 0 and cert_path:
+        with POOL.dataset(cert_path) as cert_src:
+            cert = read_tile(cert_src, z, x, y, tile_size, Resampling.bilinear)
+        low = np.ma.filled(cert < certainty_cutoff(cert_path, min_certainty), True)  # sin certeza -> fuera
+        data = np.ma.masked_where(low, data)
+    if kind == "class":
+        return class_png(data)
+    cmap = PROBABILITY_CMAP if kind == "probability" else CERTAINTY_CMAP
+    return continuous_png(data, cmap, *value_range(path))
@@ -0,0 +1,242 @@
+# app/models/saltmarsh_netcdf.py  # acceso perezoso (xarray + dask) a los NetCDF completos del modelo de saltmarsh
+#
+# Los NetCDF de results/saltmarshes/<area>/netcdf/ guardan todas las generaciones (12g/25g/50g) y todos
+# los pasos de tiempo; los TIFF de los escenarios son solo unos cortes exportados. Este módulo abre los
+# cubos por chunks, sin cargarlos enteros, y expone cualquier (generación, paso) a las estadísticas y a
+# las teselas.
+
+import os  # rutas/entorno
+import re  # parsear nombres de fichero
+import threading  # caché concurrente
+from collections import OrderedDict  # LRU
+from typing import List, Optional, Tuple  # tipado
+
+import numpy as np  # numérico
+from rasterio.crs import CRS  # sistema de referencia
+from rasterio.transform import from_bounds, from_origin, rowcol  # mallas regulares
+from rasterio.warp import reproject, transform_bounds  # teselas
+from rasterio.enums import Resampling  # remuestreo
+
+from app.models.raster_render import class_png, empty_png  # PNG indexados
+from app.models.raster_handles import POOL  # datasets ya abiertos
+from app.models.render_cache import source_version  # versión de las fuentes
+from app.models.saltmarsh_catalog import CATALOG, SALTMARSH_ROOT  # catálogo de escenarios
+from app.models.saltmarsh_tiles import TILE_SIZE, tile_bounds_3857  # aritmética de teselas
+
+N_CLASSES = 4  # clases 0..3
+NETCDF_CHUNK_PX = int(os.getenv("NETCDF_CHUNK_PX", "1024"))  # lado de chunk espacial
+NETCDF_WORKERS = int(os.getenv("NETCDF_WORKERS", str(os.cpu_count() or 1)))  # hilos de dask para reducir chunks
+NETCDF_MAX_OPEN = int(os.getenv("NETCDF_MAX_OPEN", "32"))  # datasets abiertos a la vez (cada uno mantiene un handle HDF5)
+
+# <regional|global>_<site>_<rcpXX>_<N>g_<habitats|accretion>.nc
+_NC_RE = re.compile(
+    r"^(?P<model>regional|global)_(?P<site>.+?)_(?P<rcp>rcp\d+)_(?P<gen>\d+g)_(?P<kind>habitats|accretion)\.nc$",
+    re.IGNORECASE,
+)
+_Y_DIMS = ("y", "lat", "latitude", "northing", "row", "rows")
+_X_DIMS = ("x", "lon", "longitude", "easting", "col", "cols")
+
+_lock = threading.Lock()
+_datasets: "OrderedDict[str, Tuple[str, object]]" = OrderedDict()  # ruta -> (versión, xr.Dataset perezoso), LRU
+_stats: "OrderedDict[tuple, dict]" = OrderedDict()  # (versiones, paso) -> estadísticas
+_STATS_CACHE_SIZE = 256
+
+
+def netcdf_sources(area: str) -> List[dict]:
+    """NetCDF de un área: escenario, generación, tipo (habitats/accretion) y ruta."""
+    nc_dir = os.path.join(os.getcwd(), SALTMARSH_ROOT, area, "netcdf")
+    if not os.path.isdir(nc_dir):
+        return []
+    out = []
+    for name in sorted(os.listdir(nc_dir)):
+        m = _NC_RE.match(name)
+        if m:
+            out.append({
+                "scenario": f"{m.group('model').lower()}_{m.group('rcp').lower()}",
+                "generation": m.group("gen").lower(),
+                "kind": m.group("kind").lower(),
+                "path": os.path.join(nc_dir, name),
+            })
+    return out
+
+
+def netcdf_path(area: str, scenario: str, generation: str, kind: str = "habitats") -> Optional[str]:
+    """Ruta del NetCDF de (área, escenario, generación, tipo) o None."""
+    for src in netcdf_sources(area):
+        if (src["scenario"], src["generation"], src["kind"]) == (scenario, generation.lower(), kind):
+            return src["path"]
+    return None
+
+
+def open_dataset(path: str):
+    """
+    xr.Dataset perezoso (dask) de `path`; se reabre solo si cambia el fichero.
+    Como mucho NETCDF_MAX_OPEN abiertos: el menos usado se cierra al expulsarlo.
+    """
+    import xarray as xr  # dependencia pesada: solo al usar NetCDF
+
+    version = source_version(path)
+    with _lock:
+        hit = _datasets.get(path)
+        if hit and hit[0] == version:
+            _datasets.move_to_end(path)
+            return hit[1]
+    ds = xr.open_dataset(path, chunks={}, mask_and_scale=True)  # chunks nativos; se re-trocean por variable
+    closing = []
+    with _lock:
+        old = _datasets.pop(path, None)
+        if old:
+            closing.append(old[1])
+        _datasets[path] = (version, ds)
+        while len(_datasets) > max(NETCDF_MAX_OPEN, 1):
+            closing.append(_datasets.popitem(last=False)[1][1])
+    for stale in closing:
+        stale.close()  # liberar el handle HDF5
+    return ds
+
+
+def _dims(da) -> Tuple[Optional[str], str, str]:
+    y = next((d for d in da.dims if d.lower() in _Y_DIMS), da.dims[-2])
+    x = next((d for d in da.dims if d.lower() in _X_DIMS), da.dims[-1])
+    rest = [d for d in da.dims if d not in (y, x)]
+    return (rest[0] if rest else None), y, x
+
+
+def cube(path: str):
+    """Variable principal de `path` como DataArray perezoso con dims (time, y, x) y chunks espaciales acotados."""
+    ds = open_dataset(path)
+    var = next(v for v in ds.data_vars if ds[v].ndim >= 2)  # ignorar variables escalares (crs, spatial_ref...)
+    da = ds[var]
+    t, y, x = _dims(da)
+    if t is None:
+        da = da.expand_dims("time")
+        t = "time"
+    extra = [d for d in da.dims if d not in (t, y, x)]
+    if extra:
+        da = da.isel({d: 0 for d in extra})  # p. ej. banda única
+    da = da.transpose(t, y, x)
+    return da.chunk({t: 1, y: NETCDF_CHUNK_PX, x: NETCDF_CHUNK_PX})
+
+
+def time_steps(path: str) -> List:
+    """Etiquetas de los pasos de tiempo de `path` (años si la coordenada es numérica o fecha)."""
+    da = cube(path)
+    t = da.dims[0]
+    if t not in da.coords:
+        return list(range(da.sizes[t]))
+    values = da[t].values
+    if np.issubdtype(values.dtype, np.datetime64):
+        return [int(str(v)[:4]) for v in values]
+    return [v.item() if hasattr(v, "item") else v for v in values]
+
+
+def grid(path: str, area: Optional[str] = None) -> Tuple[CRS, object]:
+    """CRS y transform de la malla de `path` (el CRS sale del NetCDF o de un TIFF hermano del área)."""
+    da = cube(path)
+    _, y, x = da.dims
+    xs, ys = da[x].values, da[y].values
+    dx, dy = float(xs[1] - xs[0]), float(ys[1] - ys[0])
+    west = float(xs[0]) - dx / 2
+    if dy < 0:  # filas de norte a sur
+        transform = from_origin(west, float(ys[0]) - dy / 2, dx, -dy)
+    else:  # filas de sur a norte: se voltean al leer
+        transform = from_origin(west, float(ys[-1]) + dy / 2, dx, dy)
+    crs = None
+    ds = open_dataset(path)
+    gm = da.attrs.get("grid_mapping")
+    for attrs in ([ds[gm].attrs] if gm in ds else []) + [ds.attrs]:
+        wkt = attrs.get("crs_wkt") or attrs.get("spatial_ref")
+        if wkt:
+            crs = CRS.from_wkt(wkt)
+            break
+    if crs is None and area:
+        ref = next((e.class_tif for a, _, _, e in CATALOG.rasters() if a == area), None)  # mismas salidas, mismo CRS
+        if ref:
+            with POOL.dataset(ref) as src:
+                crs = src.crs
+    return crs, transform
+
+
+def _north_up(da):
+    y = da.dims[-2]
+    ys = da[y].values
+    return da.isel({y: slice(None, None, -1)}) if len(ys) > 1 and ys[1] > ys[0] else da
+
+
+def step_array(path: str, step: int):
+    """Corte 2-D perezoso (dask) del paso `step`, con filas de norte a sur."""
+    da = cube(path)
+    return _north_up(da.isel({da.dims[0]: step}))
+
+
+def step_stats(hab_path: str, acc_path: Optional[str], step: int) -> dict:
+    """
+    Recuento, hectáreas y acreción (m³) por clase de un paso de tiempo.
+
+    La reducción es un da.bincount sobre los chunks del cubo, repartida en
+    NETCDF_WORKERS hilos: nunca se carga el paso completo en memoria.
+    """
+    import dask  # dependencia pesada: solo al usar NetCDF
+    import dask.array as dsa
+
+    key = (source_version(hab_path), source_version(acc_path) if acc_path else None, step)
+    with _lock:
+        hit = _stats.get(key)
+        if hit is not None:
+            _stats.move_to_end(key)
+            return hit
+
+    _, transform = grid(hab_path)
+    pixel_area_m2 = float(abs(transform.a * transform.e))
+    cls = step_array(hab_path, step).data
+    valid = (cls >= 0) & (cls < N_CLASSES)  # NaN/nodata -> fuera
+    codes = dsa.where(valid, cls, N_CLASSES).astype(np.intp).ravel()  # no válidos -> cubo extra
+    parts = [dsa.bincount(codes, minlength=N_CLASSES + 1)]
+    if acc_path:
+        acc = step_array(acc_path, step).data
+        if acc.shape != cls.shape:
+            raise ValueError("Class raster and accretion raster are not aligned.")
+        weights = dsa.where(dsa.isfinite(acc), acc, 0.0).astype(np.float64).ravel()
+        parts.append(dsa.bincount(codes, weights=weights, minlength=N_CLASSES + 1))
+    results = dask.compute(*parts, scheduler="threads", num_workers=NETCDF_WORKERS)
+    counts = results[0][:N_CLASSES]
+    out = {
+        "pixel_area_m2": pixel_area_m2,
+        "counts": [int(c) for c in counts],
+        "hectares": [float(c * pixel_area_m2 / 10000.0) for c in counts],
+        "accretion_m3": [float(v * pixel_area_m2) for v in results[1][:N_CLASSES]] if acc_path else None,
+    }
+    with _lock:
+        _stats[key] = out
+        while len(_stats) > _STATS_CACHE_SIZE:
+            _stats.popitem(last=False)
+    return out
+
+
+def render_step_tile(path: str, step: int, z: int, x: int, y: int, area: Optional[str] = None,
+                     tile_size: int = TILE_SIZE) -> bytes:
+    """Tesela z/x/y (PNG indexado) del paso `step`; solo se cargan los chunks que cubren la tesela."""
+    crs, transform = grid(path, area)
+    da = step_array(path, step)
+    if crs is None:  # sin crs_wkt/spatial_ref ni TIFF catalogado del área: no se puede situar
+        return empty_png(tile_size, tile_size)
+    height, width = da.shape
+    t_bounds = tile_bounds_3857(z, x, y)
+    left, bottom, right, top = transform_bounds("EPSG:3857", crs, *t_bounds, densify_pts=21)  # tesela en CRS origen
+    r0, c0 = rowcol(transform, left, top)
+    r1, c1 = rowcol(transform, right, bottom)
+    r0, c0 = max(int(r0) - 1, 0), max(int(c0) - 1, 0)  # margen de un píxel para el remuestreo
+    r1, c1 = min(int(r1) + 2, height), min(int(c1) + 2, width)
+    if r0 >= r1 or c0 >= c1:  # tesela fuera de la extensión
+        return empty_png(tile_size, tile_size)
+    window = np.asarray(da[r0:r1, c0:c1].values, dtype=np.float32)  # lectura de la ventana (dask -> numpy)
+    window[~np.isfinite(window)] = -1
+    src_transform = transform * transform.translation(c0, r0)
+    dst = np.full((tile_size, tile_size), -1, dtype=np.float32)
+    reproject(
+        window, dst,
+        src_transform=src_transform, src_crs=crs, src_nodata=-1,
+        dst_transform=from_bounds(*t_bounds, tile_size, tile_size), dst_crs="EPSG:3857", dst_nodata=-1,
+        resampling=Resampling.nearest,  # clases: vecino más próximo
+    )
+    return class_png(np.ma.masked_less(dst, 0).astype(np.int16))
@@ -0,0 +1,256 @@
+# app/models/saltmarsh_predict.py  # re-predicción por bloques con el XGBoost entrenado: clases, probabilidades y certeza
+#
+# Uso:
+#   python -m app.models.saltmarsh_predict Cadiz_Bay
+#   python -m app.models.saltmarsh_predict Cadiz_Bay --shift elevation_related_to_MHW=-0.25 --name mhw_minus_25cm
+
+import os  # rutas/entorno
+import json  # informe
+import time  # rendimiento
+import argparse  # argumentos CLI
+from concurrent.futures import ProcessPoolExecutor  # pool de procesos
+from contextlib import ExitStack  # salidas abiertas a la vez
+from typing import Dict, List, Optional, Tuple  # tipado
+
+import numpy as np  # numérico
+import pandas as pd  # columnas con nombre para sklearn
+import rasterio  # ráster
+from rasterio.windows import Window  # ventanas
+from rasterio.shutil import copy as rio_copy  # GTiff -> COG
+
+from app.models.block_stats import TARGET_BLOCK_PX  # píxeles por franja
+from app.models.predictor_cube import PredictorCube, ensure_cube, row_strips  # predictores alineados en memmap
+from app.models.saltmarsh_catalog import SALTMARSH_ROOT  # carpeta de salidas del modelo
+from app.models.saltmarsh_transitions import N_CLASSES  # clases 0..3
+
+PREDICT_ROOT = os.path.join("results", "saltmarshes_predict")  # mapas re-predichos (artefactos derivados)
+PREDICT_WORKERS = int(os.getenv("PREDICT_WORKERS", str(os.cpu_count() or 1)))  # procesos
+PREDICT_BATCH_PX = int(os.getenv("PREDICT_BATCH_PX", "262144"))  # filas por llamada a predict_proba
+MODEL_NAME = "xgbc_best_model_joblib.joblib"
+NODATA = -9999
+
+# Estado de cada proceso del pool (modelo cargado y cubo mapeado una sola vez)
+_worker: dict = {}
+
+
+def model_path(area: str, root: str = SALTMARSH_ROOT) -> Optional[str]:
+    """Ruta del modelo entrenado (trained_model/**/outputs/xgbc_best_model_joblib.joblib) o None."""
+    base = os.path.join(os.getcwd(), root, area, "trained_model")
+    for dirpath, _, filenames in sorted(os.walk(base)):
+        if MODEL_NAME in filenames:
+            return os.path.join(dirpath, MODEL_NAME)
+    return None
+
+
+def predictor_paths(area: str, root: str = SALTMARSH_ROOT) -> Dict[str, str]:
+    """Predictores del modelo del área: nombre (sin .tif) -> ruta, de trained_model/**/inputs/selected_predictors."""
+    mp = model_path(area, root)
+    if not mp:
+        return {}
+    pred_dir = os.path.join(os.path.dirname(os.path.dirname(mp)), "inputs", "selected_predictors")
+    if not os.path.isdir(pred_dir):
+        return {}
+    return {
+        os.path.splitext(name)[0]: os.path.join(pred_dir, name)
+        for name in sorted(os.listdir(pred_dir)) if name.lower().endswith(".tif")
+    }
+
+
+def feature_order(model, names: List[str]) -> List[str]:
+    """
+    Orden de columnas del entrenamiento si el modelo lo guarda; si no, orden
+    alfabético de los ficheros. ValueError si el modelo espera predictores
+    que no están entre los ficheros (o un número distinto de columnas).
+    """
+    trained = getattr(model, "feature_names_in_", None)
+    if trained is None and hasattr(model, "get_booster"):
+        trained = model.get_booster().feature_names
+    if trained is not None:
+        missing = [n for n in trained if n not in names]
+        if missing:
+            raise ValueError(f"Predictor files missing for model features: {missing} (available: {sorted(names)}).")
+        return list(trained)
+    expected = getattr(model, "n_features_in_", None)
+    if expected is not None and expected != len(names):
+        raise ValueError(f"Model expects {expected} predictors but {len(names)} predictor files were found.")
+    return sorted(names)
+
+
+def _load_model(path: str, n_jobs: Optional[int] = None):
+    import joblib  # dependencia pesada: solo al predecir
+
+    model = joblib.load(path)
+    if n_jobs and hasattr(model, "set_params"):
+        model.set_params(n_jobs=n_jobs)  # un hilo por proceso: el paralelismo lo pone el pool
+    return model
+
+
+def cube_dir(area: str) -> str:
+    """Carpeta del cubo de predictores alineados de `area`."""
+    return os.path.join(PREDICT_ROOT, area, "predictor_cube")
+
+
+def _init_worker(model_file: str, cube_path: str, offsets: List[float], n_jobs: Optional[int]):
+    model = _load_model(model_file, n_jobs)
+    cube = PredictorCube(cube_path)
+    labels = np.asarray(model.classes_)
+    bands = labels if np.isin(labels, np.arange(N_CLASSES)).all() else np.arange(labels.size)  # banda de cada columna
+    named = getattr(model, "feature_names_in_", None) is not None  # sklearn comprueba nombres: pasarle DataFrame
+    _worker.update(model=model, cube=cube, offsets=np.asarray(offsets, dtype=np.float32),
+                   labels=labels, bands=bands, columns=cube.names if named else None)
+
+
+def _predict_strip(strip: Tuple[int, int]) -> Tuple[Tuple[int, int], np.ndarray, np.ndarray]:
+    """Clases (int16) y probabilidades (N_CLASSES, h, w) de una franja; nodata donde falte algún predictor."""
+    cube, offsets, model = _worker["cube"], _worker["offsets"], _worker["model"]
+    labels, bands, columns = _worker["labels"], _worker["bands"], _worker["columns"]
+    r0, r1 = strip
+    feats = cube.features(r0, r1)  # (píxeles, predictores): un tramo contiguo del memmap
+    n = feats.shape[0]
+    idx = np.flatnonzero(np.isfinite(feats).all(axis=1))  # NaN = nodata en algún predictor
+
+    classes = np.full(n, NODATA, dtype=np.int16)
+    probs = np.full((N_CLASSES, n), NODATA, dtype=np.float32)
+    for start in range(0, idx.size, PREDICT_BATCH_PX):  # lotes acotados de memoria
+        rows = idx[start:start + PREDICT_BATCH_PX]
+        x = feats[rows] + offsets  # predictores perturbados
+        if columns is not None:
+            x = pd.DataFrame(x, columns=columns, copy=False)  # mismos nombres que en el entrenamiento
+        p = model.predict_proba(x).astype(np.float32)
+        probs[bands[:, None], rows] = p.T  # columna j de predict_proba = clase model.classes_[j]
+        classes[rows] = labels[p.argmax(axis=1)]  # etiqueta, no índice de columna
+    h, w = r1 - r0, cube.width
+    return strip, classes.reshape(h, w), probs.reshape(N_CLASSES, h, w)
+
+
+def _to_cog(tmp: str, dst: str, kind: str):
+    rio_copy(
+        tmp, dst, driver="COG",
+        BLOCKSIZE=512,
+        COMPRESS="DEFLATE",
+        PREDICTOR="NO" if kind == "class" else "YES",
+        OVERVIEWS="AUTO",
+        OVERVIEW_RESAMPLING="MODE" if kind == "class" else "AVERAGE",  # clases: sin mezclar valores
+        BIGTIFF="IF_SAFER",
+    )
+    os.remove(tmp)
+
+
+def predict(area: str, out_dir: Optional[str] = None, offsets: Optional[Dict[str, float]] = None,
+            workers: int = PREDICT_WORKERS, target_px: int = TARGET_BLOCK_PX, root: str = SALTMARSH_ROOT,
+            rebuild_cube: bool = False) -> dict:
+    """
+    Re-predecir el mapa de hábitats de `area` con su XGBoost entrenado.
+
+    Los predictores se remuestrean una vez a un cubo memmap alineado
+    (predictor_cube, reconstruido solo si cambian las fuentes) y cada franja
+    de filas se evalúa con predict_proba por lotes en un pool de `workers`
+    procesos; `offsets` suma una constante a los predictores indicados (p. ej.
+    {"elevation_related_to_MHW": -0.25}). Escribe responses.tif,
+    probability_<c>.tif y certainty.tif (probabilidad máxima) como COGs en
+    `out_dir` y devuelve un informe con el rendimiento en píxeles/s.
+    """
+    mp = model_path(area, root)
+    preds = predictor_paths(area, root)
+    if not (mp and preds):
+        raise FileNotFoundError(f"No trained model or predictors for {area}.")
+    offsets = dict(offsets or {})
+    unknown = set(offsets) - set(preds)
+    if unknown:
+        raise ValueError(f"Unknown predictors: {', '.join(sorted(unknown))}")
+    names = feature_order(_load_model(mp), list(preds))
+    cube_path = cube_dir(area)
+    t_cube = time.perf_counter()
+    ensure_cube({n: preds[n] for n in names}, cube_path, force=rebuild_cube)
+    cube_s = time.perf_counter() - t_cube
+    offs = [float(offsets.get(n, 0.0)) for n in names]
+    out_dir = out_dir or os.path.join(PREDICT_ROOT, area, "baseline")
+    os.makedirs(out_dir, exist_ok=True)
+
+    outputs = {"responses": "class", **{f"probability_{c}": "continuous" for c in range(N_CLASSES)},
+               "certainty": "continuous"}
+    t0 = time.perf_counter()
+    with ExitStack() as stack:
+        cube = PredictorCube(cube_path)
+        strips = row_strips(cube.height, cube.width, target_px)
+        profile = {
+            "driver": "GTiff", "width": cube.width, "height": cube.height, "count": 1,
+            "crs": cube.crs, "transform": cube.transform, "nodata": NODATA,
+            "tiled": True, "blockxsize": 512, "blockysize": 512, "compress": "DEFLATE", "BIGTIFF": "IF_SAFER",
+        }
+        dst = {
+            name: stack.enter_context(rasterio.open(
+                os.path.join(out_dir, f"{name}.tif.tmp"), "w",
+                dtype="int16" if kind == "class" else "float32", **profile))
+            for name, kind in outputs.items()
+        }
+        init = (mp, cube_path, offs, 1 if workers > 1 else None)
+        if workers > 1:
+            pool = stack.enter_context(ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init))
+            results = pool.map(_predict_strip, strips)
+        else:
+            _init_worker(*init)
+            results = map(_predict_strip, strips)
+        n_valid = 0
+        for (r0, r1), classes, probs in results:  # en orden de franja; se escribe según llega
+            win = Window(0, r0, cube.width, r1 - r0)
+            dst["responses"].write(classes, 1, window=win)
+            for c in range(N_CLASSES):
+                dst[f"probability_{c}"].write(probs[c], 1, window=win)
+            ok = classes != NODATA
+            dst["certainty"].write(np.where(ok, probs.max(axis=0), NODATA).astype(np.float32), 1, window=win)
+            n_valid += int(ok.sum())
+        total = cube.width * cube.height
+    predict_s = time.perf_counter() - t0
+
+    for name, kind in outputs.items():
+        path = os.path.join(out_dir, f"{name}.tif")
+        _to_cog(path + ".tmp", path, kind)
+    report = {
+        "area": area,
+        "model": os.path.relpath(mp, os.getcwd()).replace(os.sep, "/"),
+        "features": names,
+        "offsets": {n: o for n, o in zip(names, offs) if o},
+        "strips": len(strips),
+        "cube_seconds": round(cube_s, 3),
+        "workers": workers,
+        "pixels": total,
+        "valid_pixels": n_valid,
+        "seconds": round(predict_s, 3),
+        "pixels_per_s": round(total / predict_s, 1) if predict_s else None,
+        "total_seconds": round(time.perf_counter() - t0, 3),
+        "outputs": {name: os.path.join(out_dir, f"{name}.tif") for name in outputs},
+    }
+    with open(os.path.join(out_dir, "report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def _parse_shift(value: str) -> Tuple[str, float]:
+    name, _, off = value.partition("=")
+    try:
+        return name, float(off)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected NAME=OFFSET, got {value!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-predecir los mapas de hábitats con el XGBoost entrenado.")
+    parser.add_argument("area", help="área de estudio (p. ej. Cadiz_Bay)")
+    parser.add_argument("--shift", type=_parse_shift, action="append", default=[],
+                        help="sumar OFFSET al predictor NAME (NAME=OFFSET, repetible)")
+    parser.add_argument("--name", default=None, help="nombre de la ejecución (subcarpeta de salida)")
+    parser.add_argument("--out", default=None, help="carpeta de salida")
+    parser.add_argument("--workers", type=int, default=PREDICT_WORKERS, help="procesos")
+    parser.add_argument("--rebuild-cube", action="store_true", help="reconstruir el cubo de predictores")
+    args = parser.parse_args()
+    offsets = dict(args.shift)
+    run_name = args.name or ("baseline" if not offsets else "_".join(f"{k}{v:+g}" for k, v in sorted(offsets.items())))
+    out_dir = args.out or os.path.join(PREDICT_ROOT, args.area, run_name)
+    report = predict(args.area, out_dir, offsets, workers=args.workers, rebuild_cube=args.rebuild_cube)
+    print(f"[predict] {report['pixels']} px in {report['seconds']} s "
+          f"({report['pixels_per_s']} px/s, {report['workers']} workers) -> {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# app/models/saltmarsh_prewarm.py  # precalentado en segundo plano de teselas, estadísticas y trayectorias de todos los escenarios
+
+import os  # entorno
+import threading  # estado compartido
+from concurrent.futures import ThreadPoolExecutor  # pool acotado
+from typing import Dict, Iterable, List, Tuple  # tipado
+
+import mercantile  # teselas que cubren una extensión
+
+from app.models.render_cache import RENDER_CACHE  # caché de renders en disco
+from app.models.raster_manifest import bounds_4326  # extensión sin leer píxeles
+from app.models.saltmarsh_catalog import CATALOG, class_tif  # catálogo de escenarios
+from app.models.saltmarsh_stats import scenario_stats  # estadísticas por clase
+from app.models.habitat_pyramid import class_tile_job  # misma tesela (pirámide o COG) que sirve run.py
+from app.models.saltmarsh_trajectory import scenario_trajectory  # series multianuales
+
+PREWARM_WORKERS = int(os.getenv("SALTMARSH_PREWARM_WORKERS", "2"))  # hilos compartidos por todas las sesiones
+PREWARM_MAX_TILES = int(os.getenv("SALTMARSH_PREWARM_MAX_TILES", "256"))  # teselas por escenario como mucho
+
+
+def scenario_tiles(area: str, scenario: str, year, zooms: Iterable[int]) -> List[Tuple[int, int, int]]:
+    """Teselas z/x/y que cubren la extensión del escenario en los zooms dados (limitado a PREWARM_MAX_TILES)."""
+    tif = class_tif(area, scenario, year)
+    b = bounds_4326(tif) if tif else None
+    if b is None:
+        return []
+    out = []
+    for z in zooms:
+        for t in mercantile.tiles(b.left, b.bottom, b.right, b.top, z):
+            out.append((t.z, t.x, t.y))
+            if len(out) >= PREWARM_MAX_TILES:
+                return out
+    return out
+
+
+class PrewarmScheduler:
+    """
+    Cola de precalentado por sesión.
+
+    Cada selección (área, año) de una sesión recibe un token nuevo; los
+    trabajos de selecciones anteriores se cancelan si aún no empezaron y, si ya
+    están corriendo, se detienen en la siguiente tesela al ver que su token ya
+    no es el vigente. El pool es compartido, así que el trabajo total está
+    acotado por PREWARM_WORKERS sea cual sea el número de sesiones.
+    """
+
+    def __init__(self, workers: int = PREWARM_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="saltmarsh-prewarm")
+        self._lock = threading.Lock()
+        self._tokens: Dict[str, object] = {}  # sesión -> token vigente
+        self._futures: Dict[str, list] = {}  # sesión -> trabajos encolados
+
+    def _current(self, session_id: str, token: object) -> bool:
+        with self._lock:
+            return self._tokens.get(session_id) is token
+
+    def cancel(self, session_id: str):
+        """Invalidar el precalentado en curso de `session_id`."""
+        with self._lock:
+            self._tokens.pop(session_id, None)
+            futures = self._futures.pop(session_id, [])
+        for f in futures:
+            f.cancel()  # los que no empezaron no llegan a correr
+
+    def schedule(self, session_id: str, area: str, year, zooms: Iterable[int], first: str = None):
+        """Precalentar estadísticas, trayectorias y teselas de todos los escenarios de (área, año); `first` va primero."""
+        self.cancel(session_id)
+        scenarios = CATALOG.scenarios(area)
+        if first in scenarios:
+            scenarios = [first] + [s for s in scenarios if s != first]
+        token = object()
+        zooms = list(zooms)
+        with self._lock:
+            self._tokens[session_id] = token
+            self._futures[session_id] = [
+                self._pool.submit(self._warm, session_id, token, area, scen, year, zooms) for scen in scenarios
+            ]
+        return token
+
+    def _warm(self, session_id: str, token: object, area: str, scenario: str, year, zooms: List[int]):
+        if not self._current(session_id, token):
+            return
+        try:
+            scenario_stats(area, scenario, year)  # gráficas y descargas
+            scenario_trajectory(area, scenario)  # pestaña de trayectorias
+        except Exception:
+            pass  # ráster ilegible: no bloquear las teselas
+        for z, x, y in scenario_tiles(area, scenario, year, zooms):
+            if not self._current(session_id, token):  # la selección cambió
+                return
+            job = class_tile_job(area, scenario, year, z, x, y)
+            if not job:
+                return
+            src, style, render = job
+            key = RENDER_CACHE.key(src, style)
+            if RENDER_CACHE.has(key):
+                continue
+            try:
+                RENDER_CACHE.put(key, render())
+            except Exception:
+                return
+
+
+PREWARM = PrewarmScheduler()  # instancia compartida
@@ -0,0 +1,170 @@
+# app/models/saltmarsh_stats.py  # estadísticas precalculadas por (área, escenario, año): píxeles, ha y m³ por clase
+#
+# Uso:
+#   python -m app.models.saltmarsh_stats     # calcular lo que falte en results/saltmarshes/saltmarsh_stats.json
+
+import os  # rutas/entorno
+import json  # persistencia
+import atexit  # guardar lo pendiente al salir
+import argparse  # argumentos CLI
+import threading  # acceso concurrente
+from typing import Dict, Optional  # tipado
+
+import rasterio  # ráster
+
+from app.models.block_stats import class_histogram  # histogramas por bloques
+from app.models.saltmarsh_catalog import CATALOG, SALTMARSH_ROOT  # catálogo de escenarios
+
+STATS_PATH = os.path.join(SALTMARSH_ROOT, "saltmarsh_stats.json")  # ubicación del almacén
+N_CLASSES = 4  # clases 0..3 (Mudflat, Saltmarsh, Upland Areas, Channel)
+STATS_SAVE_DELAY_S = float(os.getenv("STATS_SAVE_DELAY_S", "5"))  # agrupar los fallos de caché de este intervalo en una escritura
+
+_lock = threading.Lock()
+_save_lock = threading.Lock()  # un solo escritor del JSON por proceso
+_entries: Dict[str, dict] = {}  # ruta relativa del tif de clases -> estadísticas
+_loaded = False
+_save_timer: Optional[threading.Timer] = None
+
+
+def _rel(path: str) -> str:
+    return os.path.relpath(os.path.abspath(path), os.getcwd()).replace(os.sep, "/")  # clave portable
+
+
+def _version(path: Optional[str]) -> Optional[dict]:
+    if not path:
+        return None
+    st = os.stat(path)
+    return {"path": _rel(path), "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+def compute_stats(class_tif: str, acc_tif: Optional[str] = None) -> dict:
+    """Recuento de píxeles, hectáreas y volumen de acreción (m³) por clase."""
+    with rasterio.open(class_tif) as src:
+        resx, resy = src.res
+    pixel_area_m2 = float(abs(resx * resy))
+
+    acc_sums, acc_error = None, None
+    if acc_tif:
+        try:
+            counts, acc_sums = class_histogram(class_tif, acc_tif, N_CLASSES)  # una pasada por bloques para ambos
+            with rasterio.open(acc_tif) as acc:
+                resx, resy = acc.res
+            acc_sums = acc_sums * float(abs(resx * resy))  # suma por clase -> m³
+        except ValueError as e:  # p. ej. rásters no alineados: las áreas siguen siendo válidas
+            acc_tif, acc_error = None, str(e)
+    if not acc_tif:
+        counts, _ = class_histogram(class_tif, None, N_CLASSES)
+
+    return {
+        "pixel_area_m2": pixel_area_m2,
+        "counts": [int(c) for c in counts],
+        "hectares": [float(c * pixel_area_m2 / 10000.0) for c in counts],
+        "accretion_m3": [float(v) for v in acc_sums] if acc_sums is not None else None,
+        "accretion_error": acc_error,
+    }
+
+
+def _load_file():
+    global _loaded
+    path = os.path.join(os.getcwd(), STATS_PATH)
+    if os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                _entries.update(json.load(f))
+        except (OSError, ValueError):
+            pass  # almacén corrupto -> se recalcula bajo demanda
+    _loaded = True
+
+
+def save():
+    path = os.path.join(os.getcwd(), STATS_PATH)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _save_lock:  # prewarm, exportación y callbacks guardan desde hilos distintos
+        with _lock:
+            data = dict(_entries)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp, path)
+
+
+def _flush():
+    global _save_timer
+    with _lock:
+        if _save_timer is None:
+            return  # nada pendiente
+        _save_timer.cancel()
+        _save_timer = None
+    save()
+
+
+def _schedule_save():
+    """Guardar dentro de STATS_SAVE_DELAY_S segundos (un único guardado para todos los fallos de ese intervalo)."""
+    global _save_timer
+    with _lock:
+        if _save_timer is not None:
+            return
+        _save_timer = threading.Timer(STATS_SAVE_DELAY_S, _flush)
+        _save_timer.daemon = True
+        _save_timer.start()
+
+
+atexit.register(_flush)  # no perder el último lote al parar el servidor
+
+
+def _lookup(class_tif: str, acc_tif: Optional[str]):
+    """(entrada, al_día, versiones) del almacén en memoria."""
+    with _lock:
+        if not _loaded:
+            _load_file()
+        entry = _entries.get(_rel(class_tif))
+    versions = (_version(class_tif), _version(acc_tif))
+    fresh = bool(entry) and entry.get("class") == versions[0] and entry.get("accretion") == versions[1]
+    return entry, fresh, versions
+
+
+def raster_stats(class_tif: str, acc_tif: Optional[str] = None, persist: bool = True) -> dict:
+    """Estadísticas de un par clases/acreción; se calculan solo si faltan o alguna fuente cambió."""
+    entry, fresh, (cls_v, acc_v) = _lookup(class_tif, acc_tif)
+    if fresh:
+        return entry
+    entry = {"class": cls_v, "accretion": acc_v, **compute_stats(class_tif, acc_tif)}
+    with _lock:
+        _entries[_rel(class_tif)] = entry
+    if persist:
+        _schedule_save()
+    return entry
+
+
+def scenario_stats(area: str, scenario: str, year) -> Optional[dict]:
+    """Estadísticas de (área, escenario, año) del catálogo o None."""
+    entry = CATALOG.get(area, scenario, year)
+    if not entry:
+        return None
+    return raster_stats(entry.class_tif, entry.accretion_tif)
+
+
+def refresh(persist: bool = True) -> Dict[str, dict]:
+    """Calcular las estadísticas que falten o estén desfasadas para todo el catálogo."""
+    changed = False
+    for _, _, _, entry in CATALOG.rasters():
+        try:
+            _, fresh, _ = _lookup(entry.class_tif, entry.accretion_tif)
+            if not fresh:
+                raster_stats(entry.class_tif, entry.accretion_tif, persist=False)
+                changed = True
+        except Exception:
+            continue  # ráster ilegible (p. ej. puntero LFS sin descargar)
+    if changed and persist:
+        save()
+    return _entries
+
+
+def main():
+    argparse.ArgumentParser(description="Precalcular estadísticas por clase de results/saltmarshes.").parse_args()
+    entries = refresh()
+    print(f"[stats] {len(entries)} rasters in {STATS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
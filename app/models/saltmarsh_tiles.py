@@ -0,0 +1,71 @@
+# app/models/saltmarsh_tiles.py  # teselas XYZ (Web Mercator) de los rásters de clases de saltmarsh
+
+from typing import Tuple  # tipado
+
+import numpy as np  # numérico
+import mercantile  # aritmética de teselas XYZ
+from rasterio.vrt import WarpedVRT  # reproyección al vuelo
+from rasterio.enums import Resampling  # remuestreo
+from rasterio.transform import from_bounds  # transform de la tesela
+from rasterio.warp import transform_bounds  # bounds entre CRS
+
+from app.models.raster_handles import POOL  # datasets ya abiertos
+from app.models.raster_render import class_png, empty_png, SALTMARSH_PALETTE  # PNG indexados
+
+TILE_SIZE = 256  # tamaño estándar de tesela Leaflet
+
+
+def tile_bounds_3857(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Límites (left, bottom, right, top) de la tesela z/x/y en EPSG:3857."""
+    b = mercantile.xy_bounds(x, y, z)  # bounds en metros Web Mercator
+    return b.left, b.bottom, b.right, b.top
+
+
+def tile_style(z: int, x: int, y: int) -> str:
+    """Estilo de caché (producto + paleta + tesela) de la tesela z/x/y de clases."""
+    return f"class-tile:{SALTMARSH_PALETTE.signature}:{z}/{x}/{y}"
+
+
+def tile_intersects(src, z: int, x: int, y: int) -> bool:
+    """True si la tesela z/x/y cae (al menos en parte) sobre la extensión del ráster."""
+    left, bottom, right, top = transform_bounds(src.crs, "EPSG:3857", *src.bounds)  # extensión en 3857
+    t_left, t_bottom, t_right, t_top = tile_bounds_3857(z, x, y)  # extensión de la tesela
+    return not (t_right <= left or t_left >= right or t_top <= bottom or t_bottom >= top)
+
+
+def read_tile(src, z: int, x: int, y: int, tile_size: int = TILE_SIZE,
+              resampling: Resampling = Resampling.nearest) -> np.ma.MaskedArray:
+    """
+    Lee solo la ventana de `src` que cubre la tesela z/x/y, reproyectada a EPSG:3857.
+
+    El WarpedVRT se define con el transform y el tamaño de la tesela, así que GDAL
+    solo lee los bloques de origen que caen dentro: el coste depende del tamaño
+    de la tesela, no del tamaño del ráster.
+    """
+    dst_transform = from_bounds(*tile_bounds_3857(z, x, y), tile_size, tile_size)  # malla de la tesela
+    with WarpedVRT(
+        src,
+        crs="EPSG:3857",
+        transform=dst_transform,
+        width=tile_size,
+        height=tile_size,
+        resampling=resampling,
+        add_alpha=src.nodata is None,  # sin nodata -> alfa para no pintar fuera del ráster
+    ) as vrt:
+        data = vrt.read(1)  # leer banda
+        valid = vrt.dataset_mask() > 0  # píxeles con dato
+    return np.ma.masked_array(data, mask=~valid)  # enmascarar nodata y fuera de extensión
+
+
+def read_class_tile(src, z: int, x: int, y: int, tile_size: int = TILE_SIZE) -> np.ma.MaskedArray:
+    """Tesela z/x/y de un ráster de clases (vecino más próximo)."""
+    return read_tile(src, z, x, y, tile_size, Resampling.nearest)
+
+
+def render_class_tile(tif_path: str, z: int, x: int, y: int, tile_size: int = TILE_SIZE) -> bytes:
+    """Renderizar la tesela z/x/y del ráster de clases `tif_path` como PNG."""
+    with POOL.dataset(tif_path) as src:  # dataset ya abierto del pool
+        if not tile_intersects(src, z, x, y):  # tesela fuera de la extensión
+            return empty_png(tile_size, tile_size)
+        data = read_class_tile(src, z, x, y, tile_size)  # lectura por ventana
+    return class_png(data)  # PNG indexado
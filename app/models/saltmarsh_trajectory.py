@@ -0,0 +1,99 @@
+# app/models/saltmarsh_trajectory.py  # trayectorias multianuales: área y acreción por clase y transiciones año a año
+
+import threading  # caché concurrente
+from collections import OrderedDict  # LRU de trayectorias
+from contextlib import ExitStack  # abrir todos los años a la vez
+from typing import Dict, List, Optional  # tipado
+
+import numpy as np  # numérico
+import rasterio  # ráster
+
+from app.models.block_stats import block_windows  # lectura por bloques
+from app.models.render_cache import source_version  # versión de las fuentes
+from app.models.saltmarsh_catalog import CATALOG  # catálogo de escenarios
+from app.models.saltmarsh_transitions import N_CLASSES, CLASS_NAMES, align_to  # códigos a*4+b
+
+_CACHE_SIZE = 32
+_lock = threading.Lock()
+_cache: "OrderedDict[tuple, Dict]" = OrderedDict()  # versiones de todos los tifs -> trayectoria
+
+
+def trajectory(class_tifs: List[str], acc_tifs: Optional[List[Optional[str]]] = None) -> Dict:
+    """
+    Series por clase de una secuencia de años.
+
+    Por cada bloque se leen a la vez todos los años en una pila (T, h, w) y se
+    acumula con un solo np.bincount por producto:
+      - área: código + 4*t                      -> (T, 4)
+      - acreción: igual, ponderado por acreción -> (T, 4)
+      - transiciones t -> t+1: (a*4+b) + 16*t   -> (T-1, 4, 4)
+    Los años que no comparten malla con el primero se alinean con un VRT.
+    """
+    T = len(class_tifs)
+    acc_tifs = acc_tifs or [None] * T
+    with_acc = all(acc_tifs)  # acreción solo si todos los años la tienen
+    counts = np.zeros(T * N_CLASSES, dtype=np.int64)
+    acc_sums = np.zeros(T * N_CLASSES, dtype=np.float64)
+    trans = np.zeros(max(T - 1, 0) * N_CLASSES * N_CLASSES, dtype=np.int64)
+
+    with ExitStack() as stack:
+        ref = stack.enter_context(rasterio.open(class_tifs[0]))
+
+        def _open(path):  # abrir sobre la malla del primer año
+            src = stack.enter_context(rasterio.open(path))
+            out = align_to(src, ref)
+            if out is not src:
+                stack.callback(out.close)  # VRT de alineación
+            return out
+
+        srcs = [ref] + [_open(p) for p in class_tifs[1:]]
+        accs = [_open(p) for p in acc_tifs] if with_acc else []
+        pixel_area_m2 = float(abs(ref.res[0] * ref.res[1]))
+        acc_px = [float(abs(a.res[0] * a.res[1])) for a in accs]
+        offsets = (np.arange(T, dtype=np.int64) * N_CLASSES)[:, None, None]
+        t_offsets = (np.arange(max(T - 1, 0), dtype=np.int64) * N_CLASSES * N_CLASSES)[:, None, None]
+
+        for win in block_windows(ref):
+            cube = np.stack([s.read(1, window=win) for s in srcs]).astype(np.int64)  # (T, h, w)
+            valid = (cube >= 0) & (cube < N_CLASSES)
+            codes = cube + offsets
+            counts += np.bincount(codes[valid], minlength=T * N_CLASSES)
+            if with_acc:
+                acc = np.stack([np.ma.filled(a.read(1, window=win, masked=True), 0.0) * px
+                                for a, px in zip(accs, acc_px)]).astype(np.float64)
+                acc_sums += np.bincount(codes[valid], weights=acc[valid], minlength=T * N_CLASSES)
+            if T > 1:
+                pair_ok = valid[:-1] & valid[1:]  # ambos años con clase válida
+                pairs = cube[:-1] * N_CLASSES + cube[1:] + t_offsets
+                trans += np.bincount(pairs[pair_ok], minlength=(T - 1) * N_CLASSES * N_CLASSES)
+
+    ha = counts.reshape(T, N_CLASSES) * pixel_area_m2 / 10000.0
+    return {
+        "classes": CLASS_NAMES,
+        "hectares": ha.tolist(),
+        "accretion_m3": acc_sums.reshape(T, N_CLASSES).tolist() if with_acc else None,
+        "transitions_ha": (trans.reshape(max(T - 1, 0), N_CLASSES, N_CLASSES) * pixel_area_m2 / 10000.0).tolist(),
+    }
+
+
+def scenario_trajectory(area: str, scenario: str) -> Optional[Dict]:
+    """Trayectoria de todos los años de (área, escenario); cacheada por versión de todos sus rásters."""
+    pairs = [(y, CATALOG.get(area, scenario, y)) for y in CATALOG.years(area, scenario)]
+    years = [y for y, e in pairs if e]
+    entries = [e for _, e in pairs if e]
+    if not entries:
+        return None
+    class_tifs = [e.class_tif for e in entries]
+    acc_tifs = [e.accretion_tif for e in entries]
+    key = tuple(source_version(p) for p in class_tifs + [p for p in acc_tifs if p])
+    with _lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            return hit
+    result = {"area": area, "scenario": scenario, "years": years, **trajectory(class_tifs, acc_tifs)}
+    with _lock:
+        _cache[key] = result
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
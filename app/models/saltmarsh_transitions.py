@@ -0,0 +1,108 @@
+# app/models/saltmarsh_transitions.py  # transiciones de clase entre dos (escenario, año): ráster a*4+b y matriz en ha
+
+import threading  # caché concurrente
+from collections import OrderedDict  # LRU de matrices
+from typing import Dict, Optional  # tipado
+
+import numpy as np  # numérico
+from rasterio.vrt import WarpedVRT  # alinear B sobre la malla de A
+from rasterio.enums import Resampling  # remuestreo
+
+from app.models.block_stats import block_windows  # lectura por bloques
+from app.models.raster_render import ClassPalette, SALTMARSH_CLASS_COLORS, class_png  # PNG indexado
+from app.models.raster_handles import POOL  # datasets ya abiertos
+from app.models.render_cache import source_version  # versión de las fuentes
+
+N_CLASSES = 4  # clases 0..3
+CLASS_NAMES = ["Mudflat", "Saltmarsh", "Upland Areas", "Channel"]  # mismo orden que CLASS_INFO en marsh_callbacks
+
+# Código combinado a*4+b: solo se pintan los cambios, con el color de la clase de destino
+TRANSITION_PALETTE = ClassPalette({
+    a * N_CLASSES + b: SALTMARSH_CLASS_COLORS[b]
+    for a in range(N_CLASSES) for b in range(N_CLASSES) if a != b
+})
+
+
+def _same_grid(a, b) -> bool:
+    return a.crs == b.crs and a.transform == b.transform and (a.width, a.height) == (b.width, b.height)
+
+
+def align_to(src_b, ref):
+    """`src_b` tal cual si comparte malla con `ref`; si no, un VRT sobre la malla de `ref` (vecino más próximo)."""
+    if _same_grid(src_b, ref):
+        return src_b
+    return WarpedVRT(src_b, crs=ref.crs, transform=ref.transform, width=ref.width, height=ref.height,
+                     resampling=Resampling.nearest)
+
+
+def combine_codes(a: np.ndarray, b: np.ndarray, valid: Optional[np.ndarray] = None) -> np.ma.MaskedArray:
+    """Código de transición a*4+b; enmascarado donde alguna de las dos clases es nodata o desconocida."""
+    ok = (a >= 0) & (a < N_CLASSES) & (b >= 0) & (b < N_CLASSES)
+    if valid is not None:
+        ok &= valid
+    codes = np.where(ok, a.astype(np.int16) * N_CLASSES + b.astype(np.int16), -1)
+    return np.ma.masked_array(codes, mask=~ok)
+
+
+def transition_counts(tif_a: str, tif_b: str) -> np.ndarray:
+    """Matriz 4x4 de píxeles (desde A -> hacia B) con un np.bincount por bloque sobre a*4+b."""
+    counts = np.zeros(N_CLASSES * N_CLASSES, dtype=np.int64)
+    with POOL.dataset(tif_a) as src_a, POOL.dataset(tif_b) as raw_b:
+        src_b = align_to(raw_b, src_a)
+        try:
+            for win in block_windows(src_a):
+                codes = combine_codes(src_a.read(1, window=win), src_b.read(1, window=win))
+                counts += np.bincount(codes.compressed().astype(np.intp), minlength=N_CLASSES * N_CLASSES)
+        finally:
+            if src_b is not raw_b:
+                src_b.close()
+    return counts.reshape(N_CLASSES, N_CLASSES)
+
+
+def transition_matrix(tif_a: str, tif_b: str) -> Dict:
+    """Matriz de transición en hectáreas (filas: clase en A; columnas: clase en B)."""
+    counts = transition_counts(tif_a, tif_b)
+    with POOL.dataset(tif_a) as src:
+        resx, resy = src.res
+    ha = counts * float(abs(resx * resy)) / 10000.0
+    return {
+        "classes": CLASS_NAMES,
+        "hectares": ha.round(4).tolist(),
+        "pixels": counts.tolist(),
+        "changed_ha": float(ha.sum() - np.trace(ha)),
+        "unchanged_ha": float(np.trace(ha)),
+    }
+
+
+def render_transition_png(tif_a: str, tif_b: str) -> bytes:
+    """PNG EPSG:4326 de los píxeles que cambian de clase entre A y B (color = clase de destino)."""
+    with POOL.dataset(tif_a, crs="EPSG:4326") as vrt_a, POOL.dataset(tif_b) as src_b, WarpedVRT(
+                src_b, crs="EPSG:4326", transform=vrt_a.transform, width=vrt_a.width, height=vrt_a.height,
+                resampling=Resampling.nearest) as vrt_b:  # B sobre la misma malla 4326 que A
+        a = vrt_a.read(1, masked=True)
+        b = vrt_b.read(1, masked=True)
+    valid = ~(np.ma.getmaskarray(a) | np.ma.getmaskarray(b))
+    codes = combine_codes(np.ma.filled(a, -1), np.ma.filled(b, -1), valid)
+    return class_png(codes, TRANSITION_PALETTE)
+
+
+# Matrices ya calculadas (en memoria): (versión A, versión B) -> matriz
+_MATRIX_CACHE_SIZE = 64
+_matrix_lock = threading.Lock()
+_matrix_cache: "OrderedDict[tuple, Dict]" = OrderedDict()
+
+
+def cached_transition_matrix(tif_a: str, tif_b: str) -> Dict:
+    """`transition_matrix` con caché LRU invalidada por versión (mtime/tamaño) de ambas fuentes."""
+    key = (source_version(tif_a), source_version(tif_b))
+    with _matrix_lock:
+        hit = _matrix_cache.get(key)
+        if hit is not None:
+            _matrix_cache.move_to_end(key)
+            return hit
+    matrix = transition_matrix(tif_a, tif_b)
+    with _matrix_lock:
+        _matrix_cache[key] = matrix
+        while len(_matrix_cache) > _MATRIX_CACHE_SIZE:
+            _matrix_cache.popitem(last=False)
+    return matrix
@@ -0,0 +1,132 @@
+# app/models/training_points.py  # puntos de entrenamiento de saltmarsh como GeoJSON compacto, con clustering por zoom en servidor
+
+import os  # rutas/entorno
+import threading  # caché concurrente
+from collections import OrderedDict  # LRU de niveles de cluster
+from typing import Dict, Optional, Tuple  # tipado
+
+import numpy as np  # numérico
+import pandas as pd  # columnas de clase
+import geopandas as gpd  # lectura de parquet
+
+TRAINING_POINTS_PATHS = {  # área -> parquet con los puntos de entrenamiento
+    "Urdaibai_Estuary": os.path.join("data", "Urdaibai_Estuary", "urdaibai_estuary_training_dataset.parquet"),
+    "Bay_of_Santander": os.path.join("data", "Bay_of_Santander", "bay_santander_training_dataset.parquet"),
+    "Cadiz_Bay": os.path.join("data", "Cadiz_Bay", "cadiz_bay_training_dataset.parquet"),
+}
+CLASS_LABELS = ["Mudflat", "Saltmarsh", "Upland Areas", "Channel"]  # mismo orden que CLASS_INFO en marsh_callbacks
+
+CLUSTER_MAX_ZOOM = int(os.getenv("TRAINING_POINTS_CLUSTER_MAX_ZOOM", "16"))  # desde este zoom, puntos sueltos
+CLUSTER_RADIUS_PX = int(os.getenv("TRAINING_POINTS_CLUSTER_PX", "40"))  # lado de la celda de agrupación en px de pantalla
+
+_EARTH_HALF = 20037508.342789244  # semiperímetro Web Mercator (m)
+
+_lock = threading.Lock()
+_points: Dict[str, Tuple[int, dict]] = {}  # ruta -> (mtime_ns, arrays)
+_layers: "OrderedDict[tuple, dict]" = OrderedDict()  # (ruta, mtime_ns, nivel) -> FeatureCollection
+_LAYER_CACHE_SIZE = 64
+
+
+def _class_codes(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """Códigos 0..3 (-1 si no se reconoce) y etiquetas de la columna de clase (enteros, '2' o 'Saltmarsh')."""
+    num = pd.to_numeric(values, errors="coerce")  # 2, 2.0 o "2" -> 2
+    by_label = {name.lower(): float(i) for i, name in enumerate(CLASS_LABELS)}
+    from_text = values.astype(str).str.strip().str.lower().map(by_label)  # "Saltmarsh" -> 1
+    codes = num.where(num.isin(range(len(CLASS_LABELS)))).fillna(from_text).fillna(-1).astype(np.int8)
+    labels = values.astype(str).where(values.notna(), "unknown")
+    return codes.to_numpy(), labels.to_numpy(dtype=object)
+
+
+def load_points(path: str) -> Optional[dict]:
+    """lon/lat (EPSG:4326), código de clase y etiqueta de cada punto; se relee solo si cambia el fichero."""
+    full = os.path.join(os.getcwd(), path)
+    try:
+        mtime = os.stat(full).st_mtime_ns
+    except OSError:
+        return None
+    with _lock:
+        hit = _points.get(path)
+        if hit and hit[0] == mtime:
+            return hit[1]
+    gdf = gpd.read_parquet(full)
+    if gdf.crs is not None:
+        gdf = gdf.to_crs(epsg=4326)  # reproyectar a EPSG:4326 (requerido)
+    gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
+    pts = gdf.geometry.representative_point() if not (gdf.geom_type == "Point").all() else gdf.geometry
+    col = next((c for c in gdf.columns if c.lower() == "class"), None)  # 'Class' o 'class'
+    if col is not None:
+        codes, labels = _class_codes(gdf[col])
+    else:
+        codes, labels = np.full(len(gdf), -1, dtype=np.int8), np.full(len(gdf), "unknown", dtype=object)
+    arrays = {"lon": pts.x.to_numpy(), "lat": pts.y.to_numpy(), "code": codes, "label": labels}
+    with _lock:
+        _points[path] = (mtime, arrays)
+    return arrays
+
+
+def cluster_level(zoom) -> Optional[int]:
+    """Nivel de agrupación para `zoom` (None = puntos sueltos)."""
+    try:
+        zoom = int(round(float(zoom)))
+    except (TypeError, ValueError):
+        return None
+    return zoom if zoom < CLUSTER_MAX_ZOOM else None
+
+
+def _point_features(lon, lat, code, label):
+    return [
+        {"type": "Feature", "geometry": {"type": "Point", "coordinates": [round(x, 6), round(y, 6)]},
+         "properties": {"c": c} if c >= 0 else {"c": c, "l": l}}  # etiqueta solo si no es una clase conocida
+        for x, y, c, l in zip(lon.tolist(), lat.tolist(), code.tolist(), label.tolist())
+    ]
+
+
+def _cluster(arrays: dict, level: int) -> dict:
+    """Agrupar en celdas de CLUSTER_RADIUS_PX px de pantalla al zoom `level`; celdas con un punto quedan sueltas."""
+    lon, lat, code, label = arrays["lon"], arrays["lat"], arrays["code"], arrays["label"]
+    x = np.radians(lon) * 6378137.0  # Web Mercator
+    y = np.log(np.tan(np.pi / 4 + np.radians(np.clip(lat, -85.0511, 85.0511)) / 2)) * 6378137.0
+    px_size = 2 * _EARTH_HALF / (256 * 2 ** level)  # metros por píxel de pantalla
+    cx = np.floor((x + _EARTH_HALF) / (px_size * CLUSTER_RADIUS_PX)).astype(np.int64)
+    cy = np.floor((_EARTH_HALF - y) / (px_size * CLUSTER_RADIUS_PX)).astype(np.int64)
+    _, inv, counts = np.unique(cx * (1 << 32) + cy, return_inverse=True, return_counts=True)
+    n = len(counts)
+    c_lon = np.bincount(inv, weights=lon, minlength=n) / counts  # centroide de la celda
+    c_lat = np.bincount(inv, weights=lat, minlength=n) / counts
+    by_class = np.bincount(inv * 5 + (code.astype(np.int64) + 1), minlength=n * 5).reshape(n, 5)  # -1..3 -> 0..4
+    major = by_class.argmax(axis=1) - 1  # clase mayoritaria de la celda
+
+    single = counts[inv] == 1
+    features = _point_features(lon[single], lat[single], code[single], label[single])
+    multi = np.nonzero(counts > 1)[0]
+    features += [
+        {"type": "Feature", "geometry": {"type": "Point", "coordinates": [round(x, 6), round(y, 6)]},
+         "properties": {"cluster": True, "n": n_pts, "c": c}}
+        for x, y, n_pts, c in zip(c_lon[multi].tolist(), c_lat[multi].tolist(), counts[multi].tolist(), major[multi].tolist())
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def training_points_geojson(area: str, zoom=None) -> Optional[dict]:
+    """FeatureCollection compacta de los puntos de `area` (agrupados si `zoom` < CLUSTER_MAX_ZOOM)."""
+    path = TRAINING_POINTS_PATHS.get(area)
+    arrays = load_points(path) if path else None
+    if arrays is None:
+        return None
+    level = cluster_level(zoom)
+    with _lock:
+        key = (path, _points[path][0], level)
+        hit = _layers.get(key)
+        if hit is not None:
+            _layers.move_to_end(key)
+            return hit
+    if level is None:
+        fc = {"type": "FeatureCollection",
+              "features": _point_features(arrays["lon"], arrays["lat"], arrays["code"], arrays["label"])}
+    else:
+        fc = _cluster(arrays, level)
+    with _lock:
+        _layers[key] = fc
+        while len(_layers) > _LAYER_CACHE_SIZE:
+            _layers.popitem(last=False)
+    return fc
@@ -0,0 +1,81 @@
+# benchmarks/bench_class_png.py  # matplotlib (figura + imshow + savefig) vs LUT + PNG indexado
+#
+# Uso:
+#   python -m benchmarks.bench_class_png                       # ráster sintético 2000x2000
+#   python -m benchmarks.bench_class_png --tif results/saltmarshes/Cadiz_Bay/regional_rcp45/cadiz_reg_rcp45_2023_25g.tif
+#   python -m benchmarks.bench_class_png --size 4000 --repeat 5
+
+import argparse  # argumentos CLI
+import time  # cronómetro
+import tracemalloc  # memoria pico (asignaciones Python/NumPy)
+from io import BytesIO  # buffer de salida
+
+import numpy as np  # numérico
+import matplotlib  # backend offscreen
+matplotlib.use("agg")  # backend sin GUI
+import matplotlib.pyplot as plt  # dibujo
+from matplotlib.colors import ListedColormap, BoundaryNorm  # colores
+
+from app.models.raster_render import SALTMARSH_CLASS_COLORS, class_png  # ruta nueva
+
+
+def render_matplotlib(data: np.ma.MaskedArray) -> bytes:  # ruta anterior de /raster (run.py)
+    h, w = data.shape
+    colors = [SALTMARSH_CLASS_COLORS[k] for k in sorted(SALTMARSH_CLASS_COLORS)]
+    cmap = ListedColormap(colors)
+    norm = BoundaryNorm([0, 1, 2, 3, 4], ncolors=4)
+    fig = plt.figure(frameon=False)
+    fig.set_size_inches(w / 200, h / 200)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.imshow(data, cmap=cmap, norm=norm, interpolation="nearest", origin="upper")
+    ax.axis("off")
+    buf = BytesIO()
+    fig.savefig(buf, dpi=100, transparent=True, pad_inches=0)
+    plt.close(fig)
+    return buf.getvalue()
+
+
+def _load(tif, size):  # datos de entrada
+    if tif:
+        import rasterio
+        from rasterio.vrt import WarpedVRT
+        from rasterio.enums import Resampling
+        with rasterio.open(tif) as src, WarpedVRT(src, crs="EPSG:4326", resampling=Resampling.nearest) as vrt:
+            return vrt.read(1, masked=True)
+    rng = np.random.default_rng(0)
+    arr = rng.integers(0, 4, (size, size)).astype(np.int16)  # clases 0..3
+    mask = np.zeros_like(arr, dtype=bool)
+    mask[: size // 10] = True  # franja de nodata
+    return np.ma.masked_array(arr, mask=mask)
+
+
+def _bench(fn, data, repeat):
+    times, peak = [], 0
+    out = b""
+    for _ in range(repeat):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        out = fn(data)
+        times.append(time.perf_counter() - t0)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return min(times), float(np.median(times)), peak, len(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de render PNG de rásters de clases.")
+    parser.add_argument("--tif", help="TIFF de clases a renderizar (por defecto, sintético)")
+    parser.add_argument("--size", type=int, default=2000, help="lado del ráster sintético en px")
+    parser.add_argument("--repeat", type=int, default=3, help="repeticiones por método")
+    args = parser.parse_args()
+
+    data = _load(args.tif, args.size)
+    print(f"input: {data.shape[1]}x{data.shape[0]} px, dtype={data.dtype}")
+    print(f"{'method':<12}{'best (s)':>10}{'median (s)':>12}{'peak MiB':>10}{'PNG KiB':>10}")
+    for name, fn in (("matplotlib", render_matplotlib), ("palette", class_png)):
+        best, med, peak, size = _bench(fn, data, args.repeat)
+        print(f"{name:<12}{best:>10.3f}{med:>12.3f}{peak / 2**20:>10.1f}{size / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +0,0 @@
-window.dashExtensions = Object.assign({}, window.dashExtensions, {
-    default: {
-        function0: function(e, ctx) {
-            console.log(`You clicked at ${e.latlng}.`)
-        }
-    }
-});
\ No newline at end of file
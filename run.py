@@ -4,16 +4,27 @@ from io import BytesIO  # buffer de salida
 
 os.environ["PROJ_LIB"] = datadir.get_data_dir()  # ajustar PROJ_LIB
 
-import glob  # búsqueda por patrón
-import rasterio  # ráster
-from rasterio.vrt import WarpedVRT  # reproyección
-from rasterio.enums import Resampling  # remuestreo
-import matplotlib  # backend offscreen
+import matplotlib  # backend offscreen (gráficas de las descargas)
 matplotlib.use('agg')  # backend sin GUI
-import matplotlib.pyplot as plt  # dibujo
-from matplotlib.colors import ListedColormap, BoundaryNorm  # colores
-from flask import send_file, abort  # respuesta http
+from flask import send_file, abort, request, jsonify  # respuesta http
 from app import create_app  # crear app
+from app.models.raster_render import class_png, SALTMARSH_PALETTE  # PNG indexado de clases
+from app.models.render_cache import RENDER_CACHE, source_version  # caché de renders en disco
+from app.models.raster_handles import POOL  # datasets ya abiertos
+from app.models.saltmarsh_cogs import serving_path  # preferir COGs precalculados
+from app.models.saltmarsh_catalog import CATALOG, class_tif  # catálogo de escenarios
+from app.models.saltmarsh_model_layers import MODEL_LAYERS, model_layers, render_model_tile, tile_style as model_tile_style  # salidas del modelo entrenado
+from app.models.pixel_inspector import inspect_point  # consulta puntual multi-escenario
+from app.models.saltmarsh_export import stream_results_zip  # ZIP de resultados en streaming
+from app.models.saltmarsh_netcdf import netcdf_path, render_step_tile, step_stats  # NetCDF completos (perezoso)
+from app.models.saltmarsh_transitions import TRANSITION_PALETTE, render_transition_png, cached_transition_matrix  # transiciones de clase
+from app.models.raster_manifest import refresh as refresh_raster_manifest  # metadatos ráster en memoria
+from app.models.saltmarsh_stats import refresh as refresh_saltmarsh_stats  # estadísticas por clase precalculadas
+from app.models.habitat_pyramid import class_tile_job, scenario_pyramid, refresh as refresh_habitat_pyramids  # pirámide por bloques
+from app.models.opsa import geometry_geojson as opsa_geometry_geojson, load_area as load_opsa_area  # geometría OPSA
+from app.models.opsa import FIELD_MAP as OPSA_FIELD_MAP  # componentes válidos por área
+from app.models.opsa_mvt import render_tile as render_opsa_mvt, tile_style as opsa_mvt_style  # teselas vectoriales
+from app.models.opsa_lattice import refresh as refresh_opsa_lattices  # condición OPSA por combinación de componentes
 
 import threading, time
 from pathlib import Path
@@ -49,54 +60,213 @@ def _gc_uploads_loop(root="uploads"):                       # bucle del recolect
             pass
         time.sleep(GC_INTERVAL_MIN * 60)
 
+# Cache-Control de los PNG servidos (pasado este tiempo el navegador revalida con ETag -> 304):
+RASTER_MAX_AGE = int(os.getenv("RASTER_MAX_AGE", "300"))    # segundos
+
 # Creamos la instancia de la app dash/flask:
 app = create_app()  
 
 # Generamos un hilo daemos que se ejecuta en segundo plano que maneja las carpetas viejas:
 threading.Thread(target=_gc_uploads_loop, args=("uploads",), daemon=True).start()
 
+# Refrescamos en segundo plano el manifiesto de metadatos ráster (solo cabeceras nuevas o modificadas):
+threading.Thread(target=refresh_raster_manifest, daemon=True).start()
+
+# Precalculamos en segundo plano las estadísticas por clase que falten (gráficas y descargas solo consultan el almacén):
+threading.Thread(target=refresh_saltmarsh_stats, daemon=True).start()
+
+# Construimos en segundo plano las pirámides de resúmenes por bloque que falten (teselas de zoom lejano y consultas por rectángulo):
+threading.Thread(target=refresh_habitat_pyramids, daemon=True).start()
+
+# Precalculamos en segundo plano la condición OPSA de todas las combinaciones de componentes (Run = indexar):
+threading.Thread(target=refresh_opsa_lattices, daemon=True).start()
+
+
+def _class_tif_path(area, scenario, year):  # localizar tif de clases de un escenario/año
+    tif_path = class_tif(area, scenario, year)  # catálogo en memoria (sin listar carpetas)
+    return serving_path(tif_path) if tif_path else None  # COG 4326 precalculado si existe, si no el original
+
+
+def _cached_response(tif_path, style, render, extra_sources=(), mimetype="image/png", suffix="png"):  # render (PNG, GeoJSON...) desde caché con ETag/Last-Modified
+    etag = RENDER_CACHE.key(tif_path, style, suffix)  # clave = ETag fuerte (fuente + mtime + estilo)
+    if request.if_none_match.contains(etag):  # el cliente ya lo tiene: ni leer ni renderizar
+        resp = app.server.response_class(status=304)
+        resp.set_etag(etag)
+        resp.cache_control.public = True
+        resp.cache_control.max_age = RASTER_MAX_AGE
+        return resp
+    data = RENDER_CACHE.get_or_render(etag, render)  # acierto de caché o render + guardar
+    resp = send_file(
+        BytesIO(data), mimetype=mimetype,
+        etag=etag, last_modified=max(os.path.getmtime(p) for p in (tif_path, *extra_sources)),
+        max_age=RASTER_MAX_AGE, conditional=True  # If-Modified-Since -> 304
+    )
+    resp.cache_control.public = True  # cacheable por proxies
+    return resp
+
+
+def _render_full_raster(tif_path):  # PNG de toda la extensión en EPSG:4326
+    with POOL.dataset(tif_path, crs="EPSG:4326") as vrt:  # VRT a 4326 ya preparado (o el COG tal cual)
+        data = vrt.read(1, masked=True)  # leer banda (nodata enmascarado -> transparente)
+    return class_png(data)  # LUT de clases -> PNG indexado
+
 
 @app.server.route("/raster/<area>/<scenario>/<int:year>.png")  # endpoint de PNG
 def serve_reprojected_raster(area, scenario, year):  # servir PNG desde tif de clases
-    dirpath = os.path.join(os.getcwd(), "results", "saltmarshes", area, scenario)  # carpeta del escenario
-    if not os.path.isdir(dirpath):  # validar carpeta
-        return abort(404)  # 404 si no existe
+    tif_path = _class_tif_path(area, scenario, year)  # tif de clases
+    if not tif_path:  # si no existe
+        return abort(404)  # 404
+    style = f"class-4326:{SALTMARSH_PALETTE.signature}"  # producto + paleta
+    return _cached_response(tif_path, style, lambda: _render_full_raster(tif_path))
+
 
-    cands = glob.glob(os.path.join(dirpath, f"*{year}*.tif")) + glob.glob(os.path.join(dirpath, f"*{year}*.tiff"))  # candidatos
-    matches = [p for p in cands if "accretion" not in os.path.basename(p).lower()]  # excluir *_accretion.*
-    if not matches:  # si vacío
+@app.server.route("/tiles/saltmarsh/<area>/<scenario>/<int:year>/<int:z>/<int:x>/<int:y>.png")  # endpoint XYZ
+def serve_saltmarsh_tile(area, scenario, year, z, x, y):  # servir tesela 256x256 del tif de clases
+    job = class_tile_job(area, scenario, year, z, x, y)  # pirámide (zoom lejano) o COG (zoom cercano)
+    if not job:  # si no existe
         return abort(404)  # 404
+    src, style, render = job  # misma clave que el precalentado
+    return _cached_response(src, style, render)
+
 
-    matches.sort()  # orden fijo
-    tif_path = matches[0]  # elegir primero
-
-    with rasterio.open(tif_path) as src, WarpedVRT(src, crs="EPSG:4326", resampling=Resampling.nearest) as vrt:  # VRT a 4326
-        data = vrt.read(1, masked=True)  # leer banda (sin máscara para no esconder clase 0)
-        b = vrt.bounds  # bounds
-        lon_min, lon_max = b.left, b.right  # longitudes
-        lat_min, lat_max = b.bottom, b.top  # latitudes
-        w, h = vrt.width, vrt.height  # tamaño en px
-
-    colors = ["#8B4513", "#006400", "#636363", "#31C2F3"]  # colores por clase 0..3
-    cmap  = ListedColormap(colors)  # colormap discreto
-    norm  = BoundaryNorm([0,1,2,3,4], ncolors=4)  # normalización por clases
-
-    fig = plt.figure(frameon=False)  # figura sin marco
-    fig.set_size_inches(w/200, h/200)  # tamaño en pulgadas
-    ax = fig.add_axes([0,0,1,1])  # único eje a pantalla completa
-    ax.imshow(  # dibujar imagen
-        data, cmap=cmap, norm=norm,
-        extent=(lon_min, lon_max, lat_min, lat_max),
-        interpolation="nearest", origin="upper"
+@app.server.route("/tiles/saltmarsh/model/<area>/<layer>/<int:z>/<int:x>/<int:y>.png")  # XYZ de las salidas del modelo
+def serve_model_tile(area, layer, z, x, y):  # probabilidad por clase, certeza o clase predicha
+    layers = model_layers(area)  # capas presentes en trained_model/
+    if layer not in MODEL_LAYERS or layer not in layers:  # si no existe
+        return abort(404)  # 404
+    tif_path = serving_path(layers[layer])  # COG 4326 si existe
+    min_certainty = min(max(request.args.get("min_certainty", 0.0, type=float), 0.0), 1.0)  # fracción 0..1 del rango
+    cert_path = serving_path(layers["certainty"]) if (min_certainty > 0 and "certainty" in layers) else None
+    if cert_path is None:
+        min_certainty = 0.0  # sin ráster de certeza no hay umbral
+    style = model_tile_style(layer, z, x, y, min_certainty, cert_path)  # capa + LUT + umbral + tesela
+    return _cached_response(
+        tif_path, style, lambda: render_model_tile(tif_path, layer, z, x, y, cert_path, min_certainty),
+        extra_sources=(cert_path,) if cert_path else (),
     )
-    ax.axis("off")  # ocultar ejes
 
-    buf = BytesIO()  # buffer
-    fig.savefig(buf, dpi=100, transparent=True, pad_inches=0)  # exportar PNG
-    plt.close(fig)  # cerrar figura
-    buf.seek(0)  # rebobinar
 
-    return send_file(buf, mimetype="image/png")  # devolver PNG
+@app.server.route("/tiles/saltmarsh/nc/<area>/<scenario>/<generation>/<int:step>/<int:z>/<int:x>/<int:y>.png")  # XYZ desde NetCDF
+def serve_saltmarsh_nc_tile(area, scenario, generation, step, z, x, y):  # cualquier generación/paso sin exportar TIFF
+    nc_path = netcdf_path(area, scenario, generation, "habitats")  # cubo de hábitats
+    if not nc_path:  # si no existe
+        return abort(404)  # 404
+    style = f"nc-class-tile:{SALTMARSH_PALETTE.signature}:{step}:{z}/{x}/{y}"  # producto + paleta + paso + tesela
+    try:
+        return _cached_response(nc_path, style, lambda: render_step_tile(nc_path, step, z, x, y, area=area))
+    except IndexError:  # paso fuera de rango
+        return abort(404)
+
+
+@app.server.route("/inspect/saltmarsh/<area>.json")  # valores bajo un punto (?lat=&lng=)
+def serve_pixel_inspector(area):  # clase/acreción por escenario y año + probabilidades y certeza del modelo
+    lat, lng = request.args.get("lat", type=float), request.args.get("lng", type=float)
+    if lat is None or lng is None or not CATALOG.years(area):  # parámetros o área inválidos
+        return abort(404)
+    resp = jsonify(inspect_point(area, lat, lng))  # datasets ya abiertos + sample(): solo el bloque del píxel
+    resp.cache_control.public = True
+    resp.cache_control.max_age = RASTER_MAX_AGE
+    return resp
+
+
+@app.server.route("/download/saltmarsh/<area>/<int:year>.zip")  # ZIP de resultados (TIFF + gráficas)
+def serve_saltmarsh_results_zip(area, year):  # se escribe y envía por trozos mientras se renderizan las gráficas
+    scenarios = [s for s in CATALOG.scenarios(area) if CATALOG.get(area, s, year)]  # escenarios con ese año
+    if not scenarios:  # si no hay datos
+        return abort(404)  # 404
+    resp = app.server.response_class(stream_results_zip(area, year, scenarios), mimetype="application/zip")
+    resp.headers["Content-Disposition"] = f'attachment; filename="saltmarsh_results_{area}_{year}.zip"'
+    return resp
+
+
+@app.server.route("/geojson/opsa/<area>.json")  # geometría OPSA del área (una vez; la clase viaja en el hideout)
+def serve_opsa_geometry(area):
+    try:
+        table, _ = load_opsa_area(area)  # tabla Arrow mapeada (convertida si el parquet cambió)
+    except (ValueError, FileNotFoundError):
+        return abort(404)
+    return _cached_response(table.path, "opsa-geometry", lambda: opsa_geometry_geojson(area),
+                            mimetype="application/geo+json", suffix="json")
+
+
+@app.server.route("/mvt/opsa/<area>/<int:z>/<int:x>/<int:y>.pbf")  # tesela vectorial (?components=A,B para la condición)
+def serve_opsa_mvt(area, z, x, y):
+    components = [c for c in request.args.get("components", "").split(",") if c]
+    if area not in OPSA_FIELD_MAP or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):  # área desconocida / fuera del mundo
+        return abort(404)
+    if any(c not in OPSA_FIELD_MAP[area] for c in components):
+        return abort(400)
+    try:
+        table, _ = load_opsa_area(area)
+    except (ValueError, FileNotFoundError):
+        return abort(404)
+    etag = RENDER_CACHE.key(table.path, f"{opsa_mvt_style(z, x, y)}|{','.join(sorted(set(components)))}", "pbf")
+    if request.if_none_match.contains(etag):  # el cliente ya la tiene
+        resp = app.server.response_class(status=304)
+    else:
+        try:
+            data = render_opsa_mvt(area, z, x, y, components)
+        except (KeyError, ValueError):  # componente sin columnas EV en la tabla
+            return abort(400)
+        resp = app.server.response_class(data, mimetype="application/vnd.mapbox-vector-tile")
+    resp.set_etag(etag)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = RASTER_MAX_AGE
+    return resp
+
+
+@app.server.route("/stats/saltmarsh/<area>/<scenario>/<int:year>/rect.json")  # resumen de un rectángulo (?bbox=oeste,sur,este,norte)
+def serve_saltmarsh_rect_stats(area, scenario, year):  # ha y m³ por clase sumando bloques de la pirámide
+    try:
+        bbox = [float(v) for v in request.args.get("bbox", "").split(",")]
+    except ValueError:
+        return abort(400)
+    if len(bbox) != 4:
+        return abort(400)
+    pyr = scenario_pyramid(area, scenario, year)  # solo si está al día
+    if pyr is None:
+        return abort(404)
+    resp = jsonify({"area": area, "scenario": scenario, "year": year, "bbox": bbox, **pyr.query(bbox)})
+    resp.cache_control.public = True
+    resp.cache_control.max_age = RASTER_MAX_AGE
+    return resp
+
+
+@app.server.route("/stats/saltmarsh/nc/<area>/<scenario>/<generation>/<int:step>.json")  # estadísticas desde NetCDF
+def serve_saltmarsh_nc_stats(area, scenario, generation, step):  # ha y m³ por clase de un paso
+    nc_hab = netcdf_path(area, scenario, generation, "habitats")
+    if not nc_hab:
+        return abort(404)
+    nc_acc = netcdf_path(area, scenario, generation, "accretion")
+    try:
+        stats = step_stats(nc_hab, nc_acc, step)  # reducción por chunks con dask
+    except IndexError:  # paso fuera de rango
+        return abort(404)
+    resp = jsonify({"area": area, "scenario": scenario, "generation": generation, "step": step, **stats})
+    resp.cache_control.public = True
+    resp.cache_control.max_age = RASTER_MAX_AGE
+    return resp
+
+
+@app.server.route("/raster/diff/<area>/<scen_a>/<int:year_a>/<scen_b>/<int:year_b>.png")  # endpoint de transiciones
+def serve_transition_raster(area, scen_a, year_a, scen_b, year_b):  # píxeles que cambian de clase entre A y B
+    tif_a, tif_b = class_tif(area, scen_a, year_a), class_tif(area, scen_b, year_b)  # tifs originales (malla nativa)
+    if not (tif_a and tif_b):  # si falta alguno
+        return abort(404)  # 404
+    style = f"transition-4326:{TRANSITION_PALETTE.signature}:{source_version(tif_b)}"  # producto + paleta + versión de B
+    return _cached_response(tif_a, style, lambda: render_transition_png(tif_a, tif_b), extra_sources=(tif_b,))
+
+
+@app.server.route("/raster/diff/<area>/<scen_a>/<int:year_a>/<scen_b>/<int:year_b>.json")  # matriz de transición
+def serve_transition_matrix(area, scen_a, year_a, scen_b, year_b):  # hectáreas clase-origen x clase-destino
+    tif_a, tif_b = class_tif(area, scen_a, year_a), class_tif(area, scen_b, year_b)  # tifs originales (área en m²)
+    if not (tif_a and tif_b):  # si falta alguno
+        return abort(404)  # 404
+    matrix = cached_transition_matrix(tif_a, tif_b)  # un np.bincount de a*4+b por bloque, cacheado por versión
+    resp = jsonify({"area": area, "from": {"scenario": scen_a, "year": year_a}, "to": {"scenario": scen_b, "year": year_b}, **matrix})
+    resp.cache_control.public = True
+    resp.cache_control.max_age = RASTER_MAX_AGE
+    return resp
 
 if __name__ == "__main__":  # arrancar servidor en local
     app.run(debug=True, host="0.0.0.0", port=8050, dev_tools_ui=False, dev_tools_props_check=False)
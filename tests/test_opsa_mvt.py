@@ -0,0 +1,142 @@
+# tests/test_opsa_mvt.py  # ida y vuelta del codificador MVT escrito a mano (app/models/opsa_mvt.py)
+
+import struct  # doubles de la tabla de valores
+
+import numpy as np
+import pandas as pd
+from shapely.geometry import MultiPolygon, Polygon
+
+from app.models.opsa_mvt import MVT_EXTENT, MVT_LAYER, encode_feature, encode_tile
+
+
+# ---------- lector protobuf mínimo (independiente del codificador) ----------
+def _varint(buf, pos):
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return n, pos
+        shift += 7
+
+
+def _fields(buf):
+    pos, out = 0, []
+    while pos < len(buf):
+        key, pos = _varint(buf, pos)
+        field, wire = key >> 3, key & 7
+        if wire == 0:
+            value, pos = _varint(buf, pos)
+        elif wire == 1:
+            value, pos = buf[pos:pos + 8], pos + 8
+        elif wire == 2:
+            size, pos = _varint(buf, pos)
+            value, pos = buf[pos:pos + size], pos + size
+        else:
+            raise AssertionError(f"wire type {wire}")
+        out.append((field, value))
+    return out
+
+
+def _packed(buf):
+    pos, out = 0, []
+    while pos < len(buf):
+        v, pos = _varint(buf, pos)
+        out.append(v)
+    return out
+
+
+def _unzigzag(n):
+    return (n >> 1) ^ -(n & 1)
+
+
+def _rings(cmds):
+    """Comandos de geometría -> lista de anillos [(x, y), ...] (cursor compartido entre anillos)."""
+    rings, cur, x, y, i = [], None, 0, 0, 0
+    while i < len(cmds):
+        cid, count = cmds[i] & 7, cmds[i] >> 3
+        i += 1
+        if cid == 7:
+            rings.append(cur)
+            continue
+        for _ in range(count):
+            x += _unzigzag(cmds[i])
+            y += _unzigzag(cmds[i + 1])
+            i += 2
+            if cid == 1:
+                cur = [(x, y)]
+            else:
+                cur.append((x, y))
+    return rings
+
+
+def _signed_area2(ring):
+    return sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]))
+
+
+def _decode(tile):
+    (field, layer_buf), = _fields(tile)
+    assert field == 3
+    layer = {"features": [], "keys": [], "values": []}
+    for f, v in _fields(layer_buf):
+        if f == 1:
+            layer["name"] = v.decode()
+        elif f == 2:
+            feat = {"tags": []}
+            for ff, vv in _fields(v):
+                if ff == 1:
+                    feat["id"] = vv
+                elif ff == 2:
+                    feat["tags"] = _packed(vv)
+                elif ff == 3:
+                    feat["type"] = vv
+                elif ff == 4:
+                    feat["rings"] = _rings(_packed(vv))
+            layer["features"].append(feat)
+        elif f == 3:
+            layer["keys"].append(v.decode())
+        elif f == 4:
+            (vf, vv), = _fields(v)
+            layer["values"].append(_unzigzag(vv) if vf == 6 else struct.unpack("<d", vv)[0])
+        elif f == 5:
+            layer["extent"] = v
+        elif f == 15:
+            layer["version"] = v
+    for feat in layer["features"]:
+        t = feat["tags"]
+        feat["properties"] = {layer["keys"][t[k]]: layer["values"][t[k + 1]] for k in range(0, len(t), 2)}
+    return layer
+
+
+# ---------- pruebas ----------
+def test_polygon_round_trip_with_attributes():
+    # exterior en sentido horario (área negativa en la rejilla) y hueco: el codificador debe reorientarlos
+    square = Polygon([(10, 10), (10, 200), (200, 200), (200, 10)], holes=[[(50, 50), (150, 50), (150, 150), (50, 150)]])
+    multi = MultiPolygon([Polygon([(300, 300), (400, 300), (400, 400)]), Polygon([(500, 500), (600, 500), (600, 600)])])
+    cols = pd.DataFrame({
+        "condition_class": [0, 3, 5],
+        "condition": [np.nan, 2.5, 4.25],
+        "confidence": [np.nan, 1.0, 2.0],
+    })
+    tile = encode_tile(encode_feature(1, square) + encode_feature(2, multi), cols)
+    layer = _decode(tile)
+
+    assert layer["name"] == MVT_LAYER and layer["extent"] == MVT_EXTENT and layer["version"] == 2
+    f1, f2 = layer["features"]
+    assert (f1["id"], f1["type"], f2["id"]) == (1, 3, 2)
+    assert f1["properties"] == {"condition_class": 3, "condition": 2.5, "confidence": 1.0}
+    assert f2["properties"] == {"condition_class": 5, "condition": 4.25, "confidence": 2.0}
+
+    ext, hole = f1["rings"]
+    assert sorted(ext) == [(10, 10), (10, 200), (200, 10), (200, 200)]
+    assert sorted(hole) == [(50, 50), (50, 150), (150, 50), (150, 150)]
+    assert _signed_area2(ext) > 0 and _signed_area2(hole) < 0  # orientación MVT
+    assert [len(r) for r in f2["rings"]] == [3, 3] and all(_signed_area2(r) > 0 for r in f2["rings"])
+
+
+def test_geometry_only_and_degenerate():
+    assert encode_feature(7, Polygon([(0, 0), (5, 0), (10, 0)])) == b""  # área nula
+    layer = _decode(encode_tile(encode_feature(7, Polygon([(0, 0), (0, 9), (9, 9)]))))
+    (feat,) = layer["features"]
+    assert feat["id"] == 7 and feat["properties"] == {} and layer["keys"] == []